@@ -0,0 +1,304 @@
+import copy
+import time
+from pathlib import Path
+import numpy as np
+import torch
+
+from equation_tools import get_residual_coefs, get_max_deriv_order, eval_term
+from solver_tools import get_nn, get_nn_params, default_dtype, get_grid_for_solver, get_population_fields
+from results_analysis_tools import get_results_dir, get_eqn_params
+from store_tools import list_result_names, load_result_text, write_atomically
+from profile_tools import add_stage_info
+
+amortized_max_residual = 1e-2  # the largest scaled RMS residual of an accepted solution of the amortized network
+
+
+class ParametricNN(torch.nn.Module):
+    """
+    A network solving the whole family of equations sum(coef * term) = 0 with the given terms: it takes H and
+    the coefficients of the residual and returns I. The coefficients are scaled into [-1, 1] by the ranges the
+    network is trained on, and the output is I = -1 + H * net(H, coefs), so the condition I(0) = -1 holds
+    exactly. The input H has the shape (number of equations, number of points, 1).
+    """
+
+    def __init__(self, terms: [str], coef_ranges: [(float, float)], width: int = 100, depth: int = 3,
+                 activation: str = 'tanh'):
+        super().__init__()
+        self.terms = list(terms)
+        self.architecture = {'width': width, 'depth': depth, 'activation': activation}
+        self.register_buffer('coef_low', torch.tensor([low for low, _ in coef_ranges]))
+        self.register_buffer('coef_high', torch.tensor([high for _, high in coef_ranges]))
+        self.net = get_nn(width, depth, activation, n_inputs=1 + len(self.terms))
+
+    def scale_coefs(self, coefs: torch.Tensor) -> torch.Tensor:
+        span = self.coef_high - self.coef_low
+        return torch.where(span > 0, 2 * (coefs - self.coef_low) / torch.where(span > 0, span, 1) - 1, 0)
+
+    def forward(self, grid: torch.Tensor, coefs: torch.Tensor) -> torch.Tensor:
+        scaled_coefs = self.scale_coefs(coefs)[:, None, :].expand(-1, grid.shape[1], -1)
+        return -1 + grid * self.net(torch.cat((grid, scaled_coefs), dim=-1))
+
+    def covers(self, coefs: dict) -> bool:
+        """
+        Checks whether the equation belongs to the family the network is trained on: all its terms are the
+        terms of the network and the coefficients are within the trained ranges.
+
+        Args:
+            coefs: Dictionary containing the terms and the corresponding coefficients of the residual.
+
+        Returns:
+            bool: True if the network can solve the equation.
+        """
+
+        if not set(coefs) <= set(self.terms):
+            return False
+        values = torch.tensor([coefs.get(term, 0.0) for term in self.terms], dtype=self.coef_low.dtype)
+        return bool(torch.all((self.coef_low <= values) & (values <= self.coef_high)))
+
+
+def get_amortized_nn_path(name: str = 'amortized_nn') -> Path:
+    amortized_dir = Path.cwd() / 'results' / 'amortized solver'
+    amortized_dir.mkdir(parents=True, exist_ok=True)
+    return amortized_dir / f'{name}.pt'
+
+
+def save_amortized_nn(net: ParametricNN, name: str = 'amortized_nn', fine_tune_epochs: int = 0) -> None:
+    """
+    Saves the parametric network with its terms, coefficient ranges and architecture to the directory shared
+    by all experiments.
+
+    Args:
+        net: The trained parametric network.
+        name: The name of the network (default is 'amortized_nn').
+        fine_tune_epochs: The number of epochs to fine-tune the network on every equation solved with it,
+        see get_amortized_solutions (default is 0).
+
+    Returns:
+        None
+    """
+
+    coef_ranges = list(zip(net.coef_low.tolist(), net.coef_high.tolist()))
+    checkpoint = {'terms': net.terms, 'coef_ranges': coef_ranges, 'architecture': net.architecture,
+                  'dtype': str(net.coef_low.dtype).removeprefix('torch.'), 'fine_tune_epochs': fine_tune_epochs,
+                  'state_dict': net.state_dict()}
+    write_atomically(get_amortized_nn_path(name), lambda file_path: torch.save(checkpoint, file_path))
+
+
+def load_amortized_nn(name: str = 'amortized_nn') -> tuple | None:
+    """
+    Loads the parametric network saved by save_amortized_nn.
+
+    Args:
+        name: The name of the network (default is 'amortized_nn').
+
+    Returns:
+        tuple | None: The network and its number of fine-tuning epochs or None if it has not been trained.
+    """
+
+    amortized_nn_path = get_amortized_nn_path(name)
+    if not amortized_nn_path.exists():
+        return None
+    checkpoint = torch.load(amortized_nn_path)
+    net = ParametricNN(checkpoint['terms'], checkpoint['coef_ranges'], **checkpoint['architecture'])
+    net = net.to(getattr(torch, checkpoint['dtype']))
+    net.load_state_dict(checkpoint['state_dict'])
+    return net, checkpoint['fine_tune_epochs']
+
+
+def get_coef_ranges(exp_name: str, r0_list: [int | float] = None, margin: float = 0.1) -> ([str], [(float, float)]):
+    """
+    Gets the terms of the discovered equations of the experiment and the ranges of their coefficients in the
+    residual form, see get_residual_coefs, widened by the margin on both sides.
+
+    Args:
+        exp_name: Name of the experiment.
+        r0_list: The radius values to take the equations for (default is None, i.e. all).
+        margin: The fraction of the range to add on both sides (default is 0.1).
+
+    Returns:
+        tuple: The sorted terms and the ranges of their coefficients, a term missing from an equation has the
+        zero coefficient there.
+
+    Raises:
+        ValueError: If the experiment has no discovered equations.
+    """
+
+    results_dir = get_results_dir(exp_name)
+    coefs_list = []
+    for name in list_result_names(results_dir, 'text equations/eqn_'):
+        if r0_list is None or get_eqn_params(name.removeprefix('text equations/'))[0] in r0_list:
+            coefs_list.append(get_residual_coefs(load_result_text(results_dir, name)))
+    if not coefs_list:
+        raise ValueError(f'The experiment {exp_name} has no discovered equations')
+    terms = sorted({term for coefs in coefs_list for term in coefs})
+    values = np.array([[coefs.get(term, 0.0) for term in terms] for coefs in coefs_list])
+    low, high = values.min(axis=0), values.max(axis=0)
+    return terms, [(float(a - margin * (b - a)), float(b + margin * (b - a))) for a, b in zip(low, high)]
+
+
+def get_amortized_residual(net: ParametricNN, coefs: torch.Tensor, grid: torch.Tensor,
+                           max_deriv_order: int) -> torch.Tensor:
+    """
+    Evaluates the residuals of the equations with the given coefficients on the solutions of the network. The
+    residual of every equation is divided by its largest absolute coefficient, as in get_residual_scores, so
+    that the equations with large coefficients do not dominate the loss.
+
+    Args:
+        net: The parametric network.
+        coefs: The coefficients of the residuals of the shape (number of equations, number of terms).
+        grid: The grid of the shape (1, number of points, 1).
+        max_deriv_order: The highest derivative order of the terms.
+
+    Returns:
+        torch.Tensor: The scaled residuals of the shape (number of equations, number of points, 1).
+    """
+
+    grid = grid.expand(len(coefs), -1, -1).clone().requires_grad_(True)
+    fields = get_population_fields(lambda h: net(h, coefs), grid, max_deriv_order)
+    term_values = torch.stack([eval_term(term, fields) * torch.ones_like(fields['I']) for term in net.terms], dim=1)
+    residual = (coefs[:, :, None, None] * term_values).sum(dim=1)
+    return residual / coefs.abs().max(dim=1).values.clamp(min=torch.finfo(coefs.dtype).tiny).reshape(-1, 1, 1)
+
+
+def train_amortized_nn(net: ParametricNN, grid: torch.Tensor, training_epochs: int, batch_size: int = 64,
+                       lr: float = 1e-3, fixed_coefs: torch.Tensor = None, info_every: int = 1000) -> float:
+    """
+    Trains the parametric network to minimize the residuals of the equations. Every epoch draws a new batch of
+    coefficients uniformly from the trained ranges, unless the coefficients are fixed, e.g. to fine-tune the
+    network on one equation.
+
+    Args:
+        net: The parametric network.
+        grid: The grid of the shape (1, number of points, 1).
+        training_epochs: The number of epochs.
+        batch_size: The number of equations drawn per epoch (default is 64).
+        lr: The learning rate of Adam (default is 1e-3).
+        fixed_coefs: The coefficients to train on instead of the drawn ones (default is None).
+        info_every: The number of epochs between the loss reports, None to report nothing (default is 1000).
+
+    Returns:
+        float: The loss of the last epoch.
+    """
+
+    max_deriv_order = get_max_deriv_order(dict.fromkeys(net.terms, 1.0))
+    optimizer = torch.optim.Adam(net.parameters(), lr=lr)
+    loss = torch.tensor(float('nan'))
+    for epoch in range(training_epochs):
+        coefs = fixed_coefs
+        if coefs is None:
+            coefs = net.coef_low + (net.coef_high - net.coef_low) * torch.rand(batch_size, len(net.terms),
+                                                                               dtype=net.coef_low.dtype)
+        loss = (get_amortized_residual(net, coefs, grid, max_deriv_order) ** 2).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        if info_every and (epoch + 1) % info_every == 0:
+            print(f'[Amortized solver] epoch {epoch + 1}, loss = {loss.item():.4e}')
+    return loss.item()
+
+
+def train_amortized_solver(exp_name: str = 'optics', r0_list: [int | float] = None, training_epochs: int = 20000,
+                           batch_size: int = 64, n_points: int = 256, lr: float = 1e-3, margin: float = 0.1,
+                           fine_tune_epochs: int = 0, name: str = 'amortized_nn', nn_params: dict = None,
+                           random_state: int = 0) -> ParametricNN:
+    """
+    Trains one parametric network for all equations with the terms discovered in the experiment over the
+    ranges of their coefficients and saves it, so that the 'amortized' solver backend solves a population
+    by a single forward pass instead of training a network for every equation. The network is trained on the
+    uniform grid of the normalized layer thickness [0, 1], on which the experiments solve the equations.
+
+    Args:
+        exp_name: Name of the experiment with the discovered equations (default is 'optics').
+        r0_list: The radius values to take the equations for (default is None, i.e. all).
+        training_epochs: The number of epochs (default is 20000).
+        batch_size: The number of equations drawn per epoch (default is 64).
+        n_points: The number of the grid points (default is 256).
+        lr: The learning rate of Adam (default is 1e-3).
+        margin: The fraction of the coefficient ranges added on both sides, see get_coef_ranges (default is 0.1).
+        fine_tune_epochs: The number of epochs to fine-tune the network on every equation solved with it
+        (default is 0, i.e. the forward pass only).
+        name: The name to save the network under (default is 'amortized_nn').
+        nn_params: The width, the depth, the activation and the precision of the network, see get_nn_params
+        (default is None, i.e. the defaults).
+        random_state: The seed of the initialization and of the drawn coefficients (default is 0).
+
+    Returns:
+        ParametricNN: The trained network.
+    """
+
+    nn_params = get_nn_params(nn_params)
+    dtype = getattr(torch, nn_params['dtype'])
+    terms, coef_ranges = get_coef_ranges(exp_name, r0_list, margin)
+    print(f'[Amortized solver] terms: {terms}, coefficient ranges: {coef_ranges}')
+    torch.manual_seed(random_state)
+    with default_dtype(dtype):
+        net = ParametricNN(terms, coef_ranges, nn_params['width'], nn_params['depth'],
+                           nn_params['activation']).to(dtype)
+        grid = torch.linspace(0, 1, n_points, dtype=dtype).reshape(1, -1, 1)
+        training_time = time.perf_counter()
+        train_amortized_nn(net, grid, training_epochs, batch_size, lr)
+        training_time = time.perf_counter() - training_time
+        add_stage_info(epochs=training_epochs, epoch_time=training_time / max(training_epochs, 1))
+    save_amortized_nn(net, name, fine_tune_epochs)
+    return net
+
+
+def get_amortized_residual_rms(net: ParametricNN, coefs: torch.Tensor, grid: torch.Tensor) -> torch.Tensor:
+    max_deriv_order = get_max_deriv_order(dict.fromkeys(net.terms, 1.0))
+    residual = get_amortized_residual(net, coefs, grid, max_deriv_order).detach()
+    return torch.sqrt((residual ** 2).mean(dim=(1, 2)))
+
+
+def get_amortized_solutions(net: ParametricNN, text_eqs: [str], grid_training: np.ndarray, grid_test: np.ndarray,
+                            fine_tune_epochs: int = 0, lr: float = 1e-4,
+                            max_residual: float = amortized_max_residual) -> [tuple | None]:
+    """
+    Solves the equations by the parametric network: all equations the network covers are solved by one
+    forward pass, and, with fine-tuning, a copy of the network is trained briefly on every equation on the
+    training grid. Every solution is checked by the RMS of its scaled residual, see get_amortized_residual,
+    on the training grid, and the solutions above max_residual are rejected to be solved by another solver.
+
+    Args:
+        net: The trained parametric network.
+        text_eqs: The equations in EPDE text form.
+        grid_training: The training grid data.
+        grid_test: The testing grid data.
+        fine_tune_epochs: The number of epochs to fine-tune the network on every equation (default is 0).
+        lr: The learning rate of the fine-tuning (default is 1e-4).
+        max_residual: The largest RMS of the scaled residual of an accepted solution (default is
+        amortized_max_residual).
+
+    Returns:
+        list: Pairs of predicted solutions for the training and testing grids, one pair per equation, None for
+        the equations outside the family of the network and for the rejected solutions.
+    """
+
+    dtype = net.coef_low.dtype
+    coefs_list = [get_residual_coefs(text_eq) for text_eq in text_eqs]
+    covered = [k for k, coefs in enumerate(coefs_list) if net.covers(coefs)]
+    solutions = [None] * len(text_eqs)
+    if not covered:
+        return solutions
+    with default_dtype(dtype):
+        coefs = torch.tensor([[coefs_list[k].get(term, 0.0) for term in net.terms] for k in covered], dtype=dtype)
+        grid_training = get_grid_for_solver(grid_training, dtype).reshape(1, -1, 1)
+        grid_test = get_grid_for_solver(grid_test, dtype).reshape(1, -1, 1)
+        if not fine_tune_epochs:
+            residual_rms = get_amortized_residual_rms(net, coefs, grid_training)
+            with torch.no_grad():
+                pred_training = net(grid_training.expand(len(covered), -1, -1), coefs)
+                pred_test = net(grid_test.expand(len(covered), -1, -1), coefs)
+            for j, k in enumerate(covered):
+                if residual_rms[j] <= max_residual:
+                    solutions[k] = (pred_training[j].reshape(-1), pred_test[j].reshape(-1))
+        else:
+            for j, k in enumerate(covered):
+                eq_net = copy.deepcopy(net)
+                train_amortized_nn(eq_net, grid_training, fine_tune_epochs, lr=lr, fixed_coefs=coefs[j:j + 1],
+                                   info_every=None)
+                if get_amortized_residual_rms(eq_net, coefs[j:j + 1], grid_training)[0] <= max_residual:
+                    with torch.no_grad():
+                        solutions[k] = (eq_net(grid_training, coefs[j:j + 1]).reshape(-1),
+                                        eq_net(grid_test, coefs[j:j + 1]).reshape(-1))
+    add_stage_info(covered=len(covered), accepted=sum(solution is not None for solution in solutions))
+    return solutions
@@ -0,0 +1,333 @@
+import argparse
+import itertools
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+benchmark_stages = ('epde_discovery', 'get_solution', 'solver_configs', 'get_results_df', 'draw_solution')
+# the nn_params of the solver benchmarked by 'solver_configs'
+solver_configs = {'float32': {}, 'float64': {'dtype': 'float64'}, 'float32 script': {'compile': 'script'},
+                  'float32 compile': {'compile': 'compile'}, 'float32 50x2': {'width': 50, 'depth': 2},
+                  'float32 sin': {'activation': 'sin'},
+                  'float32 adaptive': {'collocation': {}}}
+benchmark_exp_name = 'benchmark'  # the experiment the synthetic results for get_results_df are written to
+
+
+def get_benchmarks_dir() -> Path:
+    """
+    Gets the directory with the history of the benchmark runs and the baseline.
+
+    Returns:
+        Path: The path of the benchmarks directory.
+    """
+
+    benchmarks_dir = Path.cwd() / 'results' / 'benchmarks'
+    benchmarks_dir.mkdir(parents=True, exist_ok=True)
+    return benchmarks_dir
+
+
+def get_decay_length(r0: int | float, h_max: int | float) -> float:
+    """
+    Gets the length of the steep decay of the synthetic T(H) profile: the decay is the steepest for the radius
+    values around 0.4, as in the FMM data.
+
+    Args:
+        r0: The radius of the dielectric inclusions in micrometers.
+        h_max: The maximum thickness of the layer.
+
+    Returns:
+        float: The decay length.
+    """
+
+    return h_max * (0.015 + 0.08 * (r0 - 0.4) ** 2)
+
+
+def get_synthetic_data(r0: int | float, n_points: int, h_max: int | float = 10.0, noise: float = 1e-3,
+                       random_state: int = 0) -> (np.ndarray, np.ndarray):
+    """
+    Generates a synthetic Poynting vector curve resembling the averaged T(H) data: I(0) = -1, a steep
+    decay near H = 0 followed by a slow tail to zero and a small measurement noise.
+
+    Args:
+        r0: The radius of the dielectric inclusions in micrometers.
+        n_points: The number of grid points.
+        h_max: The maximum thickness of the layer (default is 10.0).
+        noise: The standard deviation of the noise (default is 1e-3).
+        random_state: The seed of the noise (default is 0).
+
+    Returns:
+        tuple: The grid and the Poynting vector data.
+    """
+
+    grid = np.linspace(0, h_max, n_points)
+    decay_length = get_decay_length(r0, h_max)
+    poynting_vec = -(0.9 * np.exp(-grid / decay_length) + 0.1 * np.exp(-grid / (10 * decay_length)))
+    poynting_vec[1:] += np.random.default_rng(random_state).normal(0, noise, n_points - 1)
+    return grid, poynting_vec
+
+
+def get_synthetic_split_data(r0: int | float, n_points: int, test_size: float = 0.2,
+                             random_state: int = 0) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """
+    Generates the synthetic data and splits it as get_split_data does, with the grids normalized by the
+    maximum value.
+
+    Args:
+        r0: The radius of the dielectric inclusions in micrometers.
+        n_points: The number of grid points.
+        test_size: The fraction of the test points (default is 0.2).
+        random_state: The seed of the noise and the split (default is 0).
+
+    Returns:
+        tuple: The sorted training and test grids and the corresponding Poynting vector data.
+    """
+
+    grid, poynting_vec = get_synthetic_data(r0, n_points, random_state=random_state)
+    grid = grid / grid.max()
+    test = np.zeros(n_points, dtype=bool)
+    test[np.random.default_rng(random_state).choice(n_points, int(test_size * n_points), replace=False)] = True
+    return grid[~test], grid[test], poynting_vec[~test], poynting_vec[test]
+
+
+def write_synthetic_results(r0_list: [int | float], n_points: int, pop_size: int, nruns: int,
+                            random_state: int = 0) -> Path:
+    """
+    Writes synthetic results in the layout of the experiments: split data, equations in EPDE text form with
+    random coefficients and their solutions.
+
+    Args:
+        r0_list: List containing radius values.
+        n_points: The number of grid points.
+        pop_size: The population size.
+        nruns: The number of runs.
+        random_state: The seed of the coefficients and the solutions (default is 0).
+
+    Returns:
+        Path: The results directory of the synthetic experiment.
+    """
+
+    from results_analysis_tools import get_results_dir
+    from store_tools import save_array, save_text
+
+    results_dir = get_results_dir(benchmark_exp_name)
+    shutil.rmtree(results_dir)
+    results_dir.mkdir()
+    rng = np.random.default_rng(random_state)
+    for r0 in r0_list:
+        grid_training, grid_test, poynting_vec_training, poynting_vec_test = get_synthetic_split_data(r0, n_points)
+        for name, array in zip(('grid_training', 'grid_test', 'poynting_vec_training', 'poynting_vec_test'),
+                               (grid_training, grid_test, poynting_vec_training, poynting_vec_test)):
+            save_array(results_dir, f'split exp data/{name}_{r0}', array)
+        for i, run in itertools.product(range(pop_size), range(nruns)):
+            coefs = rng.normal(size=5)
+            save_text(results_dir, f'text equations/eqn_{r0}_{i}_{run}',
+                      f'{coefs[0]} * I{{power: 1.0}} + {coefs[1]} * I^2{{power: 1.0}} + '
+                      f'{coefs[2]} * t{{power: 1.0, dim: 0.0}} + {coefs[3]} * I^3{{power: 1.0}} + '
+                      f'{coefs[4]} = dI/dx0{{power: 1.0}}')
+            save_array(results_dir, f'solutions data/sln_data_training_{r0}_{i}_{run}',
+                       poynting_vec_training + rng.normal(0, 1e-2, len(poynting_vec_training)))
+            save_array(results_dir, f'solutions data/sln_data_test_{r0}_{i}_{run}',
+                       poynting_vec_test + rng.normal(0, 1e-2, len(poynting_vec_test)))
+    return results_dir
+
+
+def measure(func, repeats: int = 1) -> (float, object):
+    """
+    Measures the best wall time of the function over several calls.
+
+    Args:
+        func: The function without arguments.
+        repeats: The number of calls (default is 1).
+
+    Returns:
+        tuple: The best time in seconds and the result of the last call.
+    """
+
+    best_time, result = np.inf, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best_time = min(best_time, time.perf_counter() - start)
+    return best_time, result
+
+
+def run_benchmarks(stages: [str] = benchmark_stages, grid_sizes: [int] = (250, 1000, 4000),
+                   pop_sizes: [int] = (4, 8), r0: int | float = 0.4, repeats: int = 1,
+                   training_epde_epochs: int = 5, training_tedeous_epochs: int = 500) -> [dict]:
+    """
+    Runs the stages of the experiment pipeline on the synthetic data for every grid size and population size.
+    The heavy dependencies are imported only for the stages that need them.
+
+    Args:
+        stages: The stages to benchmark (default is all of benchmark_stages).
+        grid_sizes: The numbers of grid points (default is (250, 1000, 4000)).
+        pop_sizes: The EPDE population sizes (default is (4, 8)).
+        r0: The radius value to generate the data for (default is 0.4).
+        repeats: The number of measurements to take the best of (default is 1).
+        training_epde_epochs: The number of EPDE epochs (default is 5).
+        training_tedeous_epochs: The number of TEDEouS epochs (default is 500).
+
+    Returns:
+        list: The records with the stage, the grid size, the population size and the time in seconds; the
+        time of the 'solver_configs' records is the time of an epoch for the solver configuration, and they
+        have the RMSE of the solution on the test grid to compare the accuracy of the configurations.
+    """
+
+    records = []
+    for n_points in grid_sizes:
+        grid_training, grid_test, poynting_vec_training, poynting_vec_test = get_synthetic_split_data(r0, n_points)
+        eqs_solver_form, eqs_text_form = None, None
+        for pop_size in pop_sizes:
+            if 'epde_discovery' in stages or (eqs_solver_form is None and
+                                              ('get_solution' in stages or 'solver_configs' in stages)):
+                from discovery_tools import epde_discovery
+                stage_time, epde_search_obj = measure(lambda: epde_discovery(
+                    grid_training, poynting_vec_training, pop_size=pop_size, training_epochs=training_epde_epochs,
+                    use_smoothing=True), repeats)
+                eqs_solver_form = epde_search_obj.solver_forms()[0]
+                eqs_text_form = epde_search_obj.equations(only_print=False, only_str=True, num=1)[0]
+                if 'epde_discovery' in stages:
+                    records.append({'stage': 'epde_discovery', 'grid_size': n_points, 'pop_size': pop_size,
+                                    'time': stage_time})
+            if 'get_results_df' in stages:
+                from report_tools import get_results_df
+                r0_list = [r / 10 for r in range(1, 10)]
+                results_dir = write_synthetic_results(r0_list, n_points, pop_size, nruns=1)
+
+                def get_cold_results_df():
+                    (results_dir / '_aggregated_results.json').unlink(missing_ok=True)
+                    return get_results_df(r0_list, benchmark_exp_name, pop_size, 1)
+
+                stage_time, _ = measure(get_cold_results_df, repeats)
+                records.append({'stage': 'get_results_df', 'grid_size': n_points, 'pop_size': pop_size,
+                                'time': stage_time})
+                shutil.rmtree(results_dir)
+            if 'draw_solution' in stages:
+                from render_tools import render_solution, init_render_worker
+                init_render_worker()
+                with tempfile.TemporaryDirectory() as img_dir:
+                    stage_time, _ = measure(lambda: [render_solution(
+                        r0, 0.5, grid_training, grid_test, poynting_vec_training, poynting_vec_test,
+                        poynting_vec_training, poynting_vec_test, Path(img_dir) / f'sln_{r0}_{i}_0.png')
+                        for i in range(pop_size)], repeats)
+                records.append({'stage': 'draw_solution', 'grid_size': n_points, 'pop_size': pop_size,
+                                'time': stage_time})
+        if 'get_solution' in stages or 'solver_configs' in stages:
+            from solver_tools import get_solution
+        if 'get_solution' in stages:
+            with tempfile.TemporaryDirectory() as img_dir:
+                stage_time, _ = measure(lambda: get_solution(eqs_solver_form[0][0][1], poynting_vec_training,
+                                                             grid_training, grid_test, img_dir,
+                                                             training_epochs=training_tedeous_epochs), repeats)
+            records.append({'stage': 'get_solution', 'grid_size': n_points, 'pop_size': None,
+                            'time': stage_time})
+        if 'solver_configs' in stages:
+            from profile_tools import stage
+            for config, nn_params in solver_configs.items():
+                with tempfile.TemporaryDirectory() as img_dir, stage('get_solution') as record:
+                    _, pred_test = get_solution(eqs_solver_form[0][0][1], poynting_vec_training, grid_training,
+                                                grid_test, img_dir, training_epochs=training_tedeous_epochs,
+                                                nn_params=nn_params, text_eq=eqs_text_form[0])
+                rmse = float(np.sqrt(np.mean((pred_test.detach().numpy() - poynting_vec_test) ** 2)))
+                records.append({'stage': 'solver_configs', 'grid_size': n_points, 'pop_size': None,
+                                'config': config, 'time': record['epoch_time'],
+                                'epochs_per_second': 1 / record['epoch_time'], 'rmse': rmse,
+                                **({'collocation_points': record['collocation_points']}
+                                   if 'collocation_points' in record else {})})
+    return records
+
+
+def get_benchmark_key(record: dict) -> str:
+    config = f'|{record["config"]}' if 'config' in record else ''
+    return f'{record["stage"]}|{record["grid_size"]}|{record["pop_size"]}{config}'
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_benchmark_history(records: [dict]) -> None:
+    """
+    Appends the results of the benchmark run to the history file together with the date and the commit.
+
+    Args:
+        records: The records of run_benchmarks.
+
+    Returns:
+        None
+    """
+
+    entry = {'date': datetime.now().isoformat(timespec='seconds'), 'commit': get_commit(), 'records': records}
+    with (get_benchmarks_dir() / 'benchmark_history.jsonl').open(mode='a') as history_file:
+        history_file.write(json.dumps(entry) + '\n')
+
+
+def save_benchmark_baseline(records: [dict]) -> None:
+    """
+    Saves the results of the benchmark run as the baseline, updating the times of the benchmarked stages.
+
+    Args:
+        records: The records of run_benchmarks.
+
+    Returns:
+        None
+    """
+
+    baseline_file_path = get_benchmarks_dir() / 'benchmark_baseline.json'
+    baseline = json.loads(baseline_file_path.read_text()) if baseline_file_path.exists() else {}
+    baseline.update({get_benchmark_key(record): record['time'] for record in records})
+    baseline_file_path.write_text(json.dumps(baseline, indent=1))
+
+
+def get_regressions(records: [dict], tolerance: float = 0.2) -> [str]:
+    """
+    Compares the results of the benchmark run with the stored baseline.
+
+    Args:
+        records: The records of run_benchmarks.
+        tolerance: The relative slowdown regarded as a regression (default is 0.2).
+
+    Returns:
+        list: The descriptions of the regressions.
+    """
+
+    baseline_file_path = get_benchmarks_dir() / 'benchmark_baseline.json'
+    baseline = json.loads(baseline_file_path.read_text()) if baseline_file_path.exists() else {}
+    regressions = []
+    for record in records:
+        baseline_time = baseline.get(get_benchmark_key(record))
+        if baseline_time is not None and record['time'] > (1 + tolerance) * baseline_time:
+            regressions.append(f'{get_benchmark_key(record)}: {record["time"]:.3f} s against '
+                               f'{baseline_time:.3f} s in the baseline')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the experiment pipeline on synthetic T(H) data.')
+    parser.add_argument('--stages', nargs='+', choices=benchmark_stages, default=benchmark_stages)
+    parser.add_argument('--grid-sizes', nargs='+', type=int, default=[250, 1000, 4000])
+    parser.add_argument('--pop-sizes', nargs='+', type=int, default=[4, 8])
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    benchmark_records = run_benchmarks(args.stages, args.grid_sizes, args.pop_sizes, repeats=args.repeats)
+    for benchmark_record in benchmark_records:
+        epochs_per_second = benchmark_record.get('epochs_per_second')
+        print(f'{get_benchmark_key(benchmark_record):<40}{benchmark_record["time"]:>10.3f} s'
+              + (f'{epochs_per_second:>10.1f} epochs/s' if epochs_per_second else ''))
+    save_benchmark_history(benchmark_records)
+    for regression in get_regressions(benchmark_records, args.tolerance):
+        print(f'Regression: {regression}')
+    if args.save_baseline:
+        save_benchmark_baseline(benchmark_records)
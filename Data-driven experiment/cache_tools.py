@@ -0,0 +1,252 @@
+import hashlib
+from pathlib import Path
+import numpy as np
+import torch
+
+from equation_tools import get_canonical_equations, get_equation_structure
+from store_tools import write_atomically
+
+
+def get_solutions_cache_dir() -> Path:
+    """
+    Gets the directory of the solutions cache shared by all experiments.
+
+    Returns:
+        Path: The path of the cache directory.
+    """
+
+    cache_dir = Path.cwd() / 'results' / 'solutions cache'
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_solution_keys(text_eq: str, grid_training: np.ndarray, grid_test: np.ndarray,
+                      solver_settings: dict) -> [str]:
+    """
+    Computes the keys of the solution of the equation in the solutions cache: the key of the equation itself
+    and the keys of the equations equal to it within the tolerance of get_canonical_equations. The scale of the
+    coefficients is kept in the keys, since it weighs the residual against the boundary condition in the loss
+    of TEDEouS, to which the other backends fall back.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+        grid_training: The training grid data.
+        grid_test: The testing grid data.
+        solver_settings: The settings affecting the solution: the solver backend, the boundary condition,
+        the number of epochs etc.
+
+    Returns:
+        list: The hexadecimal keys of the solution, the key to save the solution with first.
+    """
+
+    settings_key = hashlib.sha256()
+    for grid in (grid_training, grid_test):
+        settings_key.update(np.ascontiguousarray(grid, dtype=np.float64).tobytes())
+    settings_key.update(repr(sorted(solver_settings.items())).encode())
+    keys = []
+    for canonical_equation in get_canonical_equations(text_eq, keep_scale=True):
+        key = settings_key.copy()
+        key.update(repr(canonical_equation).encode())
+        keys.append(key.hexdigest())
+    return keys
+
+
+def find_cached_solution(keys: [str]) -> str:
+    """
+    Finds the first of the keys of get_solution_keys under which a solution is cached.
+
+    Args:
+        keys: The keys of the solution.
+
+    Returns:
+        str: The key of the cached solution or the first key if the solution is not cached.
+    """
+
+    cache_dir = get_solutions_cache_dir()
+    return next((key for key in keys if (cache_dir / f'{key}.npz').exists()), keys[0])
+
+
+def load_cached_solution(key: str) -> tuple | None:
+    """
+    Loads the solution from the solutions cache.
+
+    Args:
+        key: The key of the solution.
+
+    Returns:
+        tuple | None: Predicted solutions for the training and testing grids or None if there is no such
+        solution in the cache.
+    """
+
+    cache_file_path = get_solutions_cache_dir() / f'{key}.npz'
+    if not cache_file_path.exists():
+        return None
+    with np.load(cache_file_path) as solution:
+        return torch.from_numpy(solution['training']), torch.from_numpy(solution['test'])
+
+
+def save_cached_solution(key: str, pred_solution_training: torch.Tensor, pred_solution_test: torch.Tensor) -> None:
+    """
+    Saves the solution to the solutions cache. The file is written under a temporary name and then renamed,
+    so that concurrent workers never read a partially written solution.
+
+    Args:
+        key: The key of the solution.
+        pred_solution_training: Predicted solution for the training grid.
+        pred_solution_test: Predicted solution for the testing grid.
+
+    Returns:
+        None
+    """
+
+    cache_file_path = get_solutions_cache_dir() / f'{key}.npz'
+
+    def write(tmp_file_path: Path) -> None:
+        with tmp_file_path.open(mode='wb') as file:
+            np.savez(file, training=pred_solution_training.detach().numpy(),
+                     test=pred_solution_test.detach().numpy())
+
+    write_atomically(cache_file_path, write)
+
+
+def get_derivatives_cache_dir() -> Path:
+    """
+    Gets the directory of the derivatives cache shared by all experiments.
+
+    Returns:
+        Path: The path of the cache directory.
+    """
+
+    cache_dir = Path.cwd() / 'results' / 'derivatives cache'
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_derivatives_key(grid: np.ndarray, values: np.ndarray, settings: dict) -> str:
+    """
+    Computes the key of the derivatives of the data in the derivatives cache.
+
+    Args:
+        grid: The grid data.
+        values: The values of the data on the grid.
+        settings: The settings of the differentiation: the highest order, the smoothing etc.
+
+    Returns:
+        str: The hexadecimal key of the derivatives.
+    """
+
+    key = hashlib.sha256(repr(sorted(settings.items())).encode())
+    for array in (grid, values):
+        key.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return key.hexdigest()
+
+
+def load_cached_derivatives(key: str) -> np.ndarray | None:
+    """
+    Loads the derivatives from the derivatives cache.
+
+    Args:
+        key: The key of the derivatives.
+
+    Returns:
+        np.ndarray | None: The derivatives or None if there are no such derivatives in the cache.
+    """
+
+    cache_file_path = get_derivatives_cache_dir() / f'{key}.npy'
+    return np.load(cache_file_path) if cache_file_path.exists() else None
+
+
+def save_cached_derivatives(key: str, derivs: np.ndarray) -> None:
+    """
+    Saves the derivatives to the derivatives cache through a temporary file.
+
+    Args:
+        key: The key of the derivatives.
+        derivs: The derivatives.
+
+    Returns:
+        None
+    """
+
+    cache_file_path = get_derivatives_cache_dir() / f'{key}.npy'
+
+    def write(tmp_file_path: Path) -> None:
+        with tmp_file_path.open(mode='wb') as file:
+            np.save(file, derivs)
+
+    write_atomically(cache_file_path, write)
+
+
+def get_weights_store_dir(results_dir: Path) -> Path:
+    """
+    Gets the directory of the weights store of the experiment. The weights are not shared between experiments,
+    since the networks of an experiment are trained on its own data.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        Path: The path of the weights store directory.
+    """
+
+    weights_dir = results_dir / 'weights store'
+    weights_dir.mkdir(parents=True, exist_ok=True)
+    return weights_dir
+
+
+def get_structure_key(text_eq: str) -> str:
+    """
+    Computes the key of the equation structure in the weights store.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+
+    Returns:
+        str: The hexadecimal key of the equation structure.
+    """
+
+    return hashlib.sha256(repr(get_equation_structure(text_eq)).encode()).hexdigest()[:16]
+
+
+def save_warm_start_weights(r0: int | float, text_eq: str, state_dict: dict, results_dir: Path) -> None:
+    """
+    Saves the weights of the network trained to solve the equation for the radius value to the weights store
+    of the experiment.
+
+    Args:
+        r0: The radius value.
+        text_eq: The equation in EPDE text form.
+        state_dict: The state dict of the network of the get_nn architecture.
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        None
+    """
+
+    weights_file_path = get_weights_store_dir(results_dir) / f'{get_structure_key(text_eq)}_{r0}.pt'
+    state_dict = {key: value.detach().clone() for key, value in state_dict.items()}
+    write_atomically(weights_file_path, lambda tmp_file_path: torch.save(state_dict, tmp_file_path))
+
+
+def load_warm_start_weights(r0: int | float, text_eq: str, results_dir: Path) -> dict | None:
+    """
+    Loads the weights to initialize the network solving the equation for the radius value: the weights of the
+    structurally identical equation solved in the experiment for the nearest radius value.
+
+    Args:
+        r0: The radius value.
+        text_eq: The equation in EPDE text form.
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        dict | None: The state dict of the network of the get_nn architecture or None if no structurally
+        identical equation has been solved in the experiment.
+    """
+
+    structure_key = get_structure_key(text_eq)
+    candidates = []
+    for weights_file_path in get_weights_store_dir(results_dir).glob(f'{structure_key}_*.pt'):
+        candidates.append((abs(float(weights_file_path.stem.split('_')[1]) - r0), weights_file_path))
+    if not candidates:
+        return None
+    return torch.load(min(candidates)[1], weights_only=True)
@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+import torch
+
+from store_tools import save_text, load_text, write_atomically
+
+
+def get_unit_name(kind: str, r0: int | float, run: int = None, i: int = None) -> str:
+    """
+    Gets the name of the work unit in the run manifest.
+
+    Args:
+        kind: The kind of the unit: 'split', 'discovery', 'solution' or 'run'.
+        r0: The radius value.
+        run: The run number (default is None for the units of the whole radius).
+        i: The index of the equation in the population (default is None for the units of the whole run).
+
+    Returns:
+        str: The name of the unit, e.g. 'manifest/solution_0.1_0_3'.
+    """
+
+    return 'manifest/' + '_'.join([kind] + [str(key) for key in (r0, run, i) if key is not None])
+
+
+def mark_unit_done(results_dir: Path, unit_name: str, info: dict = None) -> None:
+    """
+    Records the work unit as completed in the run manifest. The manifest is kept in the results store, whose
+    entries are appended atomically, so a unit is either recorded completely or not at all.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        unit_name: The name of the unit from get_unit_name.
+        info: The information needed to resume from the unit, e.g. the discovered equations (default is None).
+
+    Returns:
+        None
+    """
+
+    save_text(results_dir, unit_name, json.dumps(info or {}))
+
+
+def get_done_unit(results_dir: Path, unit_name: str) -> dict | None:
+    """
+    Gets the information recorded for the completed work unit.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        unit_name: The name of the unit from get_unit_name.
+
+    Returns:
+        dict | None: The recorded information or None if the unit is not completed.
+    """
+
+    info = load_text(results_dir, unit_name)
+    return None if info is None else json.loads(info)
+
+
+def save_solver_forms(results_dir: Path, r0: int | float, run: int, eqs_solver_form: list) -> None:
+    """
+    Saves the discovered equations in the solver form, so that the solving can be resumed without repeating
+    the discovery.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        r0: The radius value.
+        run: The run number.
+        eqs_solver_form: The equations in the solver form.
+
+    Returns:
+        None
+    """
+
+    write_atomically(results_dir / 'checkpoints' / f'solver_forms_{r0}_{run}.pt',
+                     lambda file_path: torch.save(eqs_solver_form, file_path))
+
+
+def load_solver_forms(results_dir: Path, r0: int | float, run: int) -> list | None:
+    """
+    Loads the discovered equations in the solver form saved by save_solver_forms.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        r0: The radius value.
+        run: The run number.
+
+    Returns:
+        list | None: The equations in the solver form or None if they were not saved.
+    """
+
+    file_path = results_dir / 'checkpoints' / f'solver_forms_{r0}_{run}.pt'
+    return torch.load(file_path, weights_only=False) if file_path.exists() else None
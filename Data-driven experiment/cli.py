@@ -0,0 +1,250 @@
+import argparse
+
+# The heavy modules (torch, epde, tedeous, matplotlib) are imported by the subcommands that need them, so that
+# aggregate and status start fast and run without them installed.
+
+
+def discover(args: argparse.Namespace) -> None:
+    from tedeous.device import solver_device
+    from interface import start_exp, start_parallel_exp
+
+    solver_device('cpu')
+    kwargs = {'exp_name': args.exp_name, 'nruns': args.nruns, 'solve_equations': False, 'pop_size': args.pop_size,
+              'factors_max_number': args.factors, 'poly_order': args.poly_order,
+              'max_deriv_order': (args.max_deriv_order,), 'equation_terms_max_number': args.terms,
+              'training_epde_epochs': args.epde_epochs, 'use_smoothing': args.smoothing,
+              'decimation_stride': args.decimation_stride, 'precompute_derivs': args.precompute_derivs,
+              'eq_sparsity_interval': tuple(args.eq_sparsity_interval)}
+    if args.workers == 1:
+        for r0 in args.r0:
+            start_exp(r0, args.wave_length, **kwargs)
+    else:
+        start_parallel_exp(args.r0, args.wave_length, max_workers=args.workers, **kwargs)
+
+
+def pipeline(args: argparse.Namespace) -> None:
+    from tedeous.device import solver_device
+    from interface import start_pipeline_exp
+
+    solver_device('cpu')
+    stage_workers = {'discovery': args.discovery_workers, 'solve': args.solve_workers, 'save': args.save_workers,
+                     'render': args.render_workers}
+    start_pipeline_exp(args.r0, args.wave_length, exp_name=args.exp_name, nruns=args.nruns, pop_size=args.pop_size,
+                       training_epde_epochs=args.epde_epochs, training_tedeous_epochs=args.tedeous_epochs,
+                       use_smoothing=args.smoothing, solver_backend=args.backend, solve_top_k=args.top_k,
+                       stage_workers=stage_workers, queue_size=args.queue_size, threads_per_worker=args.threads)
+
+
+def solve(args: argparse.Namespace) -> None:
+    from tedeous.device import solver_device
+    from interface import solve_exp
+
+    solver_device('cpu')
+    nn_params = {key: getattr(args, key) for key in ('width', 'depth', 'activation', 'dtype', 'compile')
+                 if getattr(args, key) is not None}
+    if args.adaptive_collocation:
+        nn_params['collocation'] = {}
+    solve_exp(args.r0, args.wave_length, args.exp_name, args.nruns, args.tedeous_epochs, args.backend,
+              not args.no_cache, args.warm_start, args.top_k, args.render_mode, args.render_workers, nn_params,
+              args.smoothing)
+
+
+def aggregate(args: argparse.Namespace) -> None:
+    from report_tools import save_total_results, export_results_text_form
+
+    save_total_results(args.r0, args.exp_name, args.pop_size, args.nruns)
+    if args.export_text:
+        export_results_text_form(args.exp_name, compact=args.compact)
+
+
+def render(args: argparse.Namespace) -> None:
+    from results_analysis_tools import get_results_dir
+    from render_tools import render_results_dir
+
+    render_results_dir(get_results_dir(args.exp_name), args.wave_length, args.r0, add_legend=args.legend,
+                       add_training_data=args.training_data, max_workers=args.workers)
+
+
+def status(args: argparse.Namespace) -> None:
+    from report_tools import get_exp_status
+
+    for key, value in get_exp_status(args.exp_name).items():
+        print(f'{key}: {value}')
+
+
+def ingest(args: argparse.Namespace) -> None:
+    from ensemble_tools import ingest_realizations
+
+    for r0 in args.r0:
+        result = ingest_realizations(r0, min_change=args.min_change)
+        print(f'r0 = {r0}: ' + ', '.join(f'{key} = {value}' for key, value in result.items()))
+
+
+def predict(args: argparse.Namespace) -> None:
+    from surrogate_tools import fit_coef_surrogate, load_coef_surrogate, predict_equation
+
+    surrogate = None if args.refit else load_coef_surrogate(args.exp_name)
+    if surrogate is None or surrogate['method'] != args.method:
+        surrogate = fit_coef_surrogate(args.r0, args.exp_name, args.pop_size, args.nruns, args.method)
+    for r0 in args.at:
+        prediction = predict_equation(r0, surrogate=surrogate, validate=args.validate, extrapolate=args.extrapolate)
+        print(f'r0 = {r0}: {prediction["text_eq"]}' + (f', rmse = {prediction["rmse"]}' if args.validate else ''))
+
+
+def train_amortized(args: argparse.Namespace) -> None:
+    from amortized_tools import train_amortized_solver
+
+    nn_params = {key: getattr(args, key) for key in ('width', 'depth', 'activation', 'dtype')
+                 if getattr(args, key) is not None}
+    train_amortized_solver(args.exp_name, args.r0, args.epochs, args.batch_size, args.points,
+                           fine_tune_epochs=args.fine_tune_epochs, nn_params=nn_params)
+
+
+def worker(args: argparse.Namespace) -> None:
+    from interface import start_queue_worker
+
+    start_queue_worker(args.exp_name, args.threads, args.render_mode, args.lease_timeout, args.heartbeat_interval,
+                       args.poll_interval, args.max_attempts)
+
+
+def requeue(args: argparse.Namespace) -> None:
+    from queue_tools import get_queue_dir, requeue_failed_units
+    from results_analysis_tools import get_results_dir
+
+    print(f'{requeue_failed_units(get_queue_dir(get_results_dir(args.exp_name)))} failed units re-queued')
+
+
+def get_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--exp-name', default='optics', help='The name of the experiment')
+    common.add_argument('--r0', nargs='+', type=float, default=[r / 10 for r in range(1, 10)],
+                        help='The radius values of the dielectric inclusions in micrometers')
+    common.add_argument('--wave-length', type=float, default=0.5, help='The wavelength in micrometers')
+    common.add_argument('--nruns', type=int, default=1, help='The number of EPDE runs for every radius value')
+    common.add_argument('--pop-size', type=int, default=6, help='The EPDE population size')
+
+    parser = argparse.ArgumentParser(description='Runs the stages of the optics experiment. Run it from the '
+                                                 'directory containing the data and results directories.')
+    subparsers = parser.add_subparsers(required=True)
+
+    parser_discover = subparsers.add_parser('discover', parents=[common], help='Discover the equations by EPDE')
+    parser_discover.add_argument('--workers', type=int, default=1, help='The number of processes for the sweep')
+    parser_discover.add_argument('--epde-epochs', type=int, default=100)
+    parser_discover.add_argument('--poly-order', type=int, default=4)
+    parser_discover.add_argument('--terms', type=int, default=5, help='Maximum number of equation terms')
+    parser_discover.add_argument('--factors', type=int, default=1, help='Maximum number of factors in a term')
+    parser_discover.add_argument('--max-deriv-order', type=int, default=2)
+    parser_discover.add_argument('--smoothing', action=argparse.BooleanOptionalAction, default=True)
+    parser_discover.add_argument('--decimation-stride', type=int, default=None,
+                                 help='Search on every n-th point and rescore the equations on the full grid')
+    parser_discover.add_argument('--precompute-derivs', action='store_true',
+                                 help='Pass the cached derivatives to EPDE instead of its own preprocessing')
+    parser_discover.add_argument('--eq-sparsity-interval', nargs=2, type=float, default=[1e-12, 1e-4])
+    parser_discover.set_defaults(func=discover)
+
+    parser_solve = subparsers.add_parser('solve', parents=[common], help='Solve the discovered equations')
+    parser_solve.add_argument('--tedeous-epochs', type=int, default=10000)
+    parser_solve.add_argument('--backend', choices=('tedeous', 'batched', 'ode', 'amortized'),
+                              default='tedeous')
+    parser_solve.add_argument('--top-k', type=int, default=None, help='The number of equations to solve')
+    parser_solve.add_argument('--warm-start', action='store_true')
+    parser_solve.add_argument('--no-cache', action='store_true', help='Do not use the solutions cache')
+    parser_solve.add_argument('--render-mode', choices=('inline', 'background', 'deferred'), default='deferred')
+    parser_solve.add_argument('--render-workers', type=int, default=None)
+    parser_solve.add_argument('--smoothing', action=argparse.BooleanOptionalAction, default=True)
+    parser_solve.add_argument('--width', type=int, default=None, help='The width of the solver network')
+    parser_solve.add_argument('--depth', type=int, default=None, help='The number of hidden layers')
+    parser_solve.add_argument('--activation', choices=('tanh', 'sin', 'gelu', 'silu'), default=None)
+    parser_solve.add_argument('--dtype', choices=('float32', 'float64'), default=None)
+    parser_solve.add_argument('--compile', choices=('script', 'compile'), default=None)
+    parser_solve.add_argument('--adaptive-collocation', action='store_true',
+                              help='Train on the points with the largest residual instead of the whole grid; '
+                                   'not supported by the batched backend')
+    parser_solve.set_defaults(func=solve)
+
+    parser_pipeline = subparsers.add_parser('pipeline', parents=[common],
+                                            help='Discover, solve, save and render in overlapping stages')
+    parser_pipeline.add_argument('--epde-epochs', type=int, default=100)
+    parser_pipeline.add_argument('--tedeous-epochs', type=int, default=10000)
+    parser_pipeline.add_argument('--smoothing', action=argparse.BooleanOptionalAction, default=True)
+    parser_pipeline.add_argument('--backend', choices=('tedeous', 'batched', 'ode', 'amortized'), default='tedeous')
+    parser_pipeline.add_argument('--top-k', type=int, default=None, help='The number of equations to solve')
+    parser_pipeline.add_argument('--discovery-workers', type=int, default=1)
+    parser_pipeline.add_argument('--solve-workers', type=int, default=1)
+    parser_pipeline.add_argument('--save-workers', type=int, default=1)
+    parser_pipeline.add_argument('--render-workers', type=int, default=1, help='0 skips the rendering')
+    parser_pipeline.add_argument('--queue-size', type=int, default=4, help='The capacity of every stage queue')
+    parser_pipeline.add_argument('--threads', type=int, default=1, help='The number of torch intra-op threads')
+    parser_pipeline.set_defaults(func=pipeline)
+
+    parser_aggregate = subparsers.add_parser('aggregate', parents=[common],
+                                             help='Save the total results in the CSV and the LaTeX form')
+    parser_aggregate.add_argument('--export-text', action='store_true',
+                                  help='Export the results store to the per-file text layout as well')
+    parser_aggregate.add_argument('--compact', action='store_true',
+                                  help='Compact the results store before the export; only when no worker runs '
+                                       'the experiment')
+    parser_aggregate.set_defaults(func=aggregate)
+
+    parser_render = subparsers.add_parser('render', parents=[common], help='Render the saved solutions')
+    parser_render.add_argument('--legend', action='store_true')
+    parser_render.add_argument('--training-data', action='store_true')
+    parser_render.add_argument('--workers', type=int, default=None, help='The number of rendering processes')
+    parser_render.set_defaults(func=render)
+
+    parser_status = subparsers.add_parser('status', parents=[common], help='Show the progress of the experiment')
+    parser_status.set_defaults(func=status)
+
+    parser_ingest = subparsers.add_parser('ingest', parents=[common],
+                                          help='Ingest the new FMM realizations into the ensemble average')
+    parser_ingest.add_argument('--min-change', type=float, default=0.0,
+                               help='The change of the average in standard errors needed to publish it')
+    parser_ingest.set_defaults(func=ingest)
+
+    parser_predict = subparsers.add_parser('predict', parents=[common],
+                                           help='Predict the equations for new radius values by the coefficient '
+                                                'surrogate fitted on the results for --r0')
+    parser_predict.add_argument('--at', nargs='+', type=float, required=True,
+                                help='The radius values to predict the equations for')
+    parser_predict.add_argument('--method', choices=('linear', 'pchip', 'cubic'), default='pchip')
+    parser_predict.add_argument('--validate', action='store_true',
+                                help='Solve the predicted equations and compare them with the data, if any')
+    parser_predict.add_argument('--extrapolate', action='store_true')
+    parser_predict.add_argument('--refit', action='store_true', help='Fit the surrogate again')
+    parser_predict.set_defaults(func=predict)
+
+    parser_amortized = subparsers.add_parser('train-amortized', parents=[common],
+                                             help='Train the network solving all equations of the experiment '
+                                                  'for the amortized solver backend')
+    parser_amortized.add_argument('--epochs', type=int, default=20000)
+    parser_amortized.add_argument('--batch-size', type=int, default=64, help='The number of equations per epoch')
+    parser_amortized.add_argument('--points', type=int, default=256, help='The number of the grid points')
+    parser_amortized.add_argument('--fine-tune-epochs', type=int, default=0,
+                                  help='The number of epochs to fine-tune the network on every solved equation')
+    parser_amortized.add_argument('--width', type=int, default=None)
+    parser_amortized.add_argument('--depth', type=int, default=None)
+    parser_amortized.add_argument('--activation', choices=('tanh', 'sin', 'gelu', 'silu'), default=None)
+    parser_amortized.add_argument('--dtype', choices=('float32', 'float64'), default=None)
+    parser_amortized.set_defaults(func=train_amortized)
+
+    parser_worker = subparsers.add_parser('worker', parents=[common],
+                                          help='Process the work queue of the experiment put by enqueue_exp')
+    parser_worker.add_argument('--threads', type=int, default=1, help='The number of torch intra-op threads')
+    parser_worker.add_argument('--render-mode', choices=('inline', 'background', 'deferred'), default='inline')
+    parser_worker.add_argument('--lease-timeout', type=float, default=3600,
+                               help='The time without a heartbeat after which a unit is given to another worker, s')
+    parser_worker.add_argument('--heartbeat-interval', type=float, default=60)
+    parser_worker.add_argument('--poll-interval', type=float, default=30)
+    parser_worker.add_argument('--max-attempts', type=int, default=3,
+                               help='The number of the failures of a unit after which it is not retried')
+    parser_worker.set_defaults(func=worker)
+
+    parser_requeue = subparsers.add_parser('requeue', parents=[common],
+                                           help='Put the failed units of the work queue back to pending')
+    parser_requeue.set_defaults(func=requeue)
+    return parser
+
+
+if __name__ == '__main__':
+    cli_args = get_parser().parse_args()
+    cli_args.func(cli_args)
@@ -1,21 +1,157 @@
+import hashlib
+import json
+import re
 from pathlib import Path
 import numpy as np
 
+from store_tools import write_atomically
 
-def get_data(r0: int | float) -> (np.ndarray, np.ndarray):
+datasets_registry = {}  # the discovered datasets, keyed by the data root directory
+
+
+def get_data_root() -> Path:
+    """
+    Gets the directory containing the FMM data folders 'T(H) r0=...'.
+
+    Returns:
+        Path: The path of the data directory.
+    """
+
+    return Path.cwd() / 'data' / 'new optics_data'
+
+
+def get_datasets(data_root: Path = None) -> dict:
+    """
+    Discovers the data folders 'T(H) r0=...' once and returns the registry of the datasets.
+
+    Args:
+        data_root: The directory containing the data folders (default is None, i.e. get_data_root()).
+
+    Returns:
+        dict: The data folders keyed by the r0 value.
+    """
+
+    if data_root is None:
+        data_root = get_data_root()
+    if data_root not in datasets_registry:
+        datasets = {}
+        for data_dir in data_root.glob('T(H) r0=*'):
+            r0 = re.fullmatch(r'T\(H\) r0=(.+)', data_dir.name).group(1)
+            datasets[float(r0) if '.' in r0 else int(r0)] = data_dir
+        datasets_registry[data_root] = datasets
+    return datasets_registry[data_root]
+
+
+def get_file_hash(file_path: Path) -> str:
+    """
+    Computes the SHA-256 hash of the file content.
+
+    Args:
+        file_path: The path of the file.
+
+    Returns:
+        str: The hexadecimal hash.
+    """
+
+    with file_path.open(mode='rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def load_cached_array(source_file: Path) -> np.ndarray:
+    """
+    Loads the array from the text source file through its binary cache. On the first access the text file
+    is parsed and saved as .npy next to it, later accesses memory-map the .npy file. The cache is rebuilt
+    when the modification time or the size of the source changes and its hash differs from the cached one.
+
+    Args:
+        source_file: The path of the comma-separated text file.
+
+    Returns:
+        np.ndarray: The read-only memory-mapped array.
+    """
+
+    cache_dir = source_file.parent / '.cache'
+    cache_dir.mkdir(exist_ok=True)
+    cache_file = cache_dir / f'{source_file.stem}.npy'
+    meta_file = cache_dir / f'{source_file.stem}.json'
+    stat = source_file.stat()
+    meta = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    cached_meta = json.loads(meta_file.read_text()) if meta_file.exists() and cache_file.exists() else None
+    if cached_meta is not None and all(cached_meta.get(key) == value for key, value in meta.items()):
+        return np.load(cache_file, mmap_mode='r')
+
+    meta['sha256'] = get_file_hash(source_file)
+    if cached_meta is None or cached_meta.get('sha256') != meta['sha256']:
+        array = np.genfromtxt(source_file, delimiter=',')
+
+        def write(tmp_file_path: Path) -> None:
+            with tmp_file_path.open(mode='wb') as file:
+                np.save(file, array)
+
+        write_atomically(cache_file, write)
+    write_atomically(meta_file, lambda tmp_file_path: tmp_file_path.write_text(json.dumps(meta)))
+    return np.load(cache_file, mmap_mode='r')
+
+
+def get_data(r0: int | float, h_range: (float, float) = None) -> (np.ndarray, np.ndarray):
     """
     Reads and gets grid and Poynting vector data from files based on the fixed r0 value.
 
     Args:
         r0 (float): The fixed r0 value used to locate the data files. This is the radius of the dielectric
         inclusions in 2D supercell model of the inhomogeneous layer.
+        h_range (tuple): The range (H_min, H_max) of the layer thickness to get the data for (default is None,
+        i.e. the whole grid).
 
     Returns:
         tuple: A tuple containing the grid data and Poynting vector data.
     """
-    data_dir = Path.cwd() / 'data' / 'new optics_data' / f'T(H) r0={r0}'
-    grid_file = data_dir / f'grid_{r0}.txt'
-    poynting_vec_file = data_dir / f'T_av_{r0}.txt'
-    grid = np.genfromtxt(grid_file, delimiter=',')
-    poynting_vec = np.genfromtxt(poynting_vec_file, delimiter=',')
+
+    data_dir = get_datasets().get(r0, get_data_root() / f'T(H) r0={r0}')
+    grid = load_cached_array(data_dir / f'grid_{r0}.txt')
+    poynting_vec = load_cached_array(data_dir / f'T_av_{r0}.txt')
+    if h_range is not None:
+        start, stop = np.searchsorted(grid, h_range[0]), np.searchsorted(grid, h_range[1], side='right')
+        grid, poynting_vec = grid[start:stop], poynting_vec[start:stop]
     return grid, poynting_vec
+
+
+def get_derivatives(grid: np.ndarray, values: np.ndarray, max_deriv_order: int = 2, use_smoothing: bool = True,
+                    sigma: int | float = 1, window: int = 3, poly_order: int = 3) -> np.ndarray:
+    """
+    Computes the derivatives of the data on the (possibly non-uniform) sorted grid in the way of the EPDE
+    polynomial preprocessor, but vectorized: the data is smoothed by the Gaussian filter, then a polynomial is
+    fitted by least squares to the 2 * window + 1 points around every point at once and differentiated.
+
+    Args:
+        grid: The sorted grid data.
+        values: The values of the data on the grid.
+        max_deriv_order: The highest derivative order (default is 2).
+        use_smoothing: The flag whether to smooth the data by the Gaussian filter (default is True).
+        sigma: The standard deviation of the Gaussian filter in grid points (default is 1).
+        window: The number of points on each side of the point the polynomial is fitted to (default is 3).
+        poly_order: The order of the fitted polynomials (default is 3).
+
+    Returns:
+        np.ndarray: The derivatives of the orders from 1 to max_deriv_order as the columns.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    if use_smoothing:
+        from scipy.ndimage import gaussian_filter1d
+        values = gaussian_filter1d(values, sigma, mode='nearest')
+    n_points = len(grid)
+    size = min(2 * window + 1, n_points)
+    starts = np.clip(np.arange(n_points) - size // 2, 0, n_points - size)
+    indices = starts[:, None] + np.arange(size)
+    offsets = grid[indices] - grid[:, None]
+    scales = np.abs(offsets).max(axis=1, keepdims=True)  # the offsets are scaled for the conditioning
+    powers = np.arange(min(poly_order, size - 1) + 1)
+    coefs = (np.linalg.pinv((offsets / scales)[..., None] ** powers) @ values[indices][..., None])[..., 0]
+    coefs = coefs / scales ** powers
+    factorials = np.cumprod(np.concatenate(([1], powers[1:])))
+    derivs = np.zeros((n_points, max_deriv_order))
+    orders = min(max_deriv_order, len(powers) - 1)
+    derivs[:, :orders] = coefs[:, 1:orders + 1] * factorials[1:orders + 1]
+    return derivs
@@ -2,6 +2,14 @@ import epde.interface.interface as epde_alg
 import numpy as np
 from epde.interface.prepared_tokens import GridTokens, CacheStoredTokens
 from epde.interface.interface import EpdeSearch
+from epde.interface.equation_translator import parse_equation_str, parse_factor, float_convertable
+from epde.interface.solver_integration import SystemSolverInterface
+from epde.optimizers.moeadd.moeadd import MOEADDOptimizer
+from epde.structure.encoding import Chromosome
+from epde.structure.main_structures import Term, Equation, SoEq
+
+from data_tools import get_derivatives
+from equation_tools import get_equation_text_form, get_equation_structure, get_data_fields, refit_equation
 
 
 def set_de_params(epde_search_obj: epde_alg.EpdeSearch, pop_size: int, training_epochs: int) -> None:
@@ -66,12 +74,165 @@ def set_epde_preprocessor(epde_search_obj: EpdeSearch, use_smoothing: bool, use_
                                                               'poly_order': 3})
 
 
+def get_seed_terms(text_eq: str, pool) -> [Term]:
+    """
+    Translates the terms of an equation in EPDE text form into the terms built from the tokens of the pool.
+    The constant term is skipped, since the coefficients are fitted again by the search.
+
+    Args:
+        text_eq: The first line of the equation in EPDE text form.
+        pool: The pool of tokens of the EPDE search object.
+
+    Returns:
+        list: The terms of the equation including the right part one.
+
+    Raises:
+        IndexError: If the equation contains a token that is absent in the pool.
+    """
+
+    return [Term(pool, passed_term=[parse_factor(factor, pool) for factor in term if not float_convertable(factor)],
+                 collapse_powers=False)
+            for term in parse_equation_str(text_eq) if not all(float_convertable(factor) for factor in term)]
+
+
+def is_same_structure(terms: list, other_terms: list) -> bool:
+    return (len(terms) == len(other_terms) and all(any(term == other for other in other_terms) for term in terms)
+            and all(any(other == term for term in terms) for other in other_terms))
+
+
+def seed_population(candidates: list, seed_equations: [str], pool, variable_name: str) -> int:
+    """
+    Replaces the structure of the first candidates of the initial population with the structures of the seed
+    equations. The terms of a candidate that do not fit the seed equation are kept, so every candidate
+    still has the configured number of terms; the seeds with tokens absent in the pool are skipped. The seeds
+    repeating the structure of an earlier seed or giving a candidate the structure of another candidate are
+    skipped too, since EPDE rejects an initial population with duplicate candidates.
+
+    Args:
+        candidates: The candidates of the initial population.
+        seed_equations: The seed equations in EPDE text form.
+        pool: The pool of tokens of the EPDE search object.
+        variable_name: The name of the variable explained by the equations.
+
+    Returns:
+        int: The number of seeded candidates.
+    """
+
+    seeded, seed_structures = 0, set()
+    for text_eq in seed_equations:
+        if seeded == len(candidates):
+            break
+        if get_equation_structure(text_eq) in seed_structures:
+            continue
+        try:
+            seed_terms = get_seed_terms(text_eq, pool)
+        except IndexError:
+            continue
+        equation = candidates[seeded].vals[variable_name]
+        other_terms = [term for term in equation.structure if all(term != seed_term for seed_term in seed_terms)]
+        structure = (seed_terms + other_terms)[:len(equation.structure)]
+        if any(is_same_structure(structure, candidate.vals[variable_name].structure)
+               for k, candidate in enumerate(candidates) if k != seeded):
+            continue
+        seed_structures.add(get_equation_structure(text_eq))
+        equation.structure = structure
+        for term in equation.structure:
+            term.use_cache()
+        seeded += 1
+    return seeded
+
+
+def seeded_fit(epde_search_obj: EpdeSearch, seed_equations: [str], training_epochs: int, patience: int,
+               data: list, variable_names: [str], max_deriv_order: (int, ), derivs: [np.ndarray],
+               additional_tokens: list, data_fun_pow: int, equation_terms_max_number: int,
+               equation_factors_max_number: int, eq_sparsity_interval: (float, float)) -> int:
+    """
+    Performs the multiobjective EPDE search as EpdeSearch.fit does, but starts it from the population seeded
+    with the given equations and stops it when the best values of the objectives have not improved for
+    patience epochs.
+
+    Args:
+        epde_search_obj: The EPDE search object with the preprocessor and the MOEADD parameters set.
+        seed_equations: The seed equations in EPDE text form.
+        training_epochs: The maximum number of training epochs.
+        patience: The number of epochs without improvement of the objectives to stop after.
+        data: The values of the modeled variables.
+        variable_names: The names of variables.
+        max_deriv_order: The maximum derivative order.
+        derivs: The derivatives data.
+        additional_tokens: The additional token families.
+        data_fun_pow: The highest power of derivative-like token in the equation.
+        equation_terms_max_number: The maximum number of terms in the equations.
+        equation_factors_max_number: The maximum number of factors in the terms.
+        eq_sparsity_interval: The interval of the sparsity constant.
+
+    Returns:
+        int: The number of epochs run.
+    """
+
+    epde_search_obj.create_pool(data=data, variable_names=variable_names, derivs=derivs,
+                                max_deriv_order=max_deriv_order, additional_tokens=additional_tokens,
+                                data_fun_pow=data_fun_pow)
+    epde_search_obj.optimizer_init_params['population_instruct'] = {
+        'pool': epde_search_obj.pool, 'terms_number': equation_terms_max_number,
+        'max_factors_in_term': equation_factors_max_number, 'sparsity_interval': eq_sparsity_interval}
+    optimizer = MOEADDOptimizer(**epde_search_obj.optimizer_init_params)
+    seed_population(optimizer.pareto_levels.unplaced_candidates, seed_equations, epde_search_obj.pool,
+                    variable_names[0])
+    equations_number = len([1 for token_family in epde_search_obj.pool.families
+                            if token_family.status['demands_equation']])
+    optimizer.pass_best_objectives(*np.concatenate((np.zeros(equations_number), np.ones(equations_number))))
+    optimizer.set_strategy(epde_search_obj.director)
+    epde_search_obj.optimizer = optimizer
+
+    best_objectives, epochs_without_improvement, epoch = np.inf, 0, 0
+    for epoch in range(1, training_epochs + 1):
+        optimizer.optimize(epochs=1)
+        objectives = optimizer.pareto_levels.get_stats().min(axis=0)
+        epochs_without_improvement = 0 if np.any(objectives < best_objectives) else epochs_without_improvement + 1
+        best_objectives = np.minimum(objectives, best_objectives)
+        if epochs_without_improvement >= patience:
+            break
+    epde_search_obj.search_conducted = True
+    return epoch
+
+
+def init_epde_search(grid: np.ndarray, poynting_vec: np.ndarray, poly_order: int, use_smoothing: bool,
+                     use_ann: bool = False, use_grid_tokens: bool = True) -> (EpdeSearch, list):
+    """
+    Creates the EPDE search object on the grid with the preprocessor and the additional token families
+    of the experiment: the polynomials of the Poynting vector and, if requested, the grid.
+
+    Args:
+        grid: The grid data.
+        poynting_vec: The Poynting vector data.
+        poly_order: The order of polynomials to generate tokens for.
+        use_smoothing: Flag to indicate whether to use Gaussian smoothing.
+        use_ann: Flag to indicate whether to use ANN preprocessor (default is False).
+        use_grid_tokens: The flag whether to add the grid tokens; without them the polynomial family is passed
+        twice, as epde_discovery always did with the given derivatives (default is True).
+
+    Returns:
+        tuple: The EPDE search object and the additional token families.
+    """
+
+    dimensionality = poynting_vec.ndim - 1
+    epde_search_obj = epde_alg.EpdeSearch(use_solver=False, dimensionality=dimensionality,
+                                          coordinate_tensors=[grid, ])
+    set_epde_preprocessor(epde_search_obj, use_smoothing=use_smoothing, use_ann=use_ann)
+    polynomial_tokens = get_polynomial_family(poynting_vec, poly_order)
+    return epde_search_obj, [polynomial_tokens, GridTokens(dimensionality=dimensionality) if use_grid_tokens
+                             else polynomial_tokens]
+
+
 def epde_discovery(grid: np.ndarray, poynting_vec: np.ndarray, pop_size: int = 5,
                    factors_max_number: int = 1, poly_order: int = 4, training_epochs: int = 100,
                    variable_names: [str] = None, max_deriv_order: (int, ) = (2,),
                    equation_terms_max_number: int = 5, data_fun_pow: int = 1,
                    use_smoothing: bool = False, use_ann: bool = False,
-                   derivs: [np.ndarray] = None) -> EpdeSearch:
+                   derivs: [np.ndarray] = None, seed_equations: [str] = None, seed_patience: int = 10,
+                   eq_sparsity_interval: (float, float) = (1e-12, 1e-4),
+                   return_epochs: bool = False) -> EpdeSearch | tuple:
     """
     Perform EPDE discovery to find equations describing the relationship between grid and Poynting vector.
 
@@ -88,31 +249,155 @@ def epde_discovery(grid: np.ndarray, poynting_vec: np.ndarray, pop_size: int = 5
         data_fun_pow: The highest power of derivative-like token in the equation (default is 1).
         use_smoothing: Flag to indicate whether to use Gaussian smoothing (default is False).
         use_ann: Flag to indicate whether to use ANN preprocessor (default is False).
-        derivs: The derivatives data (default is None).
+        derivs: The derivatives data, one array of the derivatives as the columns per variable, e.g. precomputed
+        by get_derivatives (default is None, i.e. the derivatives are computed by the preprocessor).
+        seed_equations: The equations in EPDE text form to seed the initial population with, e.g. the best
+        equations for the previous radius value (default is None, i.e. the random initial population).
+        seed_patience: The number of epochs without improvement of the objectives to stop the seeded search
+        after (default is 10).
+        eq_sparsity_interval: The interval of the sparsity constant of the equations (default is (1e-12, 1e-4)).
+        return_epochs: The flag whether to return the number of epochs run as well (default is False).
 
     Returns:
-        EpdeSearch: The object containing the discovered equations.
+        EpdeSearch | tuple: The object containing the discovered equations and, if return_epochs is set,
+        the number of epochs run.
     """
 
     if variable_names is None:
         variable_names = ['I', ]
-    dimensionality = poynting_vec.ndim - 1
-    epde_search_obj = epde_alg.EpdeSearch(use_solver=False, dimensionality=dimensionality,
-                                          coordinate_tensors=[grid, ])
-
-    set_epde_preprocessor(epde_search_obj, use_smoothing=use_smoothing, use_ann=use_ann)
+    epde_search_obj, additional_tokens = init_epde_search(grid, poynting_vec, poly_order, use_smoothing, use_ann,
+                                                          use_grid_tokens=derivs is None)
 
     epde_search_obj.set_moeadd_params(population_size=pop_size, training_epochs=training_epochs)
 
-    custom_grid_tokens = GridTokens(dimensionality=dimensionality)
-    polynomial_tokens = get_polynomial_family(poynting_vec, poly_order)
-
     kwargs = {'data': [poynting_vec, ], 'variable_names': variable_names,
               'max_deriv_order': max_deriv_order, 'derivs': derivs,
               'equation_terms_max_number': equation_terms_max_number, 'data_fun_pow': data_fun_pow,
-              'additional_tokens': [polynomial_tokens, custom_grid_tokens if derivs is None else polynomial_tokens],
-              'equation_factors_max_number': factors_max_number, 'eq_sparsity_interval': (1e-12, 1e-4)}
-    epde_search_obj.fit(**kwargs)
+              'additional_tokens': additional_tokens,
+              'equation_factors_max_number': factors_max_number,
+              'eq_sparsity_interval': tuple(eq_sparsity_interval)}
+    if seed_equations:
+        epochs = seeded_fit(epde_search_obj, seed_equations, training_epochs, seed_patience, **kwargs)
+    else:
+        epde_search_obj.fit(**kwargs)
+        epochs = training_epochs
 
     epde_search_obj.equations(only_print=True, num=1)
-    return epde_search_obj
+    return (epde_search_obj, epochs) if return_epochs else epde_search_obj
+
+
+def get_system_solver_form(coefs: dict, rhs_term: str, pool, variable_name: str) -> list:
+    """
+    Builds the system of the equation with the given coefficients from the tokens of the pool, as the EPDE
+    equation translator does, and converts it into the solver form on the grid of the pool.
+
+    Args:
+        coefs: The coefficients keyed by the terms of the left part, 'C' is the constant term.
+        rhs_term: The term of the right part.
+        pool: The pool of tokens of the EPDE search object.
+        variable_name: The name of the variable explained by the equation.
+
+    Returns:
+        list: The solver form of the system, as an element of EpdeSearch.solver_forms.
+    """
+
+    terms = get_seed_terms(get_equation_text_form(coefs, rhs_term), pool)  # the left part, then the right part
+    weights = np.array([coef for term, coef in coefs.items() if term != 'C'] + [coefs.get('C', 0.0)])
+    metaparameters = {'sparsity': {'optimizable': True, 'value': 1.},
+                      'terms_number': {'optimizable': False, 'value': len(terms)},
+                      'max_factors_in_term': {'optimizable': False,
+                                              'value': max(len(term.structure) for term in terms)}}
+    equation = Equation(pool=pool, basic_structure=terms, var_to_explain=variable_name,
+                        metaparameters=metaparameters)
+    equation.target_idx = len(terms) - 1
+    equation.weights_internal = weights
+    equation.weights_final = weights
+    system = SoEq(pool=pool, metaparameters=metaparameters)
+    system.vals = Chromosome({variable_name: equation},
+                             params={key: value for key, value in metaparameters.items() if value['optimizable']})
+    return SystemSolverInterface(system).form()
+
+
+def rescore_equations(text_eqs: [str], grid: np.ndarray, poynting_vec: np.ndarray, derivs: [np.ndarray] = None,
+                      poly_order: int = 4, variable_names: [str] = None, max_deriv_order: (int, ) = (2,),
+                      data_fun_pow: int = 1, use_smoothing: bool = False,
+                      use_ann: bool = False) -> (list, [str], [float]):
+    """
+    Rescores the equations found on other data on the full grid without any evolution: the coefficients
+    of every equation are fitted again by refit_equation with the structure kept, and the equations are
+    ranked by the scores of the fitted equations.
+
+    Args:
+        text_eqs: The equations in EPDE text form.
+        grid: The grid data.
+        poynting_vec: The Poynting vector data.
+        derivs: The derivatives data on the grid (default is None, i.e. computed by get_derivatives).
+        poly_order: The order of polynomials to generate tokens for (default is 4).
+        variable_names: The names of variables (default is ['I']).
+        max_deriv_order: The maximum derivative order (default is (2,)).
+        data_fun_pow: The highest power of derivative-like token in the equation (default is 1).
+        use_smoothing: Flag to indicate whether to use Gaussian smoothing (default is False).
+        use_ann: Flag to indicate whether to use ANN preprocessor (default is False).
+
+    Returns:
+        tuple: The solver forms, the EPDE text forms and the scores of the fitted equations from the best one.
+    """
+
+    if variable_names is None:
+        variable_names = ['I', ]
+    full_derivs = derivs[0] if derivs is not None else get_derivatives(grid, poynting_vec, max(max_deriv_order),
+                                                                         use_smoothing)
+    fields = get_data_fields(grid, poynting_vec, max(max_deriv_order), full_derivs)
+    refits = sorted((refit_equation(text_eq, fields) for text_eq in text_eqs), key=lambda refit: refit[2])
+
+    epde_search_obj, additional_tokens = init_epde_search(grid, poynting_vec, poly_order, use_smoothing, use_ann)
+    epde_search_obj.create_pool(data=[poynting_vec, ], variable_names=variable_names, derivs=derivs,
+                                max_deriv_order=max_deriv_order, additional_tokens=additional_tokens,
+                                data_fun_pow=data_fun_pow)
+    eqs_solver_form = [get_system_solver_form(coefs, rhs_term, epde_search_obj.pool, variable_names[0])
+                       for coefs, rhs_term, _ in refits]
+    eqs_text_form = [get_equation_text_form(coefs, rhs_term) for coefs, rhs_term, _ in refits]
+    return eqs_solver_form, eqs_text_form, [score for _, _, score in refits]
+
+
+def multiresolution_discovery(grid: np.ndarray, poynting_vec: np.ndarray, decimation_stride: int,
+                              training_epochs: int = 100, derivs: [np.ndarray] = None, poly_order: int = 4,
+                              variable_names: [str] = None, max_deriv_order: (int, ) = (2,), data_fun_pow: int = 1,
+                              use_smoothing: bool = False, use_ann: bool = False, return_epochs: bool = False,
+                              **kwargs) -> tuple:
+    """
+    Performs the EPDE discovery on the decimated data: the evolutionary search runs on every
+    decimation_stride-th point only, then the equations of its Pareto front are rescored on the full grid
+    by rescore_equations without any evolution. So the cost of the search scales with the size of the coarse
+    data, and the full data only fixes the coefficients and the ranking of the equations.
+
+    Args:
+        grid: The grid data.
+        poynting_vec: The Poynting vector data.
+        decimation_stride: The stride of the data for the search, e.g. 8 searches on every 8th point.
+        training_epochs: The number of training epochs of the coarse search (default is 100).
+        derivs: The derivatives data on the full grid, decimated for the coarse search (default is None).
+        poly_order: The order of polynomials to generate tokens for (default is 4).
+        variable_names: The names of variables (default is ['I']).
+        max_deriv_order: The maximum derivative order (default is (2,)).
+        data_fun_pow: The highest power of derivative-like token in the equation (default is 1).
+        use_smoothing: Flag to indicate whether to use Gaussian smoothing (default is False).
+        use_ann: Flag to indicate whether to use ANN preprocessor (default is False).
+        return_epochs: The flag whether to return the number of epochs run as well (default is False).
+        **kwargs: The other arguments of epde_discovery.
+
+    Returns:
+        tuple: The solver forms and the EPDE text forms of the equations rescored on the full grid from the best
+        one and, if return_epochs is set, the number of epochs run.
+    """
+
+    stride = max(1, decimation_stride)
+    epde_kwargs = {'poly_order': poly_order, 'variable_names': variable_names, 'max_deriv_order': max_deriv_order,
+                   'data_fun_pow': data_fun_pow, 'use_smoothing': use_smoothing, 'use_ann': use_ann}
+    epde_search_obj, epochs = epde_discovery(grid[::stride], poynting_vec[::stride], training_epochs=training_epochs,
+                                             derivs=None if derivs is None else [deriv[::stride] for deriv in derivs],
+                                             return_epochs=True, **epde_kwargs, **kwargs)
+    text_eqs = [text_eq.split('\n')[0] for text_eq in epde_search_obj.equations(only_print=False, only_str=True,
+                                                                                  num=1)[0]]
+    eqs_solver_form, eqs_text_form, _ = rescore_equations(text_eqs, grid, poynting_vec, derivs, **epde_kwargs)
+    return (eqs_solver_form, eqs_text_form, epochs) if return_epochs else (eqs_solver_form, eqs_text_form)
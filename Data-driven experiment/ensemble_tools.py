@@ -0,0 +1,191 @@
+import json
+import re
+from pathlib import Path
+import numpy as np
+
+from data_tools import get_datasets, get_data_root, load_cached_array, get_file_hash
+from store_tools import store_lock, write_atomically
+
+ensemble_dir_name = '.ensemble'  # the directory of the running statistics inside the data folder
+
+
+def get_data_dir(r0: int | float, data_root: Path = None) -> Path:
+    if data_root is None:
+        data_root = get_data_root()
+    data_dir = get_datasets(data_root).get(r0, data_root / f'T(H) r0={r0}')
+    (data_dir / ensemble_dir_name).mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def load_ensemble_state(data_dir: Path, n_points: int) -> dict:
+    """
+    Loads the running statistics of the FMM realizations ingested into the data folder: the number of the
+    realizations, the mean and the sum of the squared deviations from the mean at every grid point, and the
+    names and the hashes of the ingested realization files.
+
+    Args:
+        data_dir: The data folder 'T(H) r0=...'.
+        n_points: The number of the grid points.
+
+    Returns:
+        dict: The state of the ensemble, empty if nothing has been ingested.
+    """
+
+    state_file_path = data_dir / ensemble_dir_name / 'state.npz'
+    if not state_file_path.exists():
+        return {'count': 0, 'mean': np.zeros(n_points), 'm2': np.zeros(n_points), 'published_mean': None,
+                'realizations': {}}
+    with np.load(state_file_path) as state:
+        published_mean = state['published_mean'] if 'published_mean' in state else None
+        return {'count': int(state['count']), 'mean': state['mean'].copy(), 'm2': state['m2'].copy(),
+                'published_mean': None if published_mean is None else published_mean.copy(),
+                'realizations': json.loads(str(state['realizations']))}
+
+
+def save_ensemble_state(data_dir: Path, state: dict) -> None:
+    def write(file_path: Path) -> None:
+        arrays = {'count': state['count'], 'mean': state['mean'], 'm2': state['m2'],
+                  'realizations': json.dumps(state['realizations'])}
+        if state['published_mean'] is not None:
+            arrays['published_mean'] = state['published_mean']
+        with file_path.open(mode='wb') as state_file:
+            np.savez(state_file, **arrays)
+
+    write_atomically(data_dir / ensemble_dir_name / 'state.npz', write)
+
+
+def update_ensemble_state(state: dict, values: np.ndarray) -> None:
+    """
+    Adds the realization to the running mean and the sum of the squared deviations by the Welford algorithm,
+    which is numerically stable and keeps the memory constant in the number of the realizations.
+
+    Args:
+        state: The state of the ensemble from load_ensemble_state.
+        values: The values of the realization on the grid.
+
+    Returns:
+        None
+    """
+
+    state['count'] += 1
+    delta = values - state['mean']
+    state['mean'] += delta / state['count']
+    state['m2'] += delta * (values - state['mean'])
+
+
+def get_mean_change(state: dict) -> float:
+    """
+    Measures the change of the running mean since it was published: the largest difference at a grid point
+    in the units of the standard error of the mean there.
+
+    Args:
+        state: The state of the ensemble from load_ensemble_state.
+
+    Returns:
+        float: The change of the mean, infinite if the mean has not been published.
+    """
+
+    if state['published_mean'] is None:
+        return np.inf
+    if state['count'] < 2:
+        return 0.0 if np.array_equal(state['mean'], state['published_mean']) else np.inf
+    std_error = np.sqrt(state['m2'] / (state['count'] - 1) / state['count'])
+    change = np.abs(state['mean'] - state['published_mean'])
+    return float(np.max(change / np.maximum(std_error, np.finfo(float).tiny)))
+
+
+def publish_ensemble(r0: int | float, data_dir: Path, state: dict) -> None:
+    """
+    Publishes the running mean as 'T_av_{r0}.txt', which get_data reads, the standard deviation as
+    'T_std_{r0}.txt' and the ensemble size as 'T_av_{r0}.json'. Every file replaces the previous one
+    atomically, so a running experiment reads either the old or the new average.
+
+    Args:
+        r0: The radius value.
+        data_dir: The data folder 'T(H) r0=...'.
+        state: The state of the ensemble from load_ensemble_state.
+
+    Returns:
+        None
+    """
+
+    std = np.sqrt(state['m2'] / (state['count'] - 1)) if state['count'] > 1 else np.zeros_like(state['mean'])
+    write_atomically(data_dir / f'T_av_{r0}.txt', lambda file_path: np.savetxt(file_path, state['mean']))
+    write_atomically(data_dir / f'T_std_{r0}.txt', lambda file_path: np.savetxt(file_path, std))
+    write_atomically(data_dir / f'T_av_{r0}.json', lambda file_path: file_path.write_text(json.dumps(
+        {'ensemble_size': state['count'], 'realizations': sorted(state['realizations'])})))
+    state['published_mean'] = state['mean'].copy()
+
+
+def get_ensemble_size(r0: int | float, data_root: Path = None) -> int | None:
+    """
+    Gets the number of the realizations averaged in the published 'T_av_{r0}.txt'.
+
+    Args:
+        r0: The radius value.
+        data_root: The directory containing the data folders (default is None, i.e. get_data_root()).
+
+    Returns:
+        int | None: The ensemble size or None if the average has not been published by ingest_realizations,
+        e.g. it has been written by the Matlab driver.
+    """
+
+    if data_root is None:
+        data_root = get_data_root()
+    data_dir = get_datasets(data_root).get(r0, data_root / f'T(H) r0={r0}')
+    info_file_path = data_dir / f'T_av_{r0}.json'
+    return json.loads(info_file_path.read_text())['ensemble_size'] if info_file_path.exists() else None
+
+
+def ingest_realizations(r0: int | float, file_paths: [Path] = None, data_root: Path = None,
+                        min_change: float = 0.0) -> dict:
+    """
+    Ingests the T(H) files of the FMM realizations into the running statistics of the ensemble and publishes
+    the updated average if it has changed by more than min_change standard errors. The realizations already
+    ingested are skipped by the file names, so the function can be called every time new realizations arrive;
+    a file changed after its ingestion is reported, since its old values can not be removed from the mean.
+
+    Args:
+        r0: The radius value.
+        file_paths: The realization files with one value per grid point (default is None, i.e. all files
+        'T_{i}.txt' of the data folder).
+        data_root: The directory containing the data folders (default is None, i.e. get_data_root()).
+        min_change: The change of the mean in standard errors, see get_mean_change, needed to publish the
+        average (default is 0.0, i.e. it is published after every new realization).
+
+    Returns:
+        dict: The ensemble size, the number of the newly ingested realizations, the change of the mean and
+        the flag whether the average has been published.
+
+    Raises:
+        ValueError: If the length of a realization differs from the length of the grid.
+    """
+
+    data_dir = get_data_dir(r0, data_root)
+    if file_paths is None:
+        file_paths = sorted((path for path in data_dir.glob('T_*.txt') if re.fullmatch(r'T_\d+\.txt', path.name)),
+                            key=lambda path: int(path.stem[2:]))
+    n_points = len(load_cached_array(data_dir / f'grid_{r0}.txt'))
+    with store_lock(data_dir / ensemble_dir_name):
+        state = load_ensemble_state(data_dir, n_points)
+        ingested = 0
+        for file_path in map(Path, file_paths):
+            key = file_path.name
+            file_hash = get_file_hash(file_path)
+            if key in state['realizations']:
+                if state['realizations'][key] != file_hash:
+                    print(f'{file_path} has changed after it was ingested and is skipped')
+                continue
+            values = np.genfromtxt(file_path, delimiter=',').reshape(-1)
+            if len(values) != n_points:
+                raise ValueError(f'{file_path} has {len(values)} values for {n_points} grid points')
+            update_ensemble_state(state, values)
+            state['realizations'][key] = file_hash
+            ingested += 1
+        change = get_mean_change(state)
+        published = state['count'] > 0 and change > min_change
+        if published:
+            publish_ensemble(r0, data_dir, state)
+        if ingested or published:
+            save_ensemble_state(data_dir, state)
+    return {'ensemble_size': state['count'], 'ingested': ingested, 'change': change, 'published': published}
@@ -0,0 +1,375 @@
+import re
+import numpy as np
+
+from results_analysis_tools import get_eq_terms_from_string, get_coefs_from_terms
+
+deriv_pattern = re.compile(r'^d(?:\^(\d+))?I/dH(?:\^\d+)?$')
+power_pattern = re.compile(r'^(.+)\{power:([-\d.e]+)\}$')
+canonical_tolerance = 1e-8  # the relative difference of the coefficients up to which the equations are the same
+canonical_bucket_width = 4  # the width of the buckets of the canonical coefficients in the tolerances
+
+
+def get_deriv_name(order: int) -> str:
+    """
+    Gets the name of the derivative of I with respect to H in the notation of the text equations.
+
+    Args:
+        order: The order of the derivative.
+
+    Returns:
+        The name of the derivative, e.g. 'I', 'dI/dH' or 'd^2I/dH^2'.
+    """
+
+    if order == 0:
+        return 'I'
+    return 'dI/dH' if order == 1 else f'd^{order}I/dH^{order}'
+
+
+def get_residual_coefs(text_eq: str) -> dict:
+    """
+    Parses an equation in EPDE text form and moves its right part to the left one, so that the equation
+    reads as sum(coef * term) = 0.
+
+    Args:
+        text_eq: The equation in EPDE text form (only the first line is used).
+
+    Returns:
+        Dictionary containing the terms and the corresponding coefficients of the residual.
+    """
+
+    eq_terms = get_eq_terms_from_string(text_eq.split('\n')[0])
+    coefs = get_coefs_from_terms(eq_terms[:-1])
+    for term, coef in get_coefs_from_terms(eq_terms[-1:]).items():
+        coefs[term] = coefs.get(term, 0.0) - coef
+    return coefs
+
+
+def get_term_factors(term: str) -> [(str, float)]:
+    """
+    Splits a term of the text equation into factors.
+
+    Args:
+        term: The term, e.g. 'C', 'H', 'I^3' or 'd^2I/dH^2'.
+
+    Returns:
+        List of pairs (field name, power), where the field name is 'H' or the name of a derivative of I.
+
+    Raises:
+        ValueError: If the term contains an unknown factor.
+    """
+
+    if term == 'C':
+        return []
+    factors = []
+    for factor in term.split('*'):
+        power = 1.0
+        power_match = power_pattern.match(factor)
+        if power_match:
+            factor, power = power_match.group(1), float(power_match.group(2))
+        deriv_match = deriv_pattern.match(factor)
+        if deriv_match:
+            factors.append((get_deriv_name(int(deriv_match.group(1) or 1)), power))
+        elif factor == 'H':
+            factors.append(('H', power))
+        elif factor == 'I':
+            factors.append(('I', power))
+        elif factor.startswith('I^'):
+            factors.append(('I', power * float(factor[2:])))
+        else:
+            raise ValueError(f'Unknown factor {factor} in the term {term}')
+    return factors
+
+
+def get_max_deriv_order(coefs: dict) -> int:
+    """
+    Gets the highest order of the derivative of I in the equation.
+
+    Args:
+        coefs: Dictionary containing the terms and the corresponding coefficients.
+
+    Returns:
+        The highest derivative order.
+    """
+
+    orders = [0]
+    for term in coefs:
+        for name, _ in get_term_factors(term):
+            deriv_match = deriv_pattern.match(name)
+            if deriv_match:
+                orders.append(int(deriv_match.group(1) or 1))
+    return max(orders)
+
+
+def eval_term(term: str, fields: dict):
+    """
+    Evaluates a term of the equation on the fields. Works both with NumPy arrays and torch tensors.
+
+    Args:
+        term: The term of the text equation.
+        fields: Dictionary containing 'H', 'I' and the derivatives of I named as in get_deriv_name.
+
+    Returns:
+        The values of the term (a float for the constant term).
+    """
+
+    value = 1.0
+    for name, power in get_term_factors(term):
+        value = value * (fields[name] if power == 1 else fields[name] ** power)
+    return value
+
+
+def eval_residual(coefs: dict, fields: dict):
+    """
+    Evaluates the residual sum(coef * term) of the equation on the fields.
+
+    Args:
+        coefs: Dictionary containing the terms and the corresponding coefficients of the residual.
+        fields: Dictionary containing 'H', 'I' and the derivatives of I named as in get_deriv_name.
+
+    Returns:
+        The values of the residual.
+    """
+
+    residual = 0 * fields['I']
+    for term, coef in coefs.items():
+        residual = residual + coef * eval_term(term, fields)
+    return residual
+
+
+def refit_equation(text_eq: str, fields: dict) -> (dict, str, float):
+    """
+    Fits the coefficients of the left part of an equation in EPDE text form by least squares on the fields,
+    keeping its structure and the unit coefficient of the right part, as the EPDE search does, and scores
+    the fitted equation as get_residual_scores does.
+
+    Args:
+        text_eq: The equation in EPDE text form; the terms with the zero coefficients are left out.
+        fields: Dictionary containing 'H', 'I' and the derivatives of I named as in get_deriv_name.
+
+    Returns:
+        tuple: The fitted coefficients keyed by the terms of the left part, 'C' is the constant term, the term
+        of the right part and the score of the fitted equation, lower is better.
+    """
+
+    eq_terms = get_eq_terms_from_string(text_eq.split('\n')[0])
+    rhs_term = next(iter(get_coefs_from_terms(eq_terms[-1:])))
+    terms = [term for term in get_coefs_from_terms(eq_terms[:-1]) if term != 'C']
+    ones = np.ones(np.shape(fields['I']))
+    features = np.column_stack([eval_term(term, fields) * ones for term in terms] + [ones])
+    target = eval_term(rhs_term, fields) * ones
+    weights = np.linalg.lstsq(features, target, rcond=None)[0]
+    scale = max(1.0, np.max(np.abs(weights)))  # the right part has the unit coefficient
+    score = float(np.sqrt(np.mean((target - features @ weights) ** 2)) / scale)
+    return dict(zip(terms + ['C'], weights.tolist())), rhs_term, score if np.isfinite(score) else np.inf
+
+
+def get_canonical_coefs(text_eq: str) -> (dict, float):
+    """
+    Gets the coefficients of the residual of an equation in EPDE text form with the factors in the terms sorted,
+    scaled by the largest of them.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+
+    Returns:
+        tuple: The nonzero scaled coefficients keyed by the terms and the scale.
+    """
+
+    coefs = {}
+    for term, coef in get_residual_coefs(text_eq).items():
+        term = '*'.join(sorted(term.split('*')))
+        coefs[term] = coefs.get(term, 0.0) + coef
+    scale = max(abs(coef) for coef in coefs.values())
+    return {term: coef / scale for term, coef in coefs.items() if coef != 0}, scale
+
+
+def get_value_buckets(value: float, tolerance: float) -> [tuple]:
+    """
+    Quantizes the value by the logarithm of its magnitude into the buckets of the width
+    canonical_bucket_width * tolerance. The values with the relative difference below the tolerance fall into
+    the same bucket or, near the edge of the bucket, into the neighbouring one, which is returned as well.
+
+    Args:
+        value: The nonzero value.
+        tolerance: The relative difference of the values regarded as equal.
+
+    Returns:
+        list: The bucket of the value, (sign, index), and the neighbouring bucket if the value is closer to its
+        edge than the tolerance.
+    """
+
+    position = np.log(abs(value)) / (canonical_bucket_width * tolerance)
+    index = int(np.floor(position))
+    sign = 1 if value > 0 else -1
+    buckets = [(sign, index)]
+    if (position - index) * canonical_bucket_width < 1:
+        buckets.append((sign, index - 1))
+    elif (index + 1 - position) * canonical_bucket_width < 1:
+        buckets.append((sign, index + 1))
+    return buckets
+
+
+def get_canonical_equations(text_eq: str, tolerance: float = canonical_tolerance,
+                            keep_scale: bool = False) -> [tuple]:
+    """
+    Normalizes an equation in EPDE text form into the hashable keys of the equations equal to it within the
+    tolerance: the factors in the terms and the terms themselves are sorted, and the coefficients of the residual
+    are scaled by the largest of them and quantized by get_value_buckets. The equations that differ only by the
+    order of terms or by the round-off noise share a key even if their coefficients fall into different buckets.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+        tolerance: The relative difference of the coefficients regarded as equal (default is canonical_tolerance).
+        keep_scale: The flag whether to distinguish the equations by the scale of their coefficients as well,
+        e.g. for the solvers minimizing the residual, whose weight in the loss depends on the scale
+        (default is False).
+
+    Returns:
+        list: The keys, sorted pairs (term, bucket of the scaled coefficient) preceded by the bucket of the scale
+        if keep_scale is set; the key of the buckets of the equation itself comes first.
+    """
+
+    coefs, scale = get_canonical_coefs(text_eq)
+    terms = sorted(coefs)
+    buckets = [get_value_buckets(coefs[term], tolerance) for term in terms]
+    if keep_scale:
+        terms.insert(0, 'scale')
+        buckets.insert(0, get_value_buckets(scale, tolerance))
+    keys = [()]
+    for term, term_buckets in zip(terms, buckets):
+        keys = [key + ((term, bucket),) for key in keys for bucket in term_buckets]
+    return keys
+
+
+def get_canonical_equation(text_eq: str, tolerance: float = canonical_tolerance, keep_scale: bool = False) -> tuple:
+    """
+    Gets the key of the equation in EPDE text form among the keys of get_canonical_equations.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+        tolerance: The relative difference of the coefficients regarded as equal (default is canonical_tolerance).
+        keep_scale: The flag whether to distinguish the equations by the scale of their coefficients as well
+        (default is False).
+
+    Returns:
+        tuple: Sorted pairs (term, bucket of the scaled coefficient), preceded by the bucket of the scale if
+        keep_scale is set.
+    """
+
+    coefs, scale = get_canonical_coefs(text_eq)
+    key = tuple((term, get_value_buckets(coefs[term], tolerance)[0]) for term in sorted(coefs))
+    return ((('scale', get_value_buckets(scale, tolerance)[0]),) + key) if keep_scale else key
+
+
+def get_equation_structure(text_eq: str) -> tuple:
+    """
+    Gets the structure of an equation in EPDE text form, i.e. the sorted set of its terms without the
+    coefficients.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+
+    Returns:
+        tuple: The sorted terms of the equation.
+    """
+
+    return tuple(sorted(get_canonical_coefs(text_eq)[0]))
+
+
+def compile_residual(text_eq: str):
+    """
+    Compiles an equation in EPDE text form into a single fused expression evaluating its residual
+    sum(coef * term) on the fields, so that the terms are not parsed again on every call.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+
+    Returns:
+        A function of the fields dictionary (named as in eval_term) returning the values of the residual.
+    """
+
+    summands = []
+    for term, coef in get_residual_coefs(text_eq).items():
+        factors = [f'fields[{name!r}]' if power == 1 else f'fields[{name!r}] ** {power!r}'
+                   for name, power in get_term_factors(term)]
+        summands.append(' * '.join([repr(coef)] + factors))
+    source = f'lambda fields: 0 * fields["I"] + {" + ".join(summands) or "0"}'
+    return eval(compile(source, f'<residual of {text_eq.splitlines()[0]}>', 'eval'))
+
+
+def get_data_fields(grid: np.ndarray, values: np.ndarray, max_deriv_order: int, derivs: np.ndarray = None) -> dict:
+    """
+    Precomputes the fields of the data for the residual evaluation. The derivatives of I are taken from derivs,
+    e.g. the smoothed ones of get_training_derivatives; the orders missing there are estimated by second order
+    finite differences on the (possibly non-uniform) sorted grid.
+
+    Args:
+        grid: The sorted grid data.
+        values: The values of I on the grid.
+        max_deriv_order: The highest derivative order required by the equations.
+        derivs: The derivatives of the orders from 1 as the columns, e.g. from get_derivatives (default is None,
+        i.e. all derivatives are estimated by finite differences).
+
+    Returns:
+        Dictionary containing 'H', 'I' and the derivatives of I named as in get_deriv_name.
+    """
+
+    fields = {'H': grid, 'I': values}
+    n_derivs = 0 if derivs is None else np.shape(derivs)[1]
+    for order in range(1, max_deriv_order + 1):
+        fields[get_deriv_name(order)] = derivs[:, order - 1] if order <= n_derivs else \
+            np.gradient(fields[get_deriv_name(order - 1)], grid, edge_order=2)
+    return fields
+
+
+def get_residual_scores(text_eqs: [str], grid: np.ndarray, values: np.ndarray, derivs: np.ndarray = None) -> np.ndarray:
+    """
+    Scores the equations by the root mean square of their residuals on the data. The residual of every
+    equation is divided by its largest absolute coefficient, so the scores of the equations do not depend
+    on the arbitrary scaling of their coefficients.
+
+    Args:
+        text_eqs: The equations in EPDE text form.
+        grid: The sorted grid data.
+        values: The values of I on the grid.
+        derivs: The derivatives of I as the columns, see get_data_fields (default is None, i.e. finite
+        differences of the raw data, which are dominated by the noise for the higher orders).
+
+    Returns:
+        np.ndarray: The scores of the equations, lower is better.
+    """
+
+    coefs_list = [get_residual_coefs(text_eq) for text_eq in text_eqs]
+    fields = get_data_fields(grid, values, max(get_max_deriv_order(coefs) for coefs in coefs_list), derivs)
+    scores = np.full(len(text_eqs), np.inf)
+    for k, (text_eq, coefs) in enumerate(zip(text_eqs, coefs_list)):
+        scale = max((abs(coef) for coef in coefs.values()), default=0.0)
+        if scale > 0:
+            residual = compile_residual(text_eq)(fields) / scale
+            scores[k] = np.sqrt(np.mean(residual ** 2))
+    return np.where(np.isfinite(scores), scores, np.inf)
+
+
+def get_term_text_form(term: str) -> str:
+    return ' * '.join('t{power: 1.0, dim: 0.0}' if factor == 'H' else factor.replace('dH', 'dx0') + '{power: 1.0}'
+                      for factor in term.split('*'))
+
+
+def get_equation_text_form(coefs: dict, rhs_term: str = 'dI/dH') -> str:
+    """
+    Writes the equation in EPDE text form, which the parsers of the text equations and the solvers read.
+
+    Args:
+        coefs: The coefficients keyed by the terms of the left part, 'C' is the constant term.
+        rhs_term: The term of the right part (default is 'dI/dH').
+
+    Returns:
+        str: The equation in EPDE text form.
+    """
+
+    # the positional notation keeps '+' of the exponents out of the text, where it would split the terms
+    terms = [f'{np.format_float_positional(coef)} * {get_term_text_form(term)}'
+             for term, coef in coefs.items() if term != 'C']
+    if 'C' in coefs:
+        terms.append(np.format_float_positional(coefs['C']))
+    return f'{" + ".join(terms) or "0.0"} = {get_term_text_form(rhs_term)}'
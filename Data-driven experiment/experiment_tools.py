@@ -1,20 +1,36 @@
+import json
 from pathlib import Path
 import numpy as np
 import torch
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import (mean_squared_error, mean_absolute_percentage_error)
-from matplotlib.axes import Axes
+from tedeous.device import solver_device
 
-from discovery_tools import epde_discovery
-from solver_tools import get_solution
-from data_tools import get_data
+from discovery_tools import epde_discovery, multiresolution_discovery
+from solver_tools import get_solution, get_batched_solution, get_ode_solution, get_nn, get_nn_params, fits_nn
+from data_tools import get_data, get_derivatives, get_file_hash
+from ensemble_tools import get_ensemble_size
+from amortized_tools import load_amortized_nn, get_amortized_solutions, get_amortized_nn_path, amortized_max_residual
 from results_analysis_tools import get_results_dir
+from equation_tools import get_residual_scores, get_residual_coefs, get_max_deriv_order
+from profile_tools import stage, add_stage_info, set_trace_dir
+from cache_tools import (get_solution_keys, find_cached_solution, load_cached_solution, save_cached_solution,
+                         load_warm_start_weights, save_warm_start_weights, get_derivatives_key,
+                         load_cached_derivatives, save_cached_derivatives)
+from store_tools import save_array, save_text, load_array, write_atomically
+from checkpoint_tools import get_unit_name, mark_unit_done, get_done_unit, save_solver_forms, load_solver_forms
+from render_tools import submit_solution_plot, start_rendering
 
 mpl.rcParams.update(mpl.rcParamsDefault)
 
 solver_img_dir = str(Path.cwd() / 'optics_intermediate')  # directory for solver charts
+solver_backends = ('tedeous', 'batched', 'ode', 'amortized')
+default_exp_settings = {'nruns': 1, 'solve_equations': True, 'pop_size': 5, 'factors_max_number': 1, 'poly_order': 4,
+                        'variable_names': ['I'], 'max_deriv_order': (2,), 'equation_terms_max_number': 5,
+                        'data_fun_pow': 1, 'training_epde_epochs': 100, 'training_tedeous_epochs': 10000,
+                        'use_smoothing': False, 'solver_backend': 'tedeous', 'use_solution_cache': True,
+                        'warm_start': False, 'seed_exp_name': None, 'solve_top_k': None, 'decimation_stride': None,
+                        'precompute_derivs': False, 'nn_params': None, 'eq_sparsity_interval': (1e-12, 1e-4)}
 
 
 def get_split_data(r0: int | float, test_size: float = 0.2,
@@ -35,147 +51,215 @@ def get_split_data(r0: int | float, test_size: float = 0.2,
 def save_split_exp_data(r0: int | float, m_grid_training: np.ndarray,
                         m_grid_test: np.ndarray, poynting_vec_training: np.ndarray,
                         poynting_vec_test: np.ndarray, results_dir: Path) -> None:
-    split_exp_data_dir = results_dir / 'split exp data'
-    if not (split_exp_data_dir.exists()):
-        split_exp_data_dir.mkdir()
+    save_array(results_dir, f'split exp data/grid_training_{r0}', m_grid_training)
+    save_array(results_dir, f'split exp data/grid_test_{r0}', m_grid_test)
+    save_array(results_dir, f'split exp data/poynting_vec_training_{r0}', poynting_vec_training)
+    save_array(results_dir, f'split exp data/poynting_vec_test_{r0}', poynting_vec_test)
 
-    grid_training_filename = split_exp_data_dir / fr'grid_training_{r0}.txt'
-    grid_test_filename = split_exp_data_dir / fr'grid_test_{r0}.txt'
-    poynting_vec_training_filename = split_exp_data_dir / fr'poynting_vec_training_{r0}.txt'
-    poynting_vec_test_filename = split_exp_data_dir / fr'poynting_vec_test_{r0}.txt'
 
-    np.savetxt(grid_training_filename, m_grid_training)
-    np.savetxt(grid_test_filename, m_grid_test)
-    np.savetxt(poynting_vec_training_filename, poynting_vec_training)
-    np.savetxt(poynting_vec_test_filename, poynting_vec_test)
+def load_split_exp_data(r0: int | float,
+                        results_dir: Path) -> tuple | None:
+    """
+    Loads the split data of the radius value saved by a previous call of the experiment.
 
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        results_dir: Directory to save results.
 
-def get_eqs_solver_text_form(grid_training: np.ndarray, poynting_vec_training: np.ndarray, pop_size: int,
-                             factors_max_number: int, poly_order: int, training_epde_epochs: int,
-                             variable_names: [str], max_deriv_order: (int,),
-                             equation_terms_max_number: int, data_fun_pow: int, use_smoothing: bool) -> (list, list):
-    epde_search_obj = epde_discovery(grid_training, poynting_vec_training, pop_size=pop_size,
-                                     factors_max_number=factors_max_number, poly_order=poly_order,
-                                     training_epochs=training_epde_epochs, variable_names=variable_names,
-                                     max_deriv_order=max_deriv_order,
-                                     equation_terms_max_number=equation_terms_max_number,
-                                     data_fun_pow=data_fun_pow, use_smoothing=use_smoothing)
-    return epde_search_obj.solver_forms()[0], epde_search_obj.equations(only_print=False, only_str=True, num=1)[0]
-
-
-def get_inserted_ax(ax: Axes, r0: int | float, grid_max: int | float) -> Axes:
-    x1, x2, y1, y2 = 0.0001 * grid_max, 0.03 * grid_max, -1.05, 0.05
-    x_right_border = 0.0301 * grid_max
-    if 0.3 < r0 <= 0.5:
-        x2 = 0.07 * grid_max
-        x_right_border = 0.0701 * grid_max
-    else:
-        x2 = 0.15 * grid_max
-        x_right_border = 0.1501 * grid_max
-
-    axins = ax.inset_axes((0.2 * grid_max, -0.6, 0.35 * grid_max, 0.4),
-                          xlim=(x1, x2), ylim=(y1, y2), transform=ax.transData, xticklabels=[],
-                          yticklabels=[])
-    axins.set_xticks(np.arange(0, x_right_border, 0.01 * np.ceil(grid_max)))
-    return axins
-
-
-def set_inserted_ax(axins: Axes, grid_training: np.ndarray, grid_test: np.ndarray,
-                    poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
-                    pred_solution_training: torch.Tensor, add_training_data: bool = False,
-                    start_y: int | float = -1, stop_y: int | float = 0.1, step_y: int | float = 0.2) -> None:
-    axins.set_yticks(np.arange(start_y, stop_y, step_y))
-    axins.grid(True)
-    if add_training_data:
-        axins.plot(grid_training, poynting_vec_training, '+', label='Training data')
-    axins.plot(grid_test, poynting_vec_test, '.', color='black')
-    axins.plot(grid_training, pred_solution_training.detach().numpy(), color='r')
-
-
-def set_main_ax(ax: Axes, axins: Axes, grid_training: np.ndarray, grid_test: np.ndarray,
-                poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray, pred_solution_training: torch.Tensor,
-                rmse: float, add_training_data: bool = False) -> None:
-    grid_max = np.max(np.concatenate((grid_training, grid_test)))
-    ax.indicate_inset_zoom(axins, edgecolor="black")
-    ax.set_xticks(np.arange(0, 1.1 * grid_max, 0.1 * np.ceil(grid_max)))
-    ax.set_yticks(np.arange(-1., 0.5, 0.2))
-    if add_training_data:
-        ax.plot(grid_training, poynting_vec_training, '+', label='Training data')
-    ax.plot(grid_test, poynting_vec_test, '.', color='black', label='Test data')
-    ax.plot(grid_training, pred_solution_training.detach().numpy(), color='r',
-            label='Solution of the discovered DE')
-    ax.text(0.7 * grid_max, -0.8,
-            f'RMSE = {rmse:.2e}', fontsize=10)
-
-    ax.grid(True)
-
-
-def set_plot(r0: int | float, wave_length: int | float, img_filename: Path, save_solutions: bool = True,
-             add_legend: bool = False) -> None:
-    if add_legend:
-        plt.legend(loc=4)
-    plt.title(fr"$I_y(H), r_0 = {r0}\mu m$, $\lambda = {wave_length} \mu m$")
-    plt.xlabel(r'$\frac{H}{\lambda} \cdot 10^{-2}$')
-    plt.ylabel(r'$I_y(H)$')
-    if save_solutions:
-        plt.savefig(img_filename)
-        plt.close()
-    else:
-        plt.plot()
+    Returns:
+        tuple | None: The training and test grids and Poynting vector data or None if the split has not been
+        completed.
+    """
 
+    if get_done_unit(results_dir, get_unit_name('split', r0)) is None:
+        return None
+    return tuple(np.array(load_array(results_dir, f'split exp data/{name}_{r0}'))
+                 for name in ('grid_training', 'grid_test', 'poynting_vec_training', 'poynting_vec_test'))
 
-def draw_solution(r0: int | float, wave_length: int | float, i: int, run: int, grid_training: np.ndarray,
-                  grid_test: np.ndarray, poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
-                  pred_solution_training: torch.Tensor, pred_solution_test: torch.Tensor, results_dir: Path,
-                  save_solutions: bool = True, add_legend: bool = False, add_training_data: bool = False) -> None:
-    fig = plt.figure(dpi=200)
-    ax = fig.add_subplot()
 
-    grid_max = np.max(np.concatenate((grid_training, grid_test)))
-    axins = get_inserted_ax(ax, r0, grid_max)
-    set_inserted_ax(axins, grid_training, grid_test, poynting_vec_training, poynting_vec_test,
-                    pred_solution_training)
+def get_exp_split_data(r0: int | float, results_dir: Path,
+                       resume: bool = True) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """
+    Gets the split data of the radius value and saves it, or loads it if it has been saved before. The size
+    of the ensemble averaged in the data is recorded with the split, so that the experiment reports when the
+    average has been republished by ingest_realizations since the split.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        results_dir: Directory to save results.
+        resume: The flag whether to load the saved split data (default is True).
 
-    rmse = np.sqrt(mean_squared_error(poynting_vec_test, pred_solution_test.detach().numpy()))
-    set_main_ax(ax, axins, grid_training, grid_test, poynting_vec_training, poynting_vec_test,
-                pred_solution_training, rmse, add_training_data)
-    sln_img_dir = results_dir / 'solutions visualization'
-    if not (Path(sln_img_dir).exists()):
-        Path(sln_img_dir).mkdir()
-    img_filename = sln_img_dir / fr'sln_{r0}_{i}_{run}.png'
-    set_plot(r0, wave_length, img_filename, save_solutions=save_solutions, add_legend=add_legend)
+    Returns:
+        tuple: The training and test grids and Poynting vector data.
+    """
+
+    split_data = load_split_exp_data(r0, results_dir) if resume else None
+    ensemble_size = get_ensemble_size(r0)
+    if split_data is None:
+        split_data = get_split_data(r0)
+        save_split_exp_data(r0, *split_data, results_dir)
+        mark_unit_done(results_dir, get_unit_name('split', r0), {'ensemble_size': ensemble_size})
+    elif get_done_unit(results_dir, get_unit_name('split', r0)).get('ensemble_size') != ensemble_size:
+        print(f'r0 = {r0}: the data has been averaged over {ensemble_size} realizations since the split, '
+              f'the experiment goes on with the old data, start it with resume=False to use the new one')
+    return split_data
+
+
+def get_training_derivatives(grid_training: np.ndarray, poynting_vec_training: np.ndarray,
+                             max_deriv_order: (int,), use_smoothing: bool) -> [np.ndarray]:
+    """
+    Gets the derivatives of the training data for the EPDE search from the derivatives cache or computes
+    and caches them, so that they are computed once for all runs and experiments sharing the data.
+
+    Args:
+        grid_training: Training grid data in the form passed to the EPDE search.
+        poynting_vec_training: Training Poynting vector data.
+        max_deriv_order: Maximum derivative order in a differential equation.
+        use_smoothing: The flag whether to use Gaussian smoothing.
+
+    Returns:
+        list: The derivatives of the Poynting vector as the columns of the single array.
+    """
+
+    settings = {'max_deriv_order': max(max_deriv_order), 'use_smoothing': use_smoothing, 'sigma': 1,
+                'window': 3, 'poly_order': 3}
+    key = get_derivatives_key(grid_training, poynting_vec_training, settings)
+    derivs = load_cached_derivatives(key)
+    if derivs is None:
+        derivs = get_derivatives(grid_training, poynting_vec_training, **settings)
+        save_cached_derivatives(key, derivs)
+    return [derivs]
+
+
+def get_eqs_solver_text_form(grid_training: np.ndarray, poynting_vec_training: np.ndarray, pop_size: int,
+                             factors_max_number: int, poly_order: int, training_epde_epochs: int,
+                             variable_names: [str], max_deriv_order: (int,),
+                             equation_terms_max_number: int, data_fun_pow: int, use_smoothing: bool,
+                             seed_equations: [str] = None, decimation_stride: int = None,
+                             derivs: [np.ndarray] = None,
+                             eq_sparsity_interval: (float, float) = (1e-12, 1e-4)) -> (list, list, int):
+    kwargs = {'pop_size': pop_size, 'factors_max_number': factors_max_number, 'poly_order': poly_order,
+              'training_epochs': training_epde_epochs, 'variable_names': variable_names,
+              'max_deriv_order': max_deriv_order, 'equation_terms_max_number': equation_terms_max_number,
+              'data_fun_pow': data_fun_pow, 'use_smoothing': use_smoothing, 'seed_equations': seed_equations,
+              'derivs': derivs, 'eq_sparsity_interval': eq_sparsity_interval, 'return_epochs': True}
+    if decimation_stride is not None and decimation_stride > 1:
+        return multiresolution_discovery(grid_training, poynting_vec_training, decimation_stride, **kwargs)
+    epde_search_obj, epochs = epde_discovery(grid_training, poynting_vec_training, **kwargs)
+    return (epde_search_obj.solver_forms()[0], epde_search_obj.equations(only_print=False, only_str=True, num=1)[0],
+            epochs)
 
 
 def save_solution_data(r0: int | float, i: int, run: int, pred_solution: torch.Tensor,
                        results_dir: Path, training: bool = True) -> None:
-    sln_data_dir = results_dir / 'solutions data'
-    if not (sln_data_dir.exists()):
-        sln_data_dir.mkdir()
-    sln_data_filename = sln_data_dir / fr'sln_data_training_{r0}_{i}_{run}.txt' if training \
-        else sln_data_dir / fr'sln_data_test_{r0}_{i}_{run}.txt'
-    np.savetxt(sln_data_filename, pred_solution.detach().numpy())
+    sln_data_name = f'solutions data/sln_data_training_{r0}_{i}_{run}' if training \
+        else f'solutions data/sln_data_test_{r0}_{i}_{run}'
+    save_array(results_dir, sln_data_name, pred_solution.detach().numpy())
 
 
 def save_txt_form_equations(r0: int | float, i: int, run: int,
                             results_dir: Path, text_eq: str) -> None:
-    txt_dir = results_dir / 'text equations'
-    if not (txt_dir.exists()):
-        txt_dir.mkdir()
-    txt_filename = txt_dir / fr'eqn_{r0}_{i}_{run}.txt'
-    with txt_filename.open(mode='w') as the_file:
-        the_file.write(text_eq)
-
-
-def start_solver(equation: [list], grid_training: np.ndarray, grid_test: np.ndarray,
-                 poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
-                 training_tedeous_epochs: int, results_dir: Path, r0: int | float,
-                 wave_length: int | float, i: int, run: int) -> None:
+    save_text(results_dir, f'text equations/eqn_{r0}_{i}_{run}', text_eq)
+
+
+def save_solved_equation(r0: int | float, i: int, run: int, pred_solution_training: np.ndarray,
+                         pred_solution_test: np.ndarray, results_dir: Path) -> None:
+    """
+    Saves the solution of the equation returned by solve_population with save_results unset and records the
+    equation as solved in the run manifest.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        i: Index value of the equation in the resulting population.
+        run: The run number for this value of r0.
+        pred_solution_training: Predicted solution for the training grid.
+        pred_solution_test: Predicted solution for the test grid.
+        results_dir: Directory to save results.
+
+    Returns:
+        None
+    """
+
+    save_solution_data(r0, i, run, torch.from_numpy(pred_solution_training), results_dir)
+    save_solution_data(r0, i, run, torch.from_numpy(pred_solution_test), results_dir, training=False)
+    mark_unit_done(results_dir, get_unit_name('solution', r0, run, i))
+
+
+def save_discovery_epochs(r0: int | float, run: int, results_dir: Path, epochs: int,
+                          training_epde_epochs: int) -> None:
     """
-    Starts the solver process for solving the provided equation from the resulting population and
-    saves the results.
+    Reports and saves the number of EPDE epochs run and saved by seeding the initial population.
 
     Args:
-        equation: The equation to solve.
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        run: The run number for this value of r0.
+        results_dir: Directory to save results.
+        epochs: The number of EPDE epochs run.
+        training_epde_epochs: The maximum number of training EPDE epochs.
+
+    Returns:
+        None
+    """
+
+    print(f'r0 = {r0}, run = {run}: {epochs} EPDE epochs run, {training_epde_epochs - epochs} epochs saved')
+    save_text(results_dir, f'discovery epochs/epochs_{r0}_{run}',
+              json.dumps({'epochs_run': epochs, 'epochs_saved': training_epde_epochs - epochs}))
+
+
+def save_solution_results(r0: int | float, wave_length: int | float, i: int, run: int, grid_training: np.ndarray,
+                          grid_test: np.ndarray, poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
+                          pred_solution_training: torch.Tensor, pred_solution_test: torch.Tensor,
+                          results_dir: Path) -> None:
+    """
+    Submits the solution of the equation from the resulting population for rendering and saves the solution
+    data.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        i: Index value of the equation in the resulting population.
+        run: The run number for this value of r0.
+        grid_training: Training grid data.
+        grid_test: Test grid data.
+        poynting_vec_training: Training Poynting vector data.
+        poynting_vec_test: Test Poynting vector data.
+        pred_solution_training: Predicted solution for the training grid.
+        pred_solution_test: Predicted solution for the test grid.
+        results_dir: Directory to save results.
+
+    Returns:
+        None
+    """
+
+    with stage('draw_solution', i=i):
+        submit_solution_plot(r0, wave_length, i, run, grid_training, grid_test, poynting_vec_training,
+                             poynting_vec_test, pred_solution_training.detach().numpy(),
+                             pred_solution_test.detach().numpy(), results_dir)
+    with stage('save_solution_data', i=i):
+        save_solution_data(r0, i, run, pred_solution_training, results_dir)
+        save_solution_data(r0, i, run, pred_solution_test, results_dir, training=False)
+
+
+def solve_population(eqs_solver_form: list, eqs_text_form: [str], grid_training: np.ndarray, grid_test: np.ndarray,
+                     poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
+                     training_tedeous_epochs: int, results_dir: Path, r0: int | float, wave_length: int | float,
+                     run: int, solver_backend: str = 'tedeous', use_solution_cache: bool = True,
+                     warm_start: bool = False, eq_indices: [int] = None, nn_params: dict = None,
+                     save_results: bool = True, use_smoothing: bool = True) -> dict | None:
+    """
+    Solves the equations from the resulting population, saves the results and records every solved equation
+    in the run manifest. With the solutions cache,
+    the equations equal within the tolerance of the canonical form are solved once, and the equations solved in
+    previous runs or experiments with the same grids and solver settings are not solved at all.
+
+    Args:
+        eqs_solver_form: The equations in the solver form.
+        eqs_text_form: The equations in EPDE text form.
         grid_training: Training grid data.
         grid_test: Test grid data.
         poynting_vec_training: Training Poynting vector data.
@@ -185,33 +269,261 @@ def start_solver(equation: [list], grid_training: np.ndarray, grid_test: np.ndar
         r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
         value in micrometers.
         wave_length: The wavelength of the incident wave.
-        i: Index value of the equation in the resulting population.
         run: The run number for this value of r0.
+        solver_backend: The way to solve the equations, 'tedeous', 'batched', 'ode' or 'amortized', which
+        solves the equations covered by the network of train_amortized_solver by its forward pass and falls
+        back to TEDEouS for the rest and for the solutions failing the residual check of
+        get_amortized_solutions, so that only the checked solutions are cached (default is 'tedeous').
+        use_solution_cache: The flag whether to use the solutions cache (default is True).
+        warm_start: The flag whether to initialize the networks with the weights of the structurally identical
+        equations solved in the experiment for the nearest radius values (default is False).
+        eq_indices: The indices of the equations in the population to solve (default is None, i.e. all).
+        nn_params: The architecture, the precision and the compilation mode of the solver networks, see
+        get_nn_params (default is None, i.e. the defaults).
+        save_results: The flag whether to render, save and record the solutions here; if unset, they are
+        returned to be saved by save_solved_equation, e.g. by another stage of start_pipeline_exp
+        (default is True).
+        use_smoothing: The flag whether to smooth the training data for the initial derivatives of the 'ode'
+        backend (default is True).
 
     Returns:
-        None
+        dict | None: The solutions for the training and testing grids as NumPy arrays keyed by the indices of
+        the equations if save_results is unset, None otherwise.
     """
 
-    pred_solution_training, pred_solution_test = get_solution(equation[0][1], poynting_vec_training,
-                                                              grid_training,
-                                                              grid_test, solver_img_dir,
-                                                              training_epochs=training_tedeous_epochs)
-    draw_solution(r0, wave_length, i, run, grid_training, grid_test, poynting_vec_training,
-                  poynting_vec_test, pred_solution_training, pred_solution_test, results_dir, save_solutions=True,
-                  add_legend=False)
-    save_solution_data(r0, i, run, pred_solution_training, results_dir)
-    save_solution_data(r0, i, run, pred_solution_test, results_dir, training=False)
+    nn_params = get_nn_params(nn_params)
+    if eq_indices is None:
+        eq_indices = list(range(len(eqs_text_form)))
+    eqs_solver_form = [eqs_solver_form[i] for i in eq_indices]
+    eqs_text_form = [eqs_text_form[i] for i in eq_indices]
+
+    if use_solution_cache:
+        solver_settings = {'backend': solver_backend, 'training_epochs': training_tedeous_epochs,
+                           'boundary': ((0.0,), (-1,)), 'warm_start': warm_start}
+        if nn_params != get_nn_params():
+            solver_settings['nn_params'] = nn_params  # the solutions cached with the default networks stay valid
+        if solver_backend == 'ode':
+            # the initial values are taken from the training data, which differs between the radius values and splits
+            solver_settings['ode_init'] = {'use_smoothing': use_smoothing,
+                                           'data': get_derivatives_key(grid_training, poynting_vec_training,
+                                                                       {'use_smoothing': use_smoothing})}
+        if solver_backend == 'amortized' and get_amortized_nn_path().exists():
+            solver_settings['amortized_nn'] = get_file_hash(get_amortized_nn_path())
+            solver_settings['amortized_max_residual'] = amortized_max_residual
+        keys = []
+        for text_eq in eqs_text_form:  # an equation equal to an earlier one within the tolerance shares its key
+            solution_keys = get_solution_keys(text_eq, grid_training, grid_test, solver_settings)
+            keys.append(next((key for key in solution_keys if key in keys), None)
+                        or find_cached_solution(solution_keys))
+        solutions = {key: load_cached_solution(key) for key in keys}
+    else:
+        keys = list(range(len(eqs_text_form)))
+        solutions = dict.fromkeys(keys)
+    first_indices = {}
+    for i, key in enumerate(keys):
+        first_indices.setdefault(key, i)
+    unsolved = [i for key, i in first_indices.items() if solutions[key] is None]
+
+    if solver_backend == 'amortized' and unsolved:
+        amortized_nn = load_amortized_nn()
+        if amortized_nn is not None:
+            with stage('get_amortized_solutions', equations=len(unsolved)):
+                amortized_solutions = get_amortized_solutions(amortized_nn[0], [eqs_text_form[i] for i in unsolved],
+                                                              grid_training, grid_test, amortized_nn[1])
+            for i, solution in zip(unsolved, amortized_solutions):
+                solutions[keys[i]] = solution
+    if solver_backend == 'batched' and unsolved:
+        init_states = None
+        if warm_start:
+            init_states = [load_warm_start_weights(r0, eqs_text_form[i], results_dir) for i in unsolved]
+            init_states = [state if state is not None and fits_nn(state, nn_params) else None
+                           for state in init_states]
+        with stage('get_batched_solution', equations=len(unsolved)):
+            batched_solutions, states = get_batched_solution([eqs_text_form[i] for i in unsolved], grid_training,
+                                                             grid_test, training_epochs=training_tedeous_epochs,
+                                                             init_states=init_states, return_states=True,
+                                                             nn_params=nn_params)
+        for i, solution, state in zip(unsolved, batched_solutions, states):
+            solutions[keys[i]] = solution
+            if warm_start:
+                save_warm_start_weights(r0, eqs_text_form[i], state, results_dir)
+    elif solver_backend in {'tedeous', 'ode', 'amortized'}:
+        derivs = None
+        if solver_backend == 'ode' and unsolved:
+            max_deriv_order = max(get_max_deriv_order(get_residual_coefs(eqs_text_form[i])) for i in unsolved)
+            if max_deriv_order:
+                derivs = get_training_derivatives(grid_training, poynting_vec_training, (max_deriv_order,),
+                                                  use_smoothing)[0]
+        for i in unsolved:
+            if solutions[keys[i]] is not None:
+                continue  # solved by the amortized network
+            if solver_backend == 'ode':
+                with stage('get_ode_solution', i=eq_indices[i]):
+                    solutions[keys[i]] = get_ode_solution(eqs_text_form[i], grid_training, grid_test,
+                                                          poynting_vec_training, derivs=derivs,
+                                                          use_smoothing=use_smoothing,
+                                                          dtype=getattr(torch, nn_params['dtype']))
+                    add_stage_info(success=solutions[keys[i]] is not None)
+                if solutions[keys[i]] is not None:
+                    continue
+            net = get_nn(nn_params['width'], nn_params['depth'], nn_params['activation'],
+                         getattr(torch, nn_params['dtype']))
+            init_state = load_warm_start_weights(r0, eqs_text_form[i], results_dir) if warm_start else None
+            if init_state is not None and fits_nn(init_state, nn_params):
+                net.load_state_dict(init_state)
+            with stage('get_solution', i=eq_indices[i]):
+                solutions[keys[i]] = get_solution(eqs_solver_form[i][0][1], poynting_vec_training, grid_training,
+                                                  grid_test, solver_img_dir,
+                                                  training_epochs=training_tedeous_epochs, net=net,
+                                                  nn_params=nn_params, text_eq=eqs_text_form[i])
+            if warm_start:
+                save_warm_start_weights(r0, eqs_text_form[i], net.state_dict(), results_dir)
+    if use_solution_cache:
+        for i in unsolved:
+            save_cached_solution(keys[i], *solutions[keys[i]])
+
+    if not save_results:
+        return {i: tuple(solution.detach().numpy() for solution in solutions[key])
+                for i, key in zip(eq_indices, keys)}
+    for i, key in zip(eq_indices, keys):
+        pred_solution_training, pred_solution_test = solutions[key]
+        save_solution_results(r0, wave_length, i, run, grid_training, grid_test, poynting_vec_training,
+                              poynting_vec_test, pred_solution_training, pred_solution_test, results_dir)
+        mark_unit_done(results_dir, get_unit_name('solution', r0, run, i))
+
+
+def get_eq_indices_to_solve(r0: int | float, run: int, eqs_text_form: [str], grid_training: np.ndarray,
+                            poynting_vec_training: np.ndarray, results_dir: Path, solve_top_k: int = None,
+                            resume: bool = True, use_smoothing: bool = True) -> [int]:
+    """
+    Selects the equations of the population to solve: the ones with the lowest residuals on the training data
+    if solve_top_k is set, except the ones already recorded as solved in the run manifest. The residuals are
+    evaluated with the cached derivatives of get_training_derivatives rather than the differences of the raw data.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        run: The run number for this value of r0.
+        eqs_text_form: The equations in EPDE text form.
+        grid_training: Training grid data in the form passed to the EPDE search.
+        poynting_vec_training: Training Poynting vector data.
+        results_dir: Directory to save results.
+        solve_top_k: The number of equations with the lowest residuals to solve (default is None, i.e. all).
+        resume: The flag whether to skip the solved equations (default is True).
+        use_smoothing: The flag whether to smooth the data before the derivatives are computed (default is True).
+
+    Returns:
+        list: The sorted indices of the equations in the population.
+    """
+
+    eq_indices = list(range(len(eqs_text_form)))
+    if solve_top_k is not None and solve_top_k < len(eqs_text_form):
+        with stage('screening'):
+            max_deriv_order = max(get_max_deriv_order(get_residual_coefs(text_eq)) for text_eq in eqs_text_form)
+            derivs = get_training_derivatives(grid_training, poynting_vec_training, (max_deriv_order,),
+                                              use_smoothing)[0] if max_deriv_order else None
+            scores = get_residual_scores(eqs_text_form, grid_training, poynting_vec_training, derivs)
+            eq_indices = sorted(np.argsort(scores, kind='stable')[:solve_top_k].tolist())
+        print(f'r0 = {r0}, run = {run}: {len(eqs_text_form) - len(eq_indices)} equations screened out')
+    if resume:
+        eq_indices = [i for i in eq_indices
+                      if get_done_unit(results_dir, get_unit_name('solution', r0, run, i)) is None]
+    return eq_indices
+
+
+def get_discovered_eq_indices(r0: int | float, wave_length: int | float, run: int, results_dir: Path,
+                              solve_top_k: int = None, use_smoothing: bool = True) -> list | None:
+    """
+    Selects the equations to solve of a population discovered by start_run earlier by get_eq_indices_to_solve.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        run: The run number for this value of r0.
+        results_dir: Directory to save results.
+        solve_top_k: The number of equations with the lowest residuals to solve (default is None, i.e. all).
+        use_smoothing: The flag whether to smooth the data before the derivatives are computed for the
+        screening (default is True).
+
+    Returns:
+        list | None: The sorted indices of the unsolved equations or None if the population has not been
+        discovered.
+    """
+
+    discovery = get_done_unit(results_dir, get_unit_name('discovery', r0, run))
+    if discovery is None:
+        return None
+    grid_training, grid_test, poynting_vec_training, _ = load_split_exp_data(r0, results_dir)
+    grid_max = np.max(np.concatenate((grid_training, grid_test))) / wave_length
+    return get_eq_indices_to_solve(r0, run, discovery['eqs_text_form'], grid_training / wave_length / grid_max,
+                                   poynting_vec_training, results_dir, solve_top_k, use_smoothing=use_smoothing)
+
+
+def solve_discovered_equations(r0: int | float, wave_length: int | float, run: int, eq_indices: [int],
+                               training_tedeous_epochs: int, results_dir: Path, solver_backend: str = 'tedeous',
+                               use_solution_cache: bool = True, warm_start: bool = False,
+                               nn_params: dict = None, save_results: bool = True,
+                               use_smoothing: bool = True) -> dict | None:
+    """
+    Solves the equations of a population discovered by start_run earlier, e.g. in another process or on
+    another node, taking the data split and the population from the results directory. The equations recorded
+    as solved in the run manifest are skipped.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        run: The run number for this value of r0.
+        eq_indices: The indices of the equations in the population to solve.
+        training_tedeous_epochs: Number of training TEDEouS epochs.
+        results_dir: Directory to save results.
+        solver_backend: The way to solve the equations, 'tedeous', 'batched', 'ode' or 'amortized' (default is
+        'tedeous').
+        use_solution_cache: The flag whether to use the solutions cache (default is True).
+        warm_start: The flag whether to initialize the networks with the weights of the solved similar
+        equations (default is False).
+        nn_params: The architecture, the precision and the compilation mode of the solver networks, see
+        get_nn_params (default is None, i.e. the defaults).
+        save_results: The flag whether to save the solutions here or to return them, see solve_population
+        (default is True).
+        use_smoothing: The flag whether to smooth the training data for the initial derivatives of the 'ode'
+        backend (default is True).
+
+    Returns:
+        dict | None: The solutions keyed by the indices of the equations if save_results is unset, None
+        otherwise.
+
+    Raises:
+        ValueError: If the population has not been discovered.
+    """
+
+    discovery = get_done_unit(results_dir, get_unit_name('discovery', r0, run))
+    eqs_solver_form = load_solver_forms(results_dir, r0, run)
+    if discovery is None or eqs_solver_form is None:
+        raise ValueError(f'The population for r0 = {r0}, run = {run} has not been discovered')
+    eq_indices = [i for i in eq_indices if get_done_unit(results_dir, get_unit_name('solution', r0, run, i)) is None]
+    if not eq_indices:
+        return None if save_results else {}
+    grid_training, grid_test, poynting_vec_training, poynting_vec_test = load_split_exp_data(r0, results_dir)
+    grid_training, grid_test = grid_training / wave_length, grid_test / wave_length
+    grid_max = np.max(np.concatenate((grid_training, grid_test)))
+    set_trace_dir(results_dir)
+    with stage('solve_discovered_equations', r0=r0, run=run):
+        return solve_population(eqs_solver_form, discovery['eqs_text_form'], grid_training / grid_max,
+                                grid_test / grid_max, poynting_vec_training, poynting_vec_test,
+                                training_tedeous_epochs, results_dir, r0, wave_length, run, solver_backend,
+                                use_solution_cache, warm_start, eq_indices, nn_params, save_results, use_smoothing)
 
 
 def start_run(r0: int | float, wave_length: int | float, run: int, grid_training: np.ndarray,
-              grid_test: np.ndarray, poynting_vec_training: np.ndarray,
-              poynting_vec_test: np.ndarray, pop_size: int, factors_max_number: int,
-              poly_order: int, training_epde_epochs: int, variable_names: [str],
-              max_deriv_order: (int,), equation_terms_max_number: int, data_fun_pow: int,
-              use_smoothing: bool, solve_equations: bool,
-              training_tedeous_epochs: int, results_dir: Path) -> None:
+              grid_test: np.ndarray, poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
+              results_dir: Path, settings: dict, seed_equations: [str] = None, resume: bool = True) -> None:
     """
     Starts a run for solving equations from one population and saving results based on the provided parameters.
+    The completed stages of the run are recorded in the run manifest, so that an interrupted run is resumed
+    from the discovered population and only the unsolved equations are solved. The run is recorded as completed
+    only if its equations are solved here, so a later resumed run solves the population of a discovery-only run.
 
     Args:
         r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
@@ -222,52 +534,157 @@ def start_run(r0: int | float, wave_length: int | float, run: int, grid_training
         grid_test: Test grid data.
         poynting_vec_training: Training Poynting vector data.
         poynting_vec_test: Test Poynting vector data.
-        pop_size: Population size for EPDE.
-        factors_max_number: Maximum number of factors in a term.
-        poly_order: Order of family of tokens for polynomials.
-        training_epde_epochs: Number of training EPDE epochs.
-        variable_names: Names of variables in a differential equation.
-        max_deriv_order: Maximum derivative order in a differential equation.
-        equation_terms_max_number: Maximum number of equation terms.
-        data_fun_pow: The highest power of derivative-like token in the equation.
-        use_smoothing: The flag whether to use Gaussian smoothing.
-        solve_equations: Boolean indicating whether to solve equations.
-        training_tedeous_epochs: Number of training TEDEouS epochs.
         results_dir: Directory to save results.
+        settings: The settings of the experiment, see get_exp_settings.
+        seed_equations: The equations in EPDE text form to seed the initial population of the EPDE search with
+        (default is None).
+        resume: The flag whether to skip the units of the run recorded as completed (default is True).
 
     Returns:
         None
     """
 
-    grid_max = np.max(np.concatenate((grid_training, grid_test)))
-    eqs_solver_form, eqs_text_form = get_eqs_solver_text_form(grid_training=grid_training / grid_max,
-                                                              poynting_vec_training=poynting_vec_training,
-                                                              pop_size=pop_size, factors_max_number=factors_max_number,
-                                                              poly_order=poly_order,
-                                                              training_epde_epochs=training_epde_epochs,
-                                                              variable_names=variable_names,
-                                                              max_deriv_order=max_deriv_order,
-                                                              equation_terms_max_number=equation_terms_max_number,
-                                                              data_fun_pow=data_fun_pow, use_smoothing=use_smoothing)
-    for i, eq in enumerate(eqs_solver_form):
-        if solve_equations:
-            start_solver(eq, grid_training / grid_max, grid_test / grid_max, poynting_vec_training, poynting_vec_test,
-                         training_tedeous_epochs, results_dir, r0, wave_length, i, run)
-        save_txt_form_equations(r0=r0, i=i, run=run, results_dir=results_dir, text_eq=eqs_text_form[i])
-
-
-def save_exp_params(exp_name: str, wave_length: int | float, nruns: int, pop_size: int,
-                    factors_max_number: int, poly_order: int, max_deriv_order: int | tuple,
-                    equation_terms_max_number: int, data_fun_pow: int, training_epde_epochs: int,
-                    training_tedeous_epochs: int, use_smoothing: bool) -> None:
-    params = {'exp_name': exp_name, 'wave_length': wave_length, 'nruns': nruns, 'pop_size': pop_size,
-              'factors_max_numbers': factors_max_number, 'max_deriv_order': max_deriv_order, 'poly_order': poly_order,
-              'equation_terms_max_number': equation_terms_max_number, 'data_fun_pow': data_fun_pow,
-              'training_epde_epochs': training_epde_epochs, 'training_tedeous_epochs': training_tedeous_epochs,
-              'use_smoothing': use_smoothing}
-    parameters_file_name = get_results_dir(exp_name) / '_Parameters.txt'
-    with parameters_file_name.open(mode='w') as file:
-        for key, value in params.items():
-            file.write(f'{key}: {value}\n')
+    if resume and get_done_unit(results_dir, get_unit_name('run', r0, run)) is not None:
+        return
+
+    set_trace_dir(results_dir)
+    with stage('start_run', r0=r0, run=run):
+        grid_max = np.max(np.concatenate((grid_training, grid_test)))
+        discovery = get_done_unit(results_dir, get_unit_name('discovery', r0, run)) if resume else None
+        eqs_solver_form = load_solver_forms(results_dir, r0, run) if discovery is not None else None
+        if eqs_solver_form is None:
+            derivs = None
+            if settings['precompute_derivs']:
+                with stage('get_derivatives'):
+                    derivs = get_training_derivatives(grid_training / grid_max, poynting_vec_training,
+                                                      settings['max_deriv_order'], settings['use_smoothing'])
+            with stage('epde_discovery'):
+                eqs_solver_form, eqs_text_form, epochs = get_eqs_solver_text_form(
+                    grid_training=grid_training / grid_max, poynting_vec_training=poynting_vec_training,
+                    pop_size=settings['pop_size'], factors_max_number=settings['factors_max_number'],
+                    poly_order=settings['poly_order'], training_epde_epochs=settings['training_epde_epochs'],
+                    variable_names=settings['variable_names'], max_deriv_order=settings['max_deriv_order'],
+                    equation_terms_max_number=settings['equation_terms_max_number'],
+                    data_fun_pow=settings['data_fun_pow'], use_smoothing=settings['use_smoothing'],
+                    seed_equations=seed_equations, decimation_stride=settings['decimation_stride'], derivs=derivs,
+                    eq_sparsity_interval=settings['eq_sparsity_interval'])
+                add_stage_info(epochs=epochs)
+            save_discovery_epochs(r0, run, results_dir, epochs, settings['training_epde_epochs'])
+            save_solver_forms(results_dir, r0, run, eqs_solver_form)
+            mark_unit_done(results_dir, get_unit_name('discovery', r0, run), {'eqs_text_form': list(eqs_text_form)})
+        else:
+            eqs_text_form = discovery['eqs_text_form']
+            print(f'r0 = {r0}, run = {run}: the discovered population is resumed')
+        if settings['solve_equations']:
+            eq_indices = get_eq_indices_to_solve(r0, run, eqs_text_form, grid_training / grid_max,
+                                                 poynting_vec_training, results_dir, settings['solve_top_k'],
+                                                 resume, settings['use_smoothing'])
+            if eq_indices:
+                solve_population(eqs_solver_form, eqs_text_form, grid_training / grid_max, grid_test / grid_max,
+                                 poynting_vec_training, poynting_vec_test, settings['training_tedeous_epochs'],
+                                 results_dir, r0, wave_length, run, settings['solver_backend'],
+                                 settings['use_solution_cache'], settings['warm_start'], eq_indices,
+                                 settings['nn_params'], use_smoothing=settings['use_smoothing'])
+        for i, text_eq in enumerate(eqs_text_form):
+            save_txt_form_equations(r0=r0, i=i, run=run, results_dir=results_dir, text_eq=text_eq)
+        if settings['solve_equations']:  # a discovery-only run is recorded by its 'discovery' unit, solved later
+            mark_unit_done(results_dir, get_unit_name('run', r0, run))
+
+
+def init_worker(threads_per_worker: int = 1, render_mode: str = 'inline') -> None:
+    """
+    Prepares a process pool worker for the experiment: the solver is placed on CPU and the number of torch
+    intra-op threads is pinned, so that several workers do not oversubscribe the cores.
+
+    Args:
+        threads_per_worker: Number of torch intra-op threads for the worker (default is 1).
+        render_mode: The way the worker renders the solutions, see start_rendering (default is 'inline').
+
+    Returns:
+        None
+    """
+
+    solver_device('cpu')
+    torch.set_num_threads(threads_per_worker)
+    mpl.use('Agg')
+    start_rendering(render_mode, max_workers=1)
 
 
+def get_exp_settings(**settings) -> dict:
+    """
+    Completes the settings of the experiment with default_exp_settings. The entry points of interface take the
+    settings as keyword arguments and pass them on as the one dict returned here, which is saved as
+    '_Parameters.txt' by save_exp_params and as the queue settings by enqueue_exp.
+
+    Args:
+        nruns: The number of runs of the EPDE search for every radius value (default is 1).
+        solve_equations: The flag whether to solve the discovered equations (default is True).
+        pop_size: The population size for EPDE (default is 5).
+        factors_max_number: Maximum number of factors in a term (default is 1).
+        poly_order: Order of family of tokens for polynomials (default is 4).
+        variable_names: List of variable names (default is ['I']).
+        max_deriv_order: Maximum derivative order, an int or a tuple per variable (default is (2,)).
+        equation_terms_max_number: Maximum number of equation terms (default is 5).
+        data_fun_pow: The highest power of derivative-like token in the equation (default is 1).
+        training_epde_epochs: Number of training epochs for EPDE (default is 100).
+        training_tedeous_epochs: Number of training epochs for TEDEouS (default is 10000).
+        use_smoothing: The flag whether to use Gaussian smoothing (default is False).
+        solver_backend: The way to solve the equations: 'tedeous' solves them one by one, 'batched' trains
+        the networks for the whole population together, 'ode' integrates them by a classical stiff-capable
+        method and falls back to TEDEouS for the equations it fails on, 'amortized' solves them by the network
+        of train_amortized_solver and falls back to TEDEouS for the equations it does not cover (default is
+        'tedeous').
+        use_solution_cache: The flag whether to solve every distinct equation once and reuse its solution
+        from the solutions cache (default is True).
+        warm_start: The flag whether to initialize the solver networks with the weights of the solved similar
+        equations (default is False).
+        seed_exp_name: The name of the saved experiment to seed the EPDE search for every radius value with the
+        best equations for the closest radius value from (default is None, i.e. no seeding).
+        solve_top_k: The number of equations of every population with the lowest residuals on the training data
+        to solve, the rest of the population is saved without solutions (default is None, i.e. all equations
+        are solved).
+        decimation_stride: The stride of the training data to run the EPDE search on before the equations are
+        rescored on the full grid, e.g. 4, see multiresolution_discovery (default is None, i.e. the search runs
+        on the full grid).
+        precompute_derivs: The flag whether to compute the derivatives of the training data once and pass them
+        to the EPDE search in every run; they replace the preprocessing of EPDE and match it only approximately
+        (default is False, i.e. the EPDE preprocessor computes them).
+        nn_params: The architecture, the precision and the compilation mode of the solver networks, e.g.
+        {'width': 64, 'depth': 2, 'dtype': 'float64', 'compile': 'script'}, see get_nn_params (default is None,
+        i.e. 3 hidden layers of 100 tanh neurons in float32 without compilation).
+        eq_sparsity_interval: The interval of the sparsity constant of the EPDE search, e.g. the best one found
+        by start_search (default is (1e-12, 1e-4)).
+
+    Returns:
+        dict: The settings of the experiment.
+
+    Raises:
+        ValueError: If a setting or the solver backend is unknown or the adaptive collocation is requested for
+        the batched solver backend.
+    """
+
+    unknown = set(settings) - set(default_exp_settings)
+    if unknown:
+        raise ValueError(f'Unknown experiment settings: {", ".join(sorted(unknown))}')
+    settings = {**default_exp_settings, **settings}
+    for key in ('max_deriv_order', 'eq_sparsity_interval'):
+        if isinstance(settings[key], list):
+            settings[key] = tuple(settings[key])  # JSON has no tuples
+    if isinstance(settings['max_deriv_order'], int):
+        settings['max_deriv_order'] = (settings['max_deriv_order'],)
+    if settings['variable_names'] is None:
+        settings['variable_names'] = ['I']
+    if settings['solver_backend'] not in solver_backends:
+        raise ValueError(f'Unknown solver backend: {settings["solver_backend"]}')
+    settings['nn_params'] = get_nn_params(settings['nn_params'])
+    if settings['solver_backend'] == 'batched' and settings['nn_params']['collocation'] is not None:
+        raise ValueError('The adaptive collocation is not supported by the batched solver backend')
+    return settings
+
+
+def save_exp_params(exp_name: str, wave_length: int | float, settings: dict) -> None:
+    params = {'exp_name': exp_name, 'wave_length': wave_length, **settings}
+    parameters_file_name = get_results_dir(exp_name) / '_Parameters.txt'
+    text = ''.join(f'{key}: {value}\n' for key, value in params.items())
+    if not parameters_file_name.exists() or parameters_file_name.read_text() != text:
+        write_atomically(parameters_file_name, lambda file_name: file_name.write_text(text))
@@ -1,174 +1,422 @@
-import numpy as np
+import json
 
 from experiment_tools import *
 from results_analysis_tools import *
-import pandas as pd
+from report_tools import *
+from surrogate_tools import *
+from render_tools import (start_rendering, finish_rendering, render_results_dir, render_saved_solutions,
+                          init_render_worker)
+from profile_tools import stage, add_stage_info, set_trace_dir, save_trace_summary
+from pipeline_tools import run_pipeline
+from queue_tools import get_queue_dir, put_unit, run_queue_worker, get_queue_status, get_failed_units
 import itertools
-import torch
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 
-def get_results_df(r0_list: [int | float], exp_name: str, pop_size: int,
-                   nruns: int) -> pd.DataFrame:
+def get_sweep_data(r0_list: [int | float], results_dir: Path, settings: dict,
+                   resume: bool = True) -> (dict, dict):
     """
-    Creates a pandas DataFrame containing results from equations for a list of initial values.
+    Gets the data splits of the radius values of a sweep and the equations seeding their EPDE searches.
 
     Args:
         r0_list: List containing radius values.
-        exp_name: Name of the experiment.
-        pop_size: The population size.
-        nruns: The number of runs.
+        results_dir: The results directory of the experiment.
+        settings: The settings of the experiment, see get_exp_settings.
+        resume: The flag whether to reuse the data splits saved by a previous call (default is True).
+
     Returns:
-        Pandas DataFrame with the results from the equations.
+        tuple: The split data and the seed equations, if the seed experiment is set, keyed by the radius values.
     """
 
-    eqn_list = []
-    for r0_fix in r0_list:
-        eqn_list.extend(
-            f'eqn_{r0_fix}_{i}_{j}.txt'
-            for i, j in itertools.product(range(pop_size), range(nruns))
-        )
-    read_eq_dict = {
-        eq: read_eqn(exp_name, eq)
-        for eq in eqn_list
-        if read_eqn(exp_name, eq) is not None
-    }
-    return pd.DataFrame(read_eq_dict).transpose().fillna(0)
+    split_data, seed_equations = {}, {}
+    for r0 in r0_list:
+        with stage('get_split_data', r0=r0):
+            split_data[r0] = get_exp_split_data(r0, results_dir, resume)
+        if settings['seed_exp_name'] is not None:
+            seed_equations[r0] = get_seed_equations(settings['seed_exp_name'], r0, max(1, settings['pop_size'] // 2))
+    return split_data, seed_equations
 
 
-def get_equation_latex_form(results_df: pd.DataFrame, eq_name: str) -> str:
+def start_exp(r0: int | float, wave_length: int | float, exp_name: str = 'optics', seed_r0: int | float = None,
+              render_mode: str = 'inline', render_workers: int = None, resume: bool = True, **settings) -> None:
     """
-    Generates the LaTeX form of an equation based on the coefficients and terms from the results DataFrame.
+    Runs an optics experiment with the specified parameters.
 
     Args:
-        results_df: Pandas DataFrame containing the results.
-        eq_name: Name of the equation.
+        r0 (int | float): The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        exp_name (str): The name of the experiment (default is 'optics').
+        seed_r0: The radius value to take the seed equations for, e.g. the previous value of the sweep, from the
+        experiment seed_exp_name or, if it is not set, exp_name (default is None, i.e. r0 if seed_exp_name is set
+        and no seeding otherwise).
+        render_mode: The way to render the solutions: 'inline' draws them in the solver loop, 'background' in
+        a pool of processes, 'deferred' after all runs (default is 'inline').
+        render_workers: The number of rendering processes (default is None, i.e. one process per CPU).
+        resume: The flag whether to skip the data split, the runs and the solutions recorded as completed in the
+        run manifest by an interrupted call (default is True).
+        **settings: The settings of the experiment, e.g. pop_size=6, nruns=2, see get_exp_settings.
 
     Returns:
-        LaTeX formatted string representing the equation.
+        None
     """
 
-    rmse = results_df['rmse'][eq_name]
-    results_df = results_df.drop('rmse', axis=1)
-    coefs = np.array(results_df.loc[eq_name])
-    terms = [fr'{coefs[i]:.3f} \cdot ' + results_df.columns[i].replace('C', '') for i in range(len(coefs)) if
-             coefs[i] not in [0.0] and results_df.columns[i] != 'dI/dH']
-    terms[0] = f"$${terms[0]}"
-    eq_name = eq_name.replace('.txt', '')
-    params = eq_name.split('_')
-    params = {"$r_0$ = ": params[1], "index = ": params[2], "run = ": params[3], "rmse = ": f'{rmse:.3f}'}
-    res = "$r_0$ = " + params["$r_0$ = "] + ", index = " + params["index = "] + ", run = " + params[
-        "run = "] + ", rmse = " + params["rmse = "] + ": " + " + ".join(terms) + " = dI/dH$$" + "\n\n"
-    res = res.replace('+ -', '- ')
-    res = res.replace('dI/dH', r'\frac{dI}{dH}')
-    res = res.replace(r'\cdot  ', '')
-    return res
+    settings = get_exp_settings(**settings)
+    save_exp_params(exp_name, wave_length, settings)
 
+    seed_equations = None
+    if settings['seed_exp_name'] is not None or seed_r0 is not None:
+        seed_equations = get_seed_equations(settings['seed_exp_name'] or exp_name, r0 if seed_r0 is None else seed_r0,
+                                            max(1, settings['pop_size'] // 2))
 
-def save_total_results_csv(r0_list: [int | float], exp_name: str, pop_size: int,
-                           nruns: int) -> None:
+    results_dir = get_results_dir(exp_name)
+    set_trace_dir(results_dir)
+    with stage('get_split_data', r0=r0):
+        grid_training, grid_test, poynting_vec_training, poynting_vec_test = get_exp_split_data(r0, results_dir,
+                                                                                                resume)
+
+    start_rendering(render_mode, render_workers)
+    for run in range(settings['nruns']):
+        start_run(r0, wave_length, run, grid_training / wave_length, grid_test / wave_length, poynting_vec_training,
+                  poynting_vec_test, results_dir, settings, seed_equations, resume)
+    with stage('finish_rendering', r0=r0):
+        finish_rendering()
+        if render_mode == 'deferred' and settings['solve_equations']:
+            render_results_dir(results_dir, wave_length, [r0],
+                               units=itertools.product(range(settings['pop_size']), range(settings['nruns'])),
+                               max_workers=render_workers)
+    save_trace_summary(results_dir)
+
+
+def start_parallel_exp(r0_list: [int | float], wave_length: int | float, exp_name: str = 'optics',
+                       max_workers: int = None, threads_per_worker: int = 1, render_mode: str = 'inline',
+                       render_workers: int = None, resume: bool = True, **settings) -> None:
     """
-    Saves the total results DataFrame to a CSV file for a given experiment.
+    Runs an optics experiment for several radius values at once, distributing the (r0, run) work units
+    among the processes of a pool. The results are written to the same directory layout as by start_exp.
 
     Args:
         r0_list: List containing radius values.
-        exp_name: Name of the experiment.
-        pop_size: The population size.
-        nruns: The number of runs.
+        wave_length: The wavelength of the incident wave.
+        exp_name (str): The name of the experiment (default is 'optics').
+        max_workers: The number of worker processes (default is None, i.e. the number of CPUs divided by
+        threads_per_worker).
+        threads_per_worker: The number of torch intra-op threads in every worker (default is 1).
+        render_mode: The way to render the solutions: 'inline' draws them in the workers, 'background' in a
+        rendering process of every worker, 'deferred' in parallel after the sweep (default is 'inline').
+        render_workers: The number of rendering processes for the deferred rendering (default is None, i.e. one
+        process per CPU).
+        resume: The flag whether to skip the data splits, the runs and the solutions recorded as completed in
+        the run manifest by an interrupted call (default is True).
+        **settings: The settings of the experiment, e.g. pop_size=6, nruns=2, see get_exp_settings.
 
     Returns:
         None
     """
 
-    results_df = get_results_df(r0_list, exp_name, pop_size, nruns)
-    results_df = results_df[['C', 'H', 'I', 'I^2', 'I^3', 'I^4', 'd^2I/dH^2', 'dI/dH', 'rmse']]
-    results_dir_name = get_results_dir(exp_name)
-    results_df.to_csv(results_dir_name / fr'total_results_{exp_name}.csv')
+    settings = get_exp_settings(**settings)
+    save_exp_params(exp_name, wave_length, settings)
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
 
+    results_dir = get_results_dir(exp_name)
+    set_trace_dir(results_dir)
+    split_data, seed_equations = get_sweep_data(r0_list, results_dir, settings, resume)
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(threads_per_worker, render_mode)) as executor:
+        futures = []
+        for r0, run in itertools.product(r0_list, range(settings['nruns'])):
+            grid_training, grid_test, poynting_vec_training, poynting_vec_test = split_data[r0]
+            futures.append(executor.submit(start_run, r0, wave_length, run, grid_training / wave_length,
+                                           grid_test / wave_length, poynting_vec_training, poynting_vec_test,
+                                           results_dir, settings, seed_equations.get(r0), resume))
+        for future in futures:
+            future.result()
+    if render_mode == 'deferred' and settings['solve_equations']:
+        with stage('finish_rendering'):
+            render_results_dir(results_dir, wave_length, r0_list,
+                               units=itertools.product(range(settings['pop_size']), range(settings['nruns'])),
+                               max_workers=render_workers)
+    save_trace_summary(results_dir)
+
+
+def start_pipeline_exp(r0_list: [int | float], wave_length: int | float, exp_name: str = 'optics',
+                       stage_workers: dict = None, queue_size: int = 4, threads_per_worker: int = 1,
+                       resume: bool = True, **settings) -> dict:
+    """
+    Runs an optics experiment as a pipeline of the stages discovery -> solve -> save -> render connected by
+    bounded queues, every stage with its own workers. The equations of a population go to the solvers as soon
+    as it is discovered, while the EPDE search of the next run goes on, and the solutions are saved and
+    rendered while the next equations are solved. A full queue holds back the stage feeding it, so a slow
+    stage does not accumulate the results in memory. The results are written to the same directory layout as
+    by start_exp. The 'batched' solver backend solves a population as one item, the others solve every
+    equation as a separate item.
 
-def save_total_results_latex_form(r0_list: [int | float], exp_name: str, pop_size: int,
-                                  nruns: int) -> None:
+    Args:
+        r0_list: List containing radius values.
+        wave_length: The wavelength of the incident wave.
+        exp_name (str): The name of the experiment (default is 'optics').
+        stage_workers: The numbers of workers of the stages 'discovery', 'solve', 'save' and 'render'; the
+        discovery, solve and render workers are processes, the save workers are threads, and 0 render workers
+        skip the rendering (default is None, i.e. one worker per stage).
+        queue_size: The capacity of the queue in front of every stage (default is 4).
+        threads_per_worker: The number of torch intra-op threads in every discovery and solve process
+        (default is 1).
+        resume: The flag whether to skip the data splits, the runs and the solutions recorded as completed in
+        the run manifest by an interrupted call (default is True).
+        **settings: The settings of the experiment, e.g. pop_size=6, nruns=2, see get_exp_settings.
+
+    Returns:
+        dict: The number of the processed items, the busy time and the time waiting for the items of every
+        stage, see run_pipeline.
+    """
+
+    settings = get_exp_settings(**settings)
+    save_exp_params(exp_name, wave_length, settings)
+    stage_workers = {'discovery': 1, 'solve': 1, 'save': 1, 'render': 1, **(stage_workers or {})}
+
+    results_dir = get_results_dir(exp_name)
+    set_trace_dir(results_dir)
+    split_data, seed_equations = get_sweep_data(r0_list, results_dir, settings, resume)
+    discovery_settings = {**settings, 'solve_equations': False}  # the equations are solved by the solve stage
+
+    mp_context = multiprocessing.get_context('spawn')
+    discovery_executor = ProcessPoolExecutor(max_workers=stage_workers['discovery'], mp_context=mp_context,
+                                             initializer=init_worker, initargs=(threads_per_worker, 'deferred'))
+    solve_executor = ProcessPoolExecutor(max_workers=max(1, stage_workers['solve']), mp_context=mp_context,
+                                         initializer=init_worker, initargs=(threads_per_worker, 'deferred'))
+    render_executor = ProcessPoolExecutor(max_workers=max(1, stage_workers['render']), mp_context=mp_context,
+                                          initializer=init_render_worker)
+
+    def discover(unit: tuple) -> list:
+        r0, run = unit
+        grid_training, grid_test, poynting_vec_training, poynting_vec_test = split_data[r0]
+        discovery_executor.submit(start_run, r0, wave_length, run, grid_training / wave_length,
+                                  grid_test / wave_length, poynting_vec_training, poynting_vec_test, results_dir,
+                                  discovery_settings, seed_equations.get(r0), resume).result()
+        if not settings['solve_equations']:
+            return []
+        eq_indices = discovery_executor.submit(get_discovered_eq_indices, r0, wave_length, run, results_dir,
+                                               settings['solve_top_k'], settings['use_smoothing']).result()
+        if settings['solver_backend'] == 'batched':
+            return [(r0, run, eq_indices)] if eq_indices else []
+        return [(r0, run, [i]) for i in eq_indices]
+
+    def solve(task: tuple) -> list:
+        r0, run, eq_indices = task
+        solutions = solve_executor.submit(solve_discovered_equations, r0, wave_length, run, eq_indices,
+                                          settings['training_tedeous_epochs'], results_dir,
+                                          settings['solver_backend'], settings['use_solution_cache'],
+                                          settings['warm_start'], settings['nn_params'], False,
+                                          settings['use_smoothing']).result()
+        return [(r0, run, i, *solution) for i, solution in solutions.items()]
+
+    def save(solution: tuple) -> list:
+        r0, run, i, pred_solution_training, pred_solution_test = solution
+        save_solved_equation(r0, i, run, pred_solution_training, pred_solution_test, results_dir)
+        return [(r0, run, i)]
+
+    def render(unit: tuple) -> None:
+        r0, run, i = unit
+        render_executor.submit(render_saved_solutions, results_dir, wave_length, r0, [(i, run)]).result()
+
+    stages = [{'name': 'discovery', 'function': discover, 'workers': stage_workers['discovery']}]
+    if settings['solve_equations']:
+        stages += [{'name': 'solve', 'function': solve, 'workers': stage_workers['solve']},
+                   {'name': 'save', 'function': save, 'workers': stage_workers['save']}]
+        if stage_workers['render'] > 0:
+            stages.append({'name': 'render', 'function': render, 'workers': stage_workers['render']})
+    try:
+        with stage('pipeline', stage_workers=stage_workers, queue_size=queue_size):
+            stats = run_pipeline(itertools.product(r0_list, range(settings['nruns'])), stages, queue_size)
+            add_stage_info(stages=stats)
+    finally:
+        for executor in (discovery_executor, solve_executor, render_executor):
+            executor.shutdown()
+    for name, stage_stats in stats.items():
+        print(f'{name}: {stage_stats["items"]} items, busy {stage_stats["busy_time"]:.1f} s, '
+              f'waiting {stage_stats["wait_time"]:.1f} s')
+    save_trace_summary(results_dir)
+    return stats
+
+
+def enqueue_exp(r0_list: [int | float], wave_length: int | float, exp_name: str = 'optics', resume: bool = True,
+                **settings) -> None:
     """
-    Saves the LaTeX form of total results equations to a Markdown file for a given experiment.
+    Puts an optics experiment into the work queue of its results directory instead of running it, so that
+    it is shared by the workers started by start_queue_worker on any nodes mounting the results directory.
+    Every (r0, run) discovery is a work unit, and every finished discovery adds a work unit per equation to
+    solve, so that the solving of one population is spread among the workers as well.
 
     Args:
         r0_list: List containing radius values.
-        exp_name: Name of the experiment.
-        pop_size: The population size.
-        nruns: The number of runs.
+        wave_length: The wavelength of the incident wave.
+        exp_name (str): The name of the experiment (default is 'optics').
+        resume: The flag whether to reuse the data splits saved by a previous call (default is True).
+        **settings: The settings of the experiment, e.g. pop_size=6, nruns=2, see get_exp_settings.
+
     Returns:
         None
     """
 
-    results_df = get_results_df(r0_list, exp_name, pop_size, nruns)
-    results_df = results_df[['C', 'H', 'I', 'I^2', 'I^3', 'I^4', 'd^2I/dH^2', 'dI/dH', 'rmse']]
+    settings = get_exp_settings(**settings)
+    save_exp_params(exp_name, wave_length, settings)
 
-    results_dir_name = get_results_dir(exp_name)
+    results_dir = get_results_dir(exp_name)
+    queue_dir = get_queue_dir(results_dir)
+    queue_settings = {'wave_length': wave_length, **settings}
+    write_atomically(queue_dir / 'settings.json',
+                     lambda file_path: file_path.write_text(json.dumps(queue_settings)))
 
-    total_results_file_path = results_dir_name / f'total_results_{exp_name}.md'
+    set_trace_dir(results_dir)
+    _, seed_equations = get_sweep_data(r0_list, results_dir, settings, resume)
+    for r0, run in itertools.product(r0_list, range(settings['nruns'])):
+        put_unit(queue_dir, f'discovery_{r0}_{run}', {'kind': 'discovery', 'r0': r0, 'run': run,
+                                                      'seed_equations': seed_equations.get(r0)})
+    print(f'{exp_name}: {get_queue_status(queue_dir)}')
 
-    with total_results_file_path.open(mode='w') as equations_file:
-        for eq_name in results_df.index:
-            equation_str = get_equation_latex_form(results_df, eq_name)
-            equations_file.write(equation_str)
 
+def process_queue_unit(results_dir: Path, wave_length: int | float, settings: dict, unit_id: str,
+                       payload: dict) -> None:
+    """
+    Processes a work unit put by enqueue_exp: a discovery unit runs the EPDE search of the run and puts the
+    units solving its equations, a solution unit solves one equation of the discovered population.
 
-def start_exp(r0: int | float, wave_length: int | float, exp_name: str = 'optics', nruns: int = 1,
-              solve_equations: bool = True, pop_size: int = 5,
-              factors_max_number: int = 1, poly_order: int = 4, variable_names=None,
-              max_deriv_order: int | tuple = (2,), equation_terms_max_number: int = 5,
-              data_fun_pow: int = 1, training_epde_epochs: int = 100,
-              training_tedeous_epochs: int = 10000, use_smoothing: bool = False) -> None:
+    Args:
+        results_dir: The results directory of the experiment.
+        wave_length: The wavelength of the incident wave.
+        settings: The settings of the experiment saved by enqueue_exp, see get_exp_settings.
+        unit_id: The ID of the unit.
+        payload: The description of the unit.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the kind of the unit is unknown.
     """
-    Runs an optics experiment with the specified parameters.
+
+    r0, run = payload['r0'], payload['run']
+    grid_training, grid_test, poynting_vec_training, poynting_vec_test = load_split_exp_data(r0, results_dir)
+    if payload['kind'] == 'discovery':
+        start_run(r0, wave_length, run, grid_training / wave_length, grid_test / wave_length, poynting_vec_training,
+                  poynting_vec_test, results_dir, {**settings, 'solve_equations': False}, payload['seed_equations'])
+        if not settings['solve_equations']:
+            return
+        for i in get_discovered_eq_indices(r0, wave_length, run, results_dir, settings['solve_top_k'],
+                                           settings['use_smoothing']):
+            put_unit(get_queue_dir(results_dir), f'solution_{r0}_{run}_{i}',
+                     {'kind': 'solution', 'r0': r0, 'run': run, 'i': i})
+    elif payload['kind'] == 'solution':
+        solve_discovered_equations(r0, wave_length, run, [payload['i']], settings['training_tedeous_epochs'],
+                                   results_dir, settings['solver_backend'], settings['use_solution_cache'],
+                                   settings['warm_start'], settings['nn_params'],
+                                   use_smoothing=settings['use_smoothing'])
+    else:
+        raise ValueError(f'Unknown work unit: {unit_id}')
+
+
+def solve_exp(r0_list: [int | float], wave_length: int | float, exp_name: str = 'optics', nruns: int = 1,
+              training_tedeous_epochs: int = 10000, solver_backend: str = 'tedeous',
+              use_solution_cache: bool = True, warm_start: bool = False, solve_top_k: int = None,
+              render_mode: str = 'inline', render_workers: int = None, nn_params: dict = None,
+              use_smoothing: bool = True) -> None:
+    """
+    Solves the equations of the populations discovered earlier, e.g. by start_exp with solve_equations unset,
+    skipping the equations recorded as solved in the run manifest.
 
     Args:
-        r0 (int | float): The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
-        value in micrometers.
+        r0_list: List containing radius values.
         wave_length: The wavelength of the incident wave.
         exp_name (str): The name of the experiment (default is 'optics').
-        nruns (int): The number of runs of the epde_discovery (default is 1).
-        solve_equations (bool): Flag to solve equations (default is True).
-        pop_size: The population size for EPDE.
-        factors_max_number (int): Maximum number of factors in a term (default is 1).
-        poly_order (int): Order of family of tokens for polynomials (default is 4).
-        variable_names (list[str]): List of variable names (default is ['I']).
-        max_deriv_order (int | tuple): Maximum derivative order (default is (2,)).
-        equation_terms_max_number (int): Maximum number of equation terms (default is 5).
-        data_fun_pow (int): The highest power of derivative-like token in the equation (default is 1).
-        training_epde_epochs (int): Number of training epochs for EPDE (default is 100).
+        nruns (int): The number of runs of the epde_discovery for every radius value (default is 1).
         training_tedeous_epochs (int): Number of training epochs for TEDEouS (default is 10000).
-        use_smoothing: The flag whether to use Gaussian smoothing (default is False).
+        solver_backend: The way to solve the equations, 'tedeous', 'batched', 'ode' or 'amortized' (default is
+        'tedeous').
+        use_solution_cache: The flag whether to reuse the solutions of equal equations (default is True).
+        warm_start: The flag whether to initialize the solver networks with the weights of the solved similar
+        equations (default is False).
+        solve_top_k: The number of equations of every population with the lowest residuals on the training data
+        to solve (default is None, i.e. all equations are solved).
+        render_mode: The way to render the solutions, 'inline', 'background' or 'deferred' (default is 'inline').
+        render_workers: The number of rendering processes (default is None, i.e. one process per CPU).
+        nn_params: The architecture, the precision and the compilation mode of the solver networks, see
+        get_nn_params (default is None, i.e. the defaults).
+        use_smoothing: The flag whether the data was smoothed in the discovery, used to screen the equations and
+        to estimate the initial derivatives of the 'ode' backend (default is True).
 
     Returns:
         None
     """
 
-    save_exp_params(exp_name, wave_length, nruns, pop_size,
-                    factors_max_number, poly_order, max_deriv_order,
-                    equation_terms_max_number, data_fun_pow, training_epde_epochs,
-                    training_tedeous_epochs, use_smoothing)
+    results_dir = get_results_dir(exp_name)
+    set_trace_dir(results_dir)
+    start_rendering(render_mode, render_workers)
+    for r0, run in itertools.product(r0_list, range(nruns)):
+        eq_indices = get_discovered_eq_indices(r0, wave_length, run, results_dir, solve_top_k, use_smoothing)
+        if eq_indices is None:
+            print(f'r0 = {r0}, run = {run}: the population has not been discovered')
+        elif eq_indices:
+            solve_discovered_equations(r0, wave_length, run, eq_indices, training_tedeous_epochs, results_dir,
+                                       solver_backend, use_solution_cache, warm_start, nn_params,
+                                       use_smoothing=use_smoothing)
+    with stage('finish_rendering'):
+        finish_rendering()
+        if render_mode == 'deferred':
+            render_results_dir(results_dir, wave_length, r0_list, max_workers=render_workers)
+    save_trace_summary(results_dir)
+
+
+def start_queue_worker(exp_name: str = 'optics', threads_per_worker: int = 1, render_mode: str = 'inline',
+                       lease_timeout: float = 3600, heartbeat_interval: float = 60,
+                       poll_interval: float = 30, max_attempts: int = 3) -> None:
+    """
+    Processes the work queue of the experiment put by enqueue_exp until it is drained. Any number of workers
+    can be started on any nodes sharing the results directory; the units of a crashed worker are taken over
+    by the others once their leases expire. A failing unit is retried up to max_attempts times, then it is left
+    in 'failed' and reported; the failed units are put back by requeue_failed_units.
 
-    if variable_names is None:
-        variable_names = ['I']
+    Args:
+        exp_name (str): The name of the experiment (default is 'optics').
+        threads_per_worker: The number of torch intra-op threads of the worker (default is 1).
+        render_mode: The way to render the solutions, 'inline', 'background' or 'deferred', in which case they
+        are rendered by save_solutions_visualization after the sweep (default is 'inline').
+        lease_timeout: The time without a heartbeat after which the unit of a worker is given to another
+        worker, in seconds (default is 3600).
+        heartbeat_interval: The interval between the heartbeats of the worker, in seconds (default is 60).
+        poll_interval: The interval between the checks for new units while other workers hold the leases,
+        in seconds (default is 30).
+        max_attempts: The number of the failures of a unit after which it is not retried (default is 3).
 
-    grid_training, grid_test, poynting_vec_training, poynting_vec_test = get_split_data(r0)
-    results_dir = get_results_dir(exp_name)
-    save_split_exp_data(r0, grid_training, grid_test, poynting_vec_training, poynting_vec_test, results_dir)
+    Returns:
+        None
+    """
 
-    for run in range(nruns):
-        start_run(r0, wave_length, run, grid_training / wave_length,
-                  grid_test / wave_length, poynting_vec_training,
-                  poynting_vec_test, pop_size, factors_max_number,
-                  poly_order, training_epde_epochs, variable_names,
-                  max_deriv_order, equation_terms_max_number, data_fun_pow,
-                  use_smoothing, solve_equations,
-                  training_tedeous_epochs, results_dir)
+    results_dir = get_results_dir(exp_name)
+    queue_dir = get_queue_dir(results_dir)
+    settings = json.loads((queue_dir / 'settings.json').read_text())
+    wave_length = settings.pop('wave_length')
+    settings = get_exp_settings(**settings)
+    init_worker(threads_per_worker, render_mode)
+    set_trace_dir(results_dir)
+    run_queue_worker(queue_dir,
+                     lambda unit_id, payload: process_queue_unit(results_dir, wave_length, settings, unit_id, payload),
+                     lease_timeout, heartbeat_interval, poll_interval, max_attempts=max_attempts)
+    finish_rendering()
+    print(f'{exp_name}: {get_queue_status(queue_dir)}')
+    for unit_id, error in get_failed_units(queue_dir).items():
+        print(f'{unit_id} failed: {error}')
 
 
 def save_solutions_visualization(r0_list: list, exp_name: str, wave_length: float, pop_size: int,
-                                 nruns: int, add_legend: bool, add_training_data: bool) -> None:
+                                 nruns: int, add_legend: bool, add_training_data: bool,
+                                 max_workers: int = None) -> None:
     """
-    Save visualizations of solutions for a given experiment and parameters.
+    Save visualizations of solutions for a given experiment and parameters. The radius values are rendered
+    in parallel processes.
 
     Args:
         r0_list (list): List containing radius values.
@@ -178,33 +426,12 @@ def save_solutions_visualization(r0_list: list, exp_name: str, wave_length: floa
         nruns (int): The number of runs of the epde_discovery.
         add_legend (bool): Flag to add a legend to the visualization.
         add_training_data (bool): Flag to include training data in the visualization.
+        max_workers (int): The number of rendering processes (default is None, i.e. one process per CPU).
 
     Returns:
         None
     """
 
-    results_dir = get_results_dir(exp_name)
-
-    for r0, i, run in itertools.product(r0_list, range(pop_size), range(nruns)):
-        grid_training = np.genfromtxt(results_dir / 'split exp data' / f'grid_training_{r0}.txt') / wave_length
-        grid_test = np.genfromtxt(results_dir / 'split exp data' / f'grid_test_{r0}.txt') / wave_length
-
-        poynting_vec_training = np.genfromtxt(results_dir / 'split exp data' / f'poynting_vec_training_{r0}.txt')
-        poynting_vec_test = np.genfromtxt(results_dir / 'split exp data' / f'poynting_vec_test_{r0}.txt')
-
-        if not Path(
-            results_dir
-            / 'solutions data'
-            / f'sln_data_training_{r0}_{i}_{run}.txt'
-        ).exists():
-            continue
-
-        pred_solution_training = torch.from_numpy(np.genfromtxt(results_dir / 'solutions data' /
-                                                                f'sln_data_training_{r0}_{i}_{run}.txt'))
-        pred_solution_test = torch.from_numpy(np.genfromtxt(results_dir / 'solutions data' /
-                                                            f'sln_data_test_{r0}_{i}_{run}.txt'))
-        grid_max = np.max(np.concatenate((grid_training, grid_test)))
-        draw_solution(r0, wave_length, i, run, grid_training / grid_max, grid_test / grid_max,
-                      poynting_vec_training, poynting_vec_test,
-                      pred_solution_training, pred_solution_test, results_dir, save_solutions=True,
-                      add_legend=add_legend, add_training_data=add_training_data)
+    render_results_dir(get_results_dir(exp_name), wave_length, r0_list,
+                       units=itertools.product(range(pop_size), range(nruns)), add_legend=add_legend,
+                       add_training_data=add_training_data, max_workers=max_workers)
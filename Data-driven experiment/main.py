@@ -8,13 +8,30 @@ if __name__ == '__main__':
     exp_name = 'optics'  # The name of the experiment
     pop_size = 6
     nruns = 1
+    max_workers = 1  # The number of processes for the sweep over r0_list, 1 means the serial sweep
+    seed_population = False  # Whether to seed the EPDE search with the best equations for the previous radius
+    solve_top_k = None  # The number of equations with the lowest residuals to solve, None means all of them
+    render_mode = 'inline'  # 'inline', 'background' or 'deferred' rendering of the solutions
+    decimation_stride = None  # The stride of the data for the coarse EPDE search, e.g. 4, None means the full grid
+    nn_params = None  # The solver networks, e.g. {'width': 64, 'dtype': 'float64', 'compile': 'script'}
 
-    for r0_fix in r0_list:
-        start_exp(r0_fix, wave_length, exp_name=exp_name, nruns=nruns, solve_equations=True,
-                  pop_size=pop_size, factors_max_number=1, poly_order=4, variable_names=['I'],
-                  max_deriv_order=(2,), equation_terms_max_number=5,
-                  data_fun_pow=1, training_epde_epochs=100, training_tedeous_epochs=10000,
-                  use_smoothing=True)
+    if max_workers == 1:
+        for k, r0_fix in enumerate(r0_list):
+            start_exp(r0_fix, wave_length, exp_name=exp_name, nruns=nruns, solve_equations=True,
+                      pop_size=pop_size, factors_max_number=1, poly_order=4, variable_names=['I'],
+                      max_deriv_order=(2,), equation_terms_max_number=5,
+                      data_fun_pow=1, training_epde_epochs=100, training_tedeous_epochs=10000,
+                      use_smoothing=True, seed_r0=r0_list[k - 1] if seed_population and k else None,
+                      solve_top_k=solve_top_k, render_mode=render_mode, decimation_stride=decimation_stride,
+                      nn_params=nn_params)
+    else:
+        start_parallel_exp(r0_list, wave_length, exp_name=exp_name, nruns=nruns, solve_equations=True,
+                           pop_size=pop_size, factors_max_number=1, poly_order=4, variable_names=['I'],
+                           max_deriv_order=(2,), equation_terms_max_number=5,
+                           data_fun_pow=1, training_epde_epochs=100, training_tedeous_epochs=10000,
+                           use_smoothing=True, solve_top_k=solve_top_k, max_workers=max_workers,
+                           threads_per_worker=1, render_mode=render_mode, decimation_stride=decimation_stride,
+                           nn_params=nn_params)
 
-    save_total_results_csv(r0_list, exp_name, pop_size, nruns)
-    save_total_results_latex_form(r0_list, exp_name, pop_size, nruns)
+    save_total_results(r0_list, exp_name, pop_size, nruns)
+    export_results_text_form(exp_name)
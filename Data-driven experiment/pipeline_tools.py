@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+
+end_of_stream = object()  # the marker put after the last item of a stage
+
+
+def put_item(item_queue: queue.Queue, item, stopped: threading.Event, poll_interval: float = 0.1) -> bool:
+    """
+    Puts the item to the bounded queue, waiting while the queue is full, i.e. while the next stage is behind.
+
+    Args:
+        item_queue: The queue.
+        item: The item.
+        stopped: The event set when the pipeline is stopped by an error.
+        poll_interval: The interval between the checks of the event in seconds (default is 0.1).
+
+    Returns:
+        bool: False if the pipeline has been stopped before the item is put.
+    """
+
+    while not stopped.is_set():
+        try:
+            item_queue.put(item, timeout=poll_interval)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run_stage_worker(stage: dict, input_queue: queue.Queue, output_queue: queue.Queue | None, state: dict,
+                     poll_interval: float = 0.1) -> None:
+    """
+    Processes the items of the stage until the end of the stream: every item is passed to the stage function,
+    and the items it returns are put to the queue of the next stage. The first error stops the pipeline.
+
+    Args:
+        stage: The stage from run_pipeline.
+        input_queue: The queue of the stage.
+        output_queue: The queue of the next stage or None for the last stage.
+        state: The state of the pipeline shared by the workers.
+        poll_interval: The interval between the checks of the stop event in seconds (default is 0.1).
+
+    Returns:
+        None
+    """
+
+    stats = state['stats'][stage['name']]
+    while not state['stopped'].is_set():
+        wait_time = time.perf_counter()
+        try:
+            item = input_queue.get(timeout=poll_interval)
+        except queue.Empty:
+            continue
+        finally:
+            with state['lock']:
+                stats['wait_time'] += time.perf_counter() - wait_time
+        if item is end_of_stream:
+            input_queue.put(end_of_stream)  # for the other workers of the stage
+            return
+        busy_time = time.perf_counter()
+        try:
+            outputs = stage['function'](item)
+        except BaseException as e:
+            state['errors'].append(e)
+            state['stopped'].set()
+            return
+        with state['lock']:
+            stats['busy_time'] += time.perf_counter() - busy_time
+            stats['items'] += 1
+        for output in outputs or ():
+            if output_queue is not None and not put_item(output_queue, output, state['stopped'], poll_interval):
+                return
+
+
+def run_pipeline(source, stages: [dict], queue_size: int = 4) -> dict:
+    """
+    Runs the items through the stages connected by bounded queues. Every stage has its own worker threads,
+    so the stages overlap: an item is passed on as soon as it is processed, and a stage waits only when its
+    queue is empty or the queue of the next stage is full. The stage functions run the heavy work, e.g.
+    in their process pools, and return the items for the next stage.
+
+    Args:
+        source: The iterable of the items of the first stage.
+        stages: The stages as dictionaries with the 'name', the 'function' of an item returning an iterable of
+        the items for the next stage or None, and the number of 'workers'.
+        queue_size: The capacity of the queue of every stage (default is 4).
+
+    Returns:
+        dict: The number of the processed items, the busy time and the time waiting for the items of every
+        stage keyed by the stage name.
+
+    Raises:
+        Exception: The first error raised by a stage function.
+    """
+
+    state = {'stopped': threading.Event(), 'errors': [], 'lock': threading.Lock(),
+             'stats': {stage['name']: {'items': 0, 'busy_time': 0.0, 'wait_time': 0.0} for stage in stages}}
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    workers = []
+    for k, stage in enumerate(stages):
+        output_queue = queues[k + 1] if k + 1 < len(stages) else None
+        workers.append([threading.Thread(target=run_stage_worker, args=(stage, queues[k], output_queue, state),
+                                         name=f'{stage["name"]}-{j}', daemon=True)
+                        for j in range(stage['workers'])])
+    for stage_workers in workers:
+        for worker in stage_workers:
+            worker.start()
+    try:
+        for item in source:
+            if not put_item(queues[0], item, state['stopped']):
+                break
+        put_item(queues[0], end_of_stream, state['stopped'])
+        for k, stage_workers in enumerate(workers):
+            for worker in stage_workers:
+                worker.join()
+            if k + 1 < len(stages):
+                put_item(queues[k + 1], end_of_stream, state['stopped'])
+    except BaseException:
+        state['stopped'].set()  # e.g. on KeyboardInterrupt, the workers finish their current items and exit
+        raise
+    if state['errors']:
+        raise state['errors'][0]
+    return state['stats']
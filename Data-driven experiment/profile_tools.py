@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+trace_state = {'dir': None}  # the results directory to trace to
+trace_local = threading.local()  # the stages being measured by the thread, see get_stage_stack
+trace_file_name = '_trace.jsonl'
+unit_keys = ('r0', 'run', 'i')  # the keys identifying the work unit, inherited by the nested stages
+
+
+def set_trace_dir(results_dir: Path | None) -> None:
+    """
+    Sets the results directory the stages of this process are traced to. The trace is appended to
+    '_trace.jsonl' next to '_Parameters.txt', one JSON line per finished stage, so that several processes
+    can trace to the same experiment.
+
+    Args:
+        results_dir: The results directory of the experiment or None to stop tracing.
+
+    Returns:
+        None
+    """
+
+    trace_state['dir'] = results_dir
+
+
+def get_stage_stack() -> [dict]:
+    """
+    Gets the records of the stages being measured by the current thread, so that the stages running in the
+    threads of a pipeline nest only within their own thread.
+
+    Returns:
+        list: The records of the running stages of the thread, the innermost last.
+    """
+
+    if not hasattr(trace_local, 'stack'):
+        trace_local.stack = []
+    return trace_local.stack
+
+
+def get_peak_rss() -> float | None:
+    """
+    Gets the peak resident set size of the process since its start (ru_maxrss), which never decreases.
+
+    Returns:
+        float | None: The peak RSS in megabytes or None if the platform does not report it.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 2 ** 10
+
+
+@contextmanager
+def stage(name: str, **unit):
+    """
+    Measures the wall time, the CPU time and the memory of a stage of the experiment pipeline and appends
+    the record to the trace. The memory is recorded as the peak RSS of the process since its start
+    ('process_peak_rss_mb') and as the growth of that peak during the stage ('peak_rss_growth_mb'), which is
+    nonzero only for the stages that raised it. The unit keys (r0, run, i) of the enclosing stage of the same
+    thread are inherited.
+
+    Args:
+        name: The name of the stage, e.g. 'epde_discovery'.
+        **unit: The keys of the work unit and other information to record.
+
+    Yields:
+        dict: The record of the stage, which can be extended while the stage runs, e.g. by add_stage_info.
+    """
+
+    stack = get_stage_stack()
+    parent = stack[-1] if stack else {}
+    record = {'stage': name, **{key: parent[key] for key in unit_keys if key in parent}, **unit}
+    stack.append(record)
+    wall_time, cpu_time, peak_rss = time.perf_counter(), time.process_time(), get_peak_rss()
+    try:
+        yield record
+    finally:
+        stack.pop()
+        record['wall_time'] = time.perf_counter() - wall_time
+        record['cpu_time'] = time.process_time() - cpu_time
+        record['process_peak_rss_mb'] = get_peak_rss()
+        record['peak_rss_growth_mb'] = None if peak_rss is None else record['process_peak_rss_mb'] - peak_rss
+        record['pid'] = os.getpid()
+        write_trace_record(record)
+
+
+def add_stage_info(**info) -> None:
+    """
+    Adds the information, e.g. the number of epochs, to the record of the innermost running stage of the thread.
+
+    Args:
+        **info: The information to record.
+
+    Returns:
+        None
+    """
+
+    stack = get_stage_stack()
+    if stack:
+        stack[-1].update(info)
+
+
+def write_trace_record(record: dict) -> None:
+    if trace_state['dir'] is None:
+        return
+    with (Path(trace_state['dir']) / trace_file_name).open(mode='a') as trace_file:
+        trace_file.write(json.dumps(record, default=float) + '\n')
+
+
+def read_trace(results_dir: Path) -> [dict]:
+    """
+    Reads the trace of the experiment.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        list: The records of the finished stages.
+    """
+
+    trace_file_path = results_dir / trace_file_name
+    if not trace_file_path.exists():
+        return []
+    with trace_file_path.open() as trace_file:
+        return [json.loads(line) for line in trace_file if line.endswith('\n')]
+
+
+def save_trace_summary(results_dir: Path) -> None:
+    """
+    Saves the trace of the experiment as '_trace.csv' and the per-stage totals as the '_trace_summary.txt'
+    table, which is printed as well.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        None
+    """
+
+    records = read_trace(results_dir)
+    if not records:
+        return
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    with (results_dir / '_trace.csv').open(mode='w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(records)
+
+    summary = {}
+    for record in records:
+        totals = summary.setdefault(record['stage'], {'count': 0, 'wall_time': 0.0, 'cpu_time': 0.0,
+                                                      'peak_rss_growth_mb': 0.0, 'epochs': 0})
+        totals['count'] += 1
+        totals['wall_time'] += record['wall_time']
+        totals['cpu_time'] += record['cpu_time']
+        totals['peak_rss_growth_mb'] = max(totals['peak_rss_growth_mb'], record.get('peak_rss_growth_mb') or 0.0)
+        totals['epochs'] += record.get('epochs', 0)
+    lines = [f'{"stage":<24}{"count":>8}{"wall, s":>12}{"mean wall, s":>14}{"cpu, s":>12}{"RSS growth, MB":>16}'
+             f'{"epochs":>10}{"s/epoch":>12}']
+    for name, totals in sorted(summary.items(), key=lambda item: -item[1]['wall_time']):
+        per_epoch = f'{totals["wall_time"] / totals["epochs"]:.2e}' if totals['epochs'] else '-'
+        lines.append(f'{name:<24}{totals["count"]:>8}{totals["wall_time"]:>12.2f}'
+                     f'{totals["wall_time"] / totals["count"]:>14.3f}{totals["cpu_time"]:>12.2f}'
+                     f'{totals["peak_rss_growth_mb"]:>16.1f}{totals["epochs"]:>10}{per_epoch:>12}')
+    table = '\n'.join(lines)
+    print(table)
+    (results_dir / '_trace_summary.txt').write_text(table + '\n')
@@ -0,0 +1,312 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+from store_tools import write_atomically
+
+queue_states = ('pending', 'leased', 'done', 'failed')
+
+
+def get_queue_dir(results_dir: Path) -> Path:
+    """
+    Gets the directory of the work queue of the experiment. Every work unit is a JSON file in one of the
+    subdirectories 'pending', 'leased', 'done' and 'failed', and moves between them by renaming, which is
+    atomic on a shared filesystem, so any number of workers on any nodes can share the queue without a server.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        Path: The path of the queue directory.
+    """
+
+    queue_dir = results_dir / 'queue'
+    for state in queue_states:
+        (queue_dir / state).mkdir(parents=True, exist_ok=True)
+    return queue_dir
+
+
+def get_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def put_unit(queue_dir: Path, unit_id: str, payload: dict) -> bool:
+    """
+    Adds the work unit to the queue unless a unit with the same ID is already there in any state.
+
+    Args:
+        queue_dir: The queue directory.
+        unit_id: The ID of the unit, e.g. 'discovery_0.1_0'.
+        payload: The description of the work.
+
+    Returns:
+        bool: True if the unit is added.
+    """
+
+    if any((queue_dir / state / f'{unit_id}.json').exists() for state in queue_states):
+        return False
+    write_atomically(queue_dir / 'pending' / f'{unit_id}.json',
+                     lambda file_path: file_path.write_text(json.dumps({'payload': payload})))
+    return True
+
+
+def claim_unit(queue_dir: Path, worker_id: str) -> tuple | None:
+    """
+    Claims a pending work unit: the unit file is renamed into 'leased', and the worker whose rename succeeds
+    owns the lease.
+
+    Args:
+        queue_dir: The queue directory.
+        worker_id: The ID of the claiming worker.
+
+    Returns:
+        tuple | None: The ID and the payload of the claimed unit or None if there are no pending units.
+    """
+
+    for unit_file_path in sorted((queue_dir / 'pending').glob('*.json')):
+        leased_file_path = queue_dir / 'leased' / unit_file_path.name
+        try:
+            os.rename(unit_file_path, leased_file_path)
+            os.utime(leased_file_path)
+        except FileNotFoundError:
+            continue  # claimed by another worker
+        unit = read_unit(leased_file_path)
+        if unit is None:
+            continue  # re-queued meanwhile
+        unit.update({'worker': worker_id, 'leased_at': time.time()})
+        write_atomically(leased_file_path, lambda file_path: file_path.write_text(json.dumps(unit)))
+        return unit_file_path.stem, unit['payload']
+    return None
+
+
+def read_unit(unit_file_path: Path) -> dict | None:
+    try:
+        return json.loads(unit_file_path.read_text())
+    except FileNotFoundError:
+        return None
+
+
+def heartbeat_unit(queue_dir: Path, unit_id: str, worker_id: str) -> bool:
+    """
+    Extends the lease of the unit held by the worker: the modification time of the leased unit file is the time
+    of the last heartbeat.
+
+    Args:
+        queue_dir: The queue directory.
+        unit_id: The ID of the unit.
+        worker_id: The ID of the worker holding the lease.
+
+    Returns:
+        bool: False if the lease has expired, i.e. the unit has been re-queued and possibly claimed by another
+        worker, whose lease is not extended.
+    """
+
+    leased_file_path = queue_dir / 'leased' / f'{unit_id}.json'
+    unit = read_unit(leased_file_path)
+    if unit is None or unit.get('worker') != worker_id:
+        return False
+    try:
+        os.utime(leased_file_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+@contextmanager
+def unit_lease(queue_dir: Path, unit_id: str, worker_id: str, heartbeat_interval: float):
+    """
+    Keeps the lease of the unit alive by a background heartbeat while the unit is processed.
+
+    Args:
+        queue_dir: The queue directory.
+        unit_id: The ID of the unit.
+        worker_id: The ID of the worker holding the lease.
+        heartbeat_interval: The interval between the heartbeats in seconds.
+    """
+
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(heartbeat_interval):
+            if not heartbeat_unit(queue_dir, unit_id, worker_id):
+                print(f'{worker_id}: the lease of {unit_id} has expired')
+                break
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def finish_unit(queue_dir: Path, unit_id: str, worker_id: str, error: str = None, max_attempts: int = 1) -> bool:
+    """
+    Moves the unit leased by the worker to 'done' or, if it has failed, back to 'pending' to be retried until it
+    has failed max_attempts times, and then to 'failed'. The errors of all attempts are kept in the unit file.
+
+    Args:
+        queue_dir: The queue directory.
+        unit_id: The ID of the unit.
+        worker_id: The ID of the worker holding the lease.
+        error: The description of the failure (default is None, i.e. the unit is done).
+        max_attempts: The number of the failures after which the unit is not retried (default is 1).
+
+    Returns:
+        bool: False if the lease has expired, i.e. the unit has been re-queued meanwhile, and the unit is left
+        to its new owner.
+    """
+
+    leased_file_path = queue_dir / 'leased' / f'{unit_id}.json'
+    unit = read_unit(leased_file_path)
+    if unit is None or unit.get('worker') != worker_id:
+        return False
+    state = 'done'
+    if error is not None:
+        unit['errors'] = unit.get('errors', []) + [error]
+        state = 'pending' if len(unit['errors']) < max_attempts else 'failed'
+    unit.update({'finished_at': time.time(), 'worker': None})
+    try:
+        write_atomically(leased_file_path, lambda file_path: file_path.write_text(json.dumps(unit)))
+        os.rename(leased_file_path, queue_dir / state / leased_file_path.name)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def requeue_expired_units(queue_dir: Path, lease_timeout: float) -> int:
+    """
+    Moves the leased units without a heartbeat for lease_timeout seconds back to 'pending', e.g. the units of
+    the crashed workers. The worker is removed from the unit first, so the late heartbeats and the late finish
+    of the expired worker do not touch the unit once it is claimed again.
+
+    Args:
+        queue_dir: The queue directory.
+        lease_timeout: The time without a heartbeat after which the lease expires, in seconds.
+
+    Returns:
+        int: The number of re-queued units.
+    """
+
+    requeued = 0
+    for leased_file_path in (queue_dir / 'leased').glob('*.json'):
+        try:
+            if time.time() - leased_file_path.stat().st_mtime > lease_timeout:
+                unit = read_unit(leased_file_path)
+                if unit is None:
+                    continue
+                unit['worker'] = None
+                write_atomically(leased_file_path, lambda file_path: file_path.write_text(json.dumps(unit)))
+                os.rename(leased_file_path, queue_dir / 'pending' / leased_file_path.name)
+                requeued += 1
+        except FileNotFoundError:
+            continue  # finished or re-queued by another worker
+    return requeued
+
+
+def requeue_failed_units(queue_dir: Path) -> int:
+    """
+    Moves the failed units back to 'pending' with a fresh count of attempts, e.g. after the cause of the
+    failures has been fixed.
+
+    Args:
+        queue_dir: The queue directory.
+
+    Returns:
+        int: The number of re-queued units.
+    """
+
+    requeued = 0
+    for failed_file_path in (queue_dir / 'failed').glob('*.json'):
+        unit = read_unit(failed_file_path)
+        if unit is None:
+            continue
+        unit['failed_errors'] = unit.get('failed_errors', []) + unit.pop('errors', [])
+        write_atomically(failed_file_path, lambda file_path: file_path.write_text(json.dumps(unit)))
+        try:
+            os.rename(failed_file_path, queue_dir / 'pending' / failed_file_path.name)
+            requeued += 1
+        except FileNotFoundError:
+            continue
+    return requeued
+
+
+def get_failed_units(queue_dir: Path) -> dict:
+    """
+    Reports the failed units of the queue.
+
+    Args:
+        queue_dir: The queue directory.
+
+    Returns:
+        dict: The last lines of the last errors keyed by the unit IDs.
+    """
+
+    failed = {}
+    for failed_file_path in sorted((queue_dir / 'failed').glob('*.json')):
+        unit = read_unit(failed_file_path)
+        if unit is not None:
+            lines = (unit.get('errors') or [''])[-1].strip().splitlines()
+            failed[failed_file_path.stem] = lines[-1] if lines else ''
+    return failed
+
+
+def get_queue_status(queue_dir: Path) -> dict:
+    """
+    Counts the units of the queue in every state.
+
+    Args:
+        queue_dir: The queue directory.
+
+    Returns:
+        dict: The numbers of the units keyed by the state.
+    """
+
+    return {state: len(list((queue_dir / state).glob('*.json'))) for state in queue_states}
+
+
+def run_queue_worker(queue_dir: Path, process_unit, lease_timeout: float = 3600, heartbeat_interval: float = 60,
+                     poll_interval: float = 30, worker_id: str = None, max_attempts: int = 3) -> None:
+    """
+    Processes the units of the queue until there are neither pending nor leased units. The units that raise
+    are retried with the traceback recorded and are moved to 'failed' after max_attempts failures.
+
+    Args:
+        queue_dir: The queue directory.
+        process_unit: The function of the unit ID and the payload processing the unit.
+        lease_timeout: The time without a heartbeat after which a lease expires, in seconds (default is 3600).
+        heartbeat_interval: The interval between the heartbeats, in seconds (default is 60).
+        poll_interval: The interval between the checks for new units while other workers hold the leases,
+        in seconds (default is 30).
+        worker_id: The ID of the worker (default is None, i.e. the host name and the process ID).
+        max_attempts: The number of the failures of a unit after which it is not retried (default is 3).
+
+    Returns:
+        None
+    """
+
+    worker_id = worker_id or get_worker_id()
+    while True:
+        requeue_expired_units(queue_dir, lease_timeout)
+        claimed = claim_unit(queue_dir, worker_id)
+        if claimed is None:
+            status = get_queue_status(queue_dir)
+            if status['pending'] == 0 and status['leased'] == 0:
+                break
+            time.sleep(poll_interval)
+            continue
+        unit_id, payload = claimed
+        print(f'{worker_id}: {unit_id}')
+        try:
+            with unit_lease(queue_dir, unit_id, worker_id, heartbeat_interval):
+                process_unit(unit_id, payload)
+        except Exception:
+            finish_unit(queue_dir, unit_id, worker_id, traceback.format_exc(), max_attempts)
+        else:
+            finish_unit(queue_dir, unit_id, worker_id)
@@ -0,0 +1,334 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.axes import Axes
+
+from store_tools import load_result_array, list_result_names
+
+render_modes = ('inline', 'background', 'deferred')
+render_state = {'mode': 'inline', 'max_workers': None, 'executor': None, 'futures': []}
+figure_templates = {}  # prepared figures keyed by (r0, wave_length, grid_max), reused for every solution
+
+
+def get_inserted_ax(ax: Axes, r0: int | float, grid_max: int | float) -> Axes:
+    x1, x2, y1, y2 = 0.0001 * grid_max, 0.03 * grid_max, -1.05, 0.05
+    x_right_border = 0.0301 * grid_max
+    if 0.3 < r0 <= 0.5:
+        x2 = 0.07 * grid_max
+        x_right_border = 0.0701 * grid_max
+    else:
+        x2 = 0.15 * grid_max
+        x_right_border = 0.1501 * grid_max
+
+    axins = ax.inset_axes((0.2 * grid_max, -0.6, 0.35 * grid_max, 0.4),
+                          xlim=(x1, x2), ylim=(y1, y2), transform=ax.transData, xticklabels=[],
+                          yticklabels=[])
+    axins.set_xticks(np.arange(0, x_right_border, 0.01 * np.ceil(grid_max)))
+    return axins
+
+
+def set_inserted_ax(axins: Axes, grid_training: np.ndarray, grid_test: np.ndarray,
+                    poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
+                    pred_solution_training: np.ndarray, add_training_data: bool = False,
+                    start_y: int | float = -1, stop_y: int | float = 0.1, step_y: int | float = 0.2) -> list:
+    axins.set_yticks(np.arange(start_y, stop_y, step_y))
+    axins.grid(True)
+    artists = []
+    if add_training_data:
+        artists += axins.plot(grid_training, poynting_vec_training, '+', label='Training data')
+    artists += axins.plot(grid_test, poynting_vec_test, '.', color='black')
+    artists += axins.plot(grid_training, pred_solution_training, color='r')
+    return artists
+
+
+def set_main_ax_template(ax: Axes, axins: Axes, grid_max: int | float) -> None:
+    ax.indicate_inset_zoom(axins, edgecolor="black")
+    ax.set_xticks(np.arange(0, 1.1 * grid_max, 0.1 * np.ceil(grid_max)))
+    ax.set_yticks(np.arange(-1., 0.5, 0.2))
+    ax.grid(True)
+
+
+def set_main_ax(ax: Axes, grid_training: np.ndarray, grid_test: np.ndarray, poynting_vec_training: np.ndarray,
+                poynting_vec_test: np.ndarray, pred_solution_training: np.ndarray, rmse: float,
+                add_training_data: bool = False) -> list:
+    grid_max = np.max(np.concatenate((grid_training, grid_test)))
+    artists = []
+    if add_training_data:
+        artists += ax.plot(grid_training, poynting_vec_training, '+', label='Training data')
+    artists += ax.plot(grid_test, poynting_vec_test, '.', color='black', label='Test data')
+    artists += ax.plot(grid_training, pred_solution_training, color='r',
+                       label='Solution of the discovered DE')
+    artists.append(ax.text(0.7 * grid_max, -0.8,
+                           f'RMSE = {rmse:.2e}', fontsize=10))
+    return artists
+
+
+def set_plot(ax: Axes, r0: int | float, wave_length: int | float) -> None:
+    ax.set_title(fr"$I_y(H), r_0 = {r0}\mu m$, $\lambda = {wave_length} \mu m$")
+    ax.set_xlabel(r'$\frac{H}{\lambda} \cdot 10^{-2}$')
+    ax.set_ylabel(r'$I_y(H)$')
+
+
+def get_figure_template(r0: int | float, wave_length: int | float, grid_max: int | float,
+                        reuse: bool = True) -> tuple:
+    """
+    Gets the figure with everything that does not depend on the solution already drawn: the inset axis, its
+    zoom indication, the ticks, the grids and the labels. The figure is prepared once per radius value and
+    reused for every solution drawn in the process.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        grid_max: The maximum value of the grid.
+        reuse: The flag whether to take the figure from the templates (default is True).
+
+    Returns:
+        tuple: The figure, its main axis and the inset axis.
+    """
+
+    key = (r0, wave_length, float(grid_max))
+    if reuse and key in figure_templates:
+        return figure_templates[key]
+    fig = plt.figure(dpi=200)
+    ax = fig.add_subplot()
+    axins = get_inserted_ax(ax, r0, grid_max)
+    set_main_ax_template(ax, axins, grid_max)
+    set_plot(ax, r0, wave_length)
+    if reuse:
+        figure_templates[key] = (fig, ax, axins)
+    return fig, ax, axins
+
+
+def render_solution(r0: int | float, wave_length: int | float, grid_training: np.ndarray, grid_test: np.ndarray,
+                    poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
+                    pred_solution_training: np.ndarray, pred_solution_test: np.ndarray, img_filename: Path | None,
+                    add_legend: bool = False, add_training_data: bool = False) -> None:
+    """
+    Draws the solution of the equation on the figure template of the radius value and saves the image. The
+    drawn solution is removed from the template afterwards.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        grid_training: Training grid data.
+        grid_test: Test grid data.
+        poynting_vec_training: Training Poynting vector data.
+        poynting_vec_test: Test Poynting vector data.
+        pred_solution_training: Predicted solution for the training grid.
+        pred_solution_test: Predicted solution for the test grid.
+        img_filename: The path of the image or None to leave a new figure open instead of saving it.
+        add_legend: The flag whether to add a legend (default is False).
+        add_training_data: The flag whether to draw the training data (default is False).
+
+    Returns:
+        None
+    """
+
+    grid_max = np.max(np.concatenate((grid_training, grid_test)))
+    fig, ax, axins = get_figure_template(r0, wave_length, grid_max, reuse=img_filename is not None)
+    rmse = np.sqrt(np.mean((np.asarray(poynting_vec_test) - np.asarray(pred_solution_test)) ** 2))
+    artists = set_inserted_ax(axins, grid_training, grid_test, poynting_vec_training, poynting_vec_test,
+                              pred_solution_training)
+    artists += set_main_ax(ax, grid_training, grid_test, poynting_vec_training, poynting_vec_test,
+                           pred_solution_training, rmse, add_training_data)
+    if add_legend:
+        artists.append(ax.legend(loc=4))
+    if img_filename is None:
+        return
+    ax.relim()
+    ax.autoscale_view()
+    fig.savefig(img_filename)
+    for artist in artists:
+        artist.remove()
+
+
+def get_solution_img_filename(results_dir: Path, r0: int | float, i: int, run: int) -> Path:
+    sln_img_dir = results_dir / 'solutions visualization'
+    sln_img_dir.mkdir(exist_ok=True)
+    return sln_img_dir / fr'sln_{r0}_{i}_{run}.png'
+
+
+def init_render_worker() -> None:
+    """
+    Prepares a process pool worker for rendering: the non-interactive Agg backend is selected before any
+    figure is created.
+
+    Returns:
+        None
+    """
+
+    mpl.use('Agg')
+
+
+def start_rendering(mode: str = 'inline', max_workers: int = None) -> None:
+    """
+    Sets the way the solutions are rendered by submit_solution_plot in this process: 'inline' draws them
+    immediately, 'background' queues them to a pool of processes, so the next solve does not wait for the
+    plot, and 'deferred' only records the data, the images are rendered by render_results_dir at the end.
+
+    Args:
+        mode: The rendering mode (default is 'inline').
+        max_workers: The number of rendering processes for the 'background' mode (default is None, i.e. one
+        process per CPU).
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the rendering mode is unknown.
+    """
+
+    if mode not in render_modes:
+        raise ValueError(f'Unknown rendering mode: {mode}')
+    finish_rendering()
+    render_state['mode'] = mode
+    render_state['max_workers'] = max_workers
+
+
+def get_render_executor() -> ProcessPoolExecutor:
+    if render_state['executor'] is None:
+        render_state['executor'] = ProcessPoolExecutor(max_workers=render_state['max_workers'],
+                                                       mp_context=multiprocessing.get_context('spawn'),
+                                                       initializer=init_render_worker)
+    return render_state['executor']
+
+
+def submit_solution_plot(r0: int | float, wave_length: int | float, i: int, run: int, grid_training: np.ndarray,
+                         grid_test: np.ndarray, poynting_vec_training: np.ndarray, poynting_vec_test: np.ndarray,
+                         pred_solution_training: np.ndarray, pred_solution_test: np.ndarray, results_dir: Path,
+                         add_legend: bool = False, add_training_data: bool = False) -> None:
+    """
+    Renders the image of the solution according to the rendering mode set by start_rendering.
+
+    Args:
+        r0: The radius of the dielectric inclusions in 2D supercell model of the inhomogeneous layer
+        value in micrometers.
+        wave_length: The wavelength of the incident wave.
+        i: Index value of the equation in the resulting population.
+        run: The run number for this value of r0.
+        grid_training: Training grid data.
+        grid_test: Test grid data.
+        poynting_vec_training: Training Poynting vector data.
+        poynting_vec_test: Test Poynting vector data.
+        pred_solution_training: Predicted solution for the training grid.
+        pred_solution_test: Predicted solution for the test grid.
+        results_dir: Directory to save results.
+        add_legend: The flag whether to add a legend (default is False).
+        add_training_data: The flag whether to draw the training data (default is False).
+
+    Returns:
+        None
+    """
+
+    if render_state['mode'] == 'deferred':
+        return
+    args = (r0, wave_length, grid_training, grid_test, poynting_vec_training, poynting_vec_test,
+            pred_solution_training, pred_solution_test, get_solution_img_filename(results_dir, r0, i, run),
+            add_legend, add_training_data)
+    if render_state['mode'] == 'inline':
+        render_solution(*args)
+    else:
+        futures = []
+        for future in render_state['futures']:
+            if future.done():
+                future.result()  # reraises the error of a failed rendering
+            else:
+                futures.append(future)
+        futures.append(get_render_executor().submit(render_solution, *args))
+        render_state['futures'] = futures
+
+
+def finish_rendering() -> None:
+    """
+    Waits until all queued images are rendered and stops the rendering processes.
+
+    Returns:
+        None
+    """
+
+    futures, render_state['futures'] = render_state['futures'], []
+    for future in futures:
+        future.result()
+    if render_state['executor'] is not None:
+        render_state['executor'].shutdown()
+        render_state['executor'] = None
+
+
+def render_saved_solutions(results_dir: Path, wave_length: int | float, r0: int | float, units: [(int, int)],
+                           add_legend: bool = False, add_training_data: bool = False) -> None:
+    """
+    Renders the saved solutions for one radius value on a single figure template.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        wave_length: The wavelength of the incident wave.
+        r0: The radius value.
+        units: Pairs (index of the equation in the population, run number) to render.
+        add_legend: The flag whether to add a legend (default is False).
+        add_training_data: The flag whether to draw the training data (default is False).
+
+    Returns:
+        None
+    """
+
+    grid_training = load_result_array(results_dir, f'split exp data/grid_training_{r0}') / wave_length
+    grid_test = load_result_array(results_dir, f'split exp data/grid_test_{r0}') / wave_length
+    grid_max = np.max(np.concatenate((grid_training, grid_test)))
+    poynting_vec_training = load_result_array(results_dir, f'split exp data/poynting_vec_training_{r0}')
+    poynting_vec_test = load_result_array(results_dir, f'split exp data/poynting_vec_test_{r0}')
+    for i, run in units:
+        sln_data_training = load_result_array(results_dir, f'solutions data/sln_data_training_{r0}_{i}_{run}')
+        sln_data_test = load_result_array(results_dir, f'solutions data/sln_data_test_{r0}_{i}_{run}')
+        if sln_data_training is None or sln_data_test is None:
+            continue
+        render_solution(r0, wave_length, grid_training / grid_max, grid_test / grid_max, poynting_vec_training,
+                        poynting_vec_test, sln_data_training, sln_data_test,
+                        get_solution_img_filename(results_dir, r0, i, run), add_legend, add_training_data)
+
+
+def render_results_dir(results_dir: Path, wave_length: int | float, r0_list: [int | float] = None,
+                       units: [(int, int)] = None, add_legend: bool = False, add_training_data: bool = False,
+                       max_workers: int = None) -> None:
+    """
+    Renders the saved solutions of the experiment in parallel, one task per radius value, so that every
+    task prepares its figure template once.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        wave_length: The wavelength of the incident wave.
+        r0_list: The radius values to render (default is None, i.e. all saved ones).
+        units: Pairs (index of the equation in the population, run number) to render (default is None,
+        i.e. all saved ones).
+        add_legend: The flag whether to add a legend (default is False).
+        add_training_data: The flag whether to draw the training data (default is False).
+        max_workers: The number of rendering processes (default is None, i.e. one process per CPU).
+
+    Returns:
+        None
+    """
+
+    units = None if units is None else set(units)
+    saved_units = {}
+    for name in list_result_names(results_dir, 'solutions data/sln_data_training_'):
+        r0, i, run = name.rsplit('_', 3)[1:]
+        saved_units.setdefault(float(r0) if '.' in r0 else int(r0), set()).add((int(i), int(run)))
+    tasks = []
+    for r0 in sorted(saved_units) if r0_list is None else r0_list:
+        r0_units = saved_units.get(r0, set())
+        if units is not None:
+            r0_units &= units
+        if r0_units:
+            tasks.append((results_dir, wave_length, r0, sorted(r0_units), add_legend, add_training_data))
+    if not tasks:
+        return
+    max_workers = min(len(tasks), max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_render_worker) as executor:
+        for future in [executor.submit(render_saved_solutions, *task) for task in tasks]:
+            future.result()
@@ -0,0 +1,218 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+from results_analysis_tools import get_results_dir, aggregate_results
+from store_tools import export_legacy_results, list_result_names
+from queue_tools import get_queue_status, get_failed_units
+from profile_tools import stage, set_trace_dir
+
+
+def get_results_df(r0_list: [int | float], exp_name: str, pop_size: int,
+                   nruns: int) -> pd.DataFrame:
+    """
+    Creates a pandas DataFrame containing results from equations for a list of initial values.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+    Returns:
+        Pandas DataFrame with the results from the equations.
+    """
+
+    eqn_list = []
+    for r0_fix in r0_list:
+        eqn_list.extend(
+            f'eqn_{r0_fix}_{i}_{j}.txt'
+            for i, j in itertools.product(range(pop_size), range(nruns))
+        )
+    read_eq_dict = aggregate_results(exp_name, eqn_list)
+    results_df = pd.DataFrame(read_eq_dict).transpose()
+    coefs_columns = results_df.columns.drop('rmse', errors='ignore')
+    results_df[coefs_columns] = results_df[coefs_columns].fillna(0)
+    return results_df
+
+
+def get_equation_latex_form(results_df: pd.DataFrame, eq_name: str) -> str:
+    """
+    Generates the LaTeX form of an equation based on the coefficients and terms from the results DataFrame.
+
+    Args:
+        results_df: Pandas DataFrame containing the results.
+        eq_name: Name of the equation.
+
+    Returns:
+        LaTeX formatted string representing the equation.
+    """
+
+    rmse = results_df['rmse'][eq_name]
+    results_df = results_df.drop('rmse', axis=1)
+    coefs = np.array(results_df.loc[eq_name])
+    terms = [fr'{coefs[i]:.3f} \cdot ' + results_df.columns[i].replace('C', '') for i in range(len(coefs)) if
+             coefs[i] not in [0.0] and results_df.columns[i] != 'dI/dH']
+    terms[0] = f"$${terms[0]}"
+    eq_name = eq_name.replace('.txt', '')
+    params = eq_name.split('_')
+    params = {"$r_0$ = ": params[1], "index = ": params[2], "run = ": params[3], "rmse = ": f'{rmse:.3f}'}
+    res = "$r_0$ = " + params["$r_0$ = "] + ", index = " + params["index = "] + ", run = " + params[
+        "run = "] + ", rmse = " + params["rmse = "] + ": " + " + ".join(terms) + " = dI/dH$$" + "\n\n"
+    res = res.replace('+ -', '- ')
+    res = res.replace('dI/dH', r'\frac{dI}{dH}')
+    res = res.replace(r'\cdot  ', '')
+    return res
+
+
+def get_total_results_df(r0_list: [int | float], exp_name: str, pop_size: int,
+                         nruns: int) -> pd.DataFrame:
+    """
+    Creates a pandas DataFrame with the total results in the column order of the saved tables.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+
+    Returns:
+        Pandas DataFrame with the total results.
+    """
+
+    results_df = get_results_df(r0_list, exp_name, pop_size, nruns)
+    return results_df[['C', 'H', 'I', 'I^2', 'I^3', 'I^4', 'd^2I/dH^2', 'dI/dH', 'rmse']]
+
+
+def write_total_results_csv(results_df: pd.DataFrame, exp_name: str) -> None:
+    """
+    Writes the total results DataFrame to a CSV file for a given experiment.
+
+    Args:
+        results_df: Pandas DataFrame with the total results.
+        exp_name: Name of the experiment.
+
+    Returns:
+        None
+    """
+
+    results_dir_name = get_results_dir(exp_name)
+    results_df.to_csv(results_dir_name / fr'total_results_{exp_name}.csv')
+
+
+def write_total_results_latex_form(results_df: pd.DataFrame, exp_name: str) -> None:
+    """
+    Writes the LaTeX form of total results equations to a Markdown file for a given experiment.
+
+    Args:
+        results_df: Pandas DataFrame with the total results.
+        exp_name: Name of the experiment.
+
+    Returns:
+        None
+    """
+
+    results_dir_name = get_results_dir(exp_name)
+
+    total_results_file_path = results_dir_name / f'total_results_{exp_name}.md'
+
+    with total_results_file_path.open(mode='w') as equations_file:
+        for eq_name in results_df.index:
+            equation_str = get_equation_latex_form(results_df, eq_name)
+            equations_file.write(equation_str)
+
+
+def save_total_results_csv(r0_list: [int | float], exp_name: str, pop_size: int,
+                           nruns: int) -> None:
+    """
+    Saves the total results DataFrame to a CSV file for a given experiment.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+
+    Returns:
+        None
+    """
+
+    write_total_results_csv(get_total_results_df(r0_list, exp_name, pop_size, nruns), exp_name)
+
+
+def save_total_results_latex_form(r0_list: [int | float], exp_name: str, pop_size: int,
+                                  nruns: int) -> None:
+    """
+    Saves the LaTeX form of total results equations to a Markdown file for a given experiment.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+    Returns:
+        None
+    """
+
+    write_total_results_latex_form(get_total_results_df(r0_list, exp_name, pop_size, nruns), exp_name)
+
+
+def save_total_results(r0_list: [int | float], exp_name: str, pop_size: int, nruns: int) -> None:
+    """
+    Saves the total results of a given experiment both to the CSV file and in the LaTeX form to the Markdown
+    file, building the results DataFrame once.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+
+    Returns:
+        None
+    """
+
+    set_trace_dir(get_results_dir(exp_name))
+    with stage('save_total_results'):
+        results_df = get_total_results_df(r0_list, exp_name, pop_size, nruns)
+        write_total_results_csv(results_df, exp_name)
+        write_total_results_latex_form(results_df, exp_name)
+
+
+def export_results_text_form(exp_name: str, compact: bool = False) -> None:
+    """
+    Exports the results store of the experiment to the per-file text layout of the thesis tooling.
+
+    Args:
+        exp_name (str): Name of the experiment.
+        compact (bool): Whether to compact the store before the export, only when no worker runs the
+        experiment (default is False).
+
+    Returns:
+        None
+    """
+
+    export_legacy_results(get_results_dir(exp_name), compact=compact)
+
+
+def get_exp_status(exp_name: str) -> dict:
+    """
+    Counts the completed work units of the experiment recorded in the run manifest and the units of its work
+    queue, if any.
+
+    Args:
+        exp_name (str): Name of the experiment.
+
+    Returns:
+        dict: The numbers of the completed splits, discoveries, solutions and runs and, for a queued experiment,
+        the numbers of the queue units in every state and the errors of the failed units.
+    """
+
+    results_dir = get_results_dir(exp_name)
+    status = dict.fromkeys(('split', 'discovery', 'solution', 'run'), 0)
+    for name in list_result_names(results_dir, 'manifest/'):
+        kind = name.removeprefix('manifest/').split('_')[0]
+        status[kind] = status.get(kind, 0) + 1
+    if (results_dir / 'queue').exists():
+        status['queue'] = get_queue_status(results_dir / 'queue')
+        status['failed units'] = get_failed_units(results_dir / 'queue')
+    return status
@@ -1,12 +1,15 @@
+import json
 import numpy as np
 import re
 from pathlib import Path
 
+from store_tools import (load_result_array, load_result_text, get_result_version, list_result_names,
+                         write_atomically)
+
 
 def get_results_dir(exp_name: str) -> Path:
     results_dir = Path.cwd() / 'results' / f'results_{exp_name}'
-    if not (Path(results_dir).exists()):
-        Path(results_dir).mkdir()
+    results_dir.mkdir(parents=True, exist_ok=True)
     return results_dir
 
 
@@ -65,20 +68,34 @@ def get_rmse(exp_name: str, r0: int | float, i: int, run: int) -> float:
         run: The run number for this value of r0.
 
     Returns:
-        The calculated RMSE as a float.
+        The calculated RMSE as a float, NaN if the equation has not been solved.
     """
 
     results_dir_name = get_results_dir(exp_name)
 
-    sln_data_file_path = results_dir_name / 'solutions data' / f'sln_data_test_{r0}_{i}_{run}.txt'
-    sln = np.genfromtxt(sln_data_file_path, delimiter=',')
-
-    test_data_file_path = results_dir_name / 'split exp data' / f'poynting_vec_test_{r0}.txt'
-    test_data = np.genfromtxt(test_data_file_path, delimiter=',')
+    sln = load_result_array(results_dir_name, f'solutions data/sln_data_test_{r0}_{i}_{run}')
+    test_data = load_result_array(results_dir_name, f'split exp data/poynting_vec_test_{r0}')
+    if sln is None or test_data is None:
+        return np.nan
 
     return np.sqrt(np.mean((sln - test_data) ** 2))
 
 
+def get_eqn_params(eqn_id: str) -> (int | float, int, int):
+    """
+    Gets the parameters of the equation from its ID.
+
+    Args:
+        eqn_id: The ID of the equation file, e.g. 'eqn_0.1_0_0.txt'.
+
+    Returns:
+        tuple: The radius value, the index of the equation in the population and the run number.
+    """
+
+    r0, i, run = eqn_id.removesuffix('.txt').split('_')[1:]
+    return float(r0) if '.' in r0 else int(r0), int(i), int(run)
+
+
 def read_eqn(exp_name: str, eqn_id: str) -> dict | None:
     """
     Reads and parses an equation from a file.
@@ -95,19 +112,98 @@ def read_eqn(exp_name: str, eqn_id: str) -> dict | None:
         None
     """
     results_dir_name = get_results_dir(exp_name)
-    eqn_file_path = results_dir_name / 'text equations' / eqn_id
-    if not eqn_file_path.exists():
+    text_eq = load_result_text(results_dir_name, f'text equations/{eqn_id.removesuffix(".txt")}')
+    if text_eq is None:
         return None
 
-    with eqn_file_path.open() as file:
-        lines = file.readlines()
-        eq_terms = get_eq_terms_from_string(lines[0])
+    eq_terms = get_eq_terms_from_string(text_eq.split('\n')[0])
     coefs = get_coefs_from_terms(eq_terms)
 
-    r0, i, run = eqn_id.split('_')[1:]
-    r0 = float(r0) if '.' in r0 else int(r0)
-    i = int(i)
-    run = int(run[:len(run) - 4])
+    r0, i, run = get_eqn_params(eqn_id)
 
     coefs['rmse'] = get_rmse(exp_name, r0, i, run)
     return coefs
+
+
+def aggregate_results(exp_name: str, eqn_ids: [str]) -> dict:
+    """
+    Reads and parses the equations together with their RMSE values in a single pass. Every test data file is
+    read once per radius value, the RMSE values of all solutions for the radius are computed at once, and the
+    parsed equations are kept in the on-disk index, so that only new or changed results are processed again.
+
+    Args:
+        exp_name: The experiment name.
+        eqn_ids: The IDs of the equation files to read.
+
+    Returns:
+        dict: The parsed equation terms and RMSE values keyed by the IDs of the existing equation files.
+    """
+
+    results_dir_name = get_results_dir(exp_name)
+    index_file_path = results_dir_name / '_aggregated_results.json'
+    index = json.loads(index_file_path.read_text()) if index_file_path.exists() else {}
+
+    existing_eqn_ids, new_eqns = [], {}
+    for eqn_id in eqn_ids:
+        r0, i, run = get_eqn_params(eqn_id)
+        names = [f'text equations/{eqn_id.removesuffix(".txt")}', f'solutions data/sln_data_test_{r0}_{i}_{run}',
+                 f'split exp data/poynting_vec_test_{r0}']
+        version = [get_result_version(results_dir_name, name) for name in names]
+        if version[0] is None:
+            continue
+        existing_eqn_ids.append(eqn_id)
+        if index.get(eqn_id, {}).get('version') == version:
+            continue
+        text_eq = load_result_text(results_dir_name, names[0])
+        coefs = get_coefs_from_terms(get_eq_terms_from_string(text_eq.split('\n')[0]))
+        new_eqns.setdefault(r0, []).append((eqn_id, names[1], coefs, version))
+
+    for r0, eqns in new_eqns.items():
+        slns = [load_result_array(results_dir_name, sln_name) for _, sln_name, _, _ in eqns]
+        solved = [k for k, sln in enumerate(slns) if sln is not None]
+        rmse = np.full(len(eqns), np.nan)
+        if solved:
+            test_data = load_result_array(results_dir_name, f'split exp data/poynting_vec_test_{r0}')
+            rmse[solved] = np.sqrt(np.mean((np.stack([slns[k] for k in solved]) - test_data) ** 2, axis=1))
+        for (eqn_id, _, coefs, version), eqn_rmse in zip(eqns, rmse):
+            coefs['rmse'] = float(eqn_rmse)
+            index[eqn_id] = {'version': version, 'coefs': coefs}
+
+    if new_eqns:
+        write_atomically(index_file_path, lambda tmp_file_path: tmp_file_path.write_text(json.dumps(index)))
+    return {eqn_id: index[eqn_id]['coefs'] for eqn_id in existing_eqn_ids}
+
+
+def get_seed_equations(exp_name: str, r0: int | float, number: int) -> [str]:
+    """
+    Gets the best equations of the experiment for the radius value closest to r0 to seed the initial
+    population of the EPDE search. The equations are ordered by the RMSE of their solutions, the equations
+    without solutions go last, and only the best equation of every structure is taken, since the populations
+    of different runs often contain the same equations.
+
+    Args:
+        exp_name: The name of the experiment with the saved results.
+        r0: The radius value to get the equations for.
+        number: The maximum number of equations.
+
+    Returns:
+        list: The first lines of the equations in EPDE text form.
+    """
+
+    results_dir_name = get_results_dir(exp_name)
+    eqn_ids = [f'{name.removeprefix("text equations/")}.txt'
+               for name in list_result_names(results_dir_name, 'text equations/eqn_')]
+    if not eqn_ids:
+        return []
+    closest_r0 = min({get_eqn_params(eqn_id)[0] for eqn_id in eqn_ids}, key=lambda saved_r0: abs(saved_r0 - r0))
+    results = aggregate_results(exp_name, [eqn_id for eqn_id in eqn_ids if get_eqn_params(eqn_id)[0] == closest_r0])
+    from equation_tools import get_equation_structure  # equation_tools imports this module
+
+    best_eqn_ids = sorted(results, key=lambda eqn_id: (np.isnan(results[eqn_id]['rmse']), results[eqn_id]['rmse']))
+    seed_equations = {}
+    for eqn_id in best_eqn_ids:
+        text_eq = load_result_text(results_dir_name, f'text equations/{eqn_id.removesuffix(".txt")}').split('\n')[0]
+        seed_equations.setdefault(get_equation_structure(text_eq), text_eq)
+        if len(seed_equations) == number:
+            break
+    return list(seed_equations.values())
@@ -0,0 +1,212 @@
+import itertools
+import json
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+
+from discovery_tools import epde_discovery
+from equation_tools import get_residual_scores
+from experiment_tools import get_exp_split_data, get_training_derivatives, init_worker
+from results_analysis_tools import get_results_dir
+from profile_tools import stage, set_trace_dir
+
+default_search_space = {'pop_size': (4, 6, 8, 10), 'poly_order': (2, 3, 4),
+                        'equation_terms_max_number': (3, 4, 5, 6),
+                        'eq_sparsity_interval': ((1e-12, 1e-4), (1e-10, 1e-3), (1e-8, 1e-2), (1e-6, 1e-1))}
+search_file_name = '_search.jsonl'
+
+
+def get_search_configs(search_space: dict, n_configs: int, random_state: int = 0) -> [dict]:
+    """
+    Draws the configurations of the EPDE search to evaluate: the whole grid of the search space if it has
+    at most n_configs points and a random sample of its points otherwise.
+
+    Args:
+        search_space: The values of every parameter of epde_discovery to try.
+        n_configs: The number of configurations.
+        random_state: The seed of the sample (default is 0).
+
+    Returns:
+        list: The configurations as the keyword arguments of epde_discovery.
+    """
+
+    names = list(search_space)
+    grid = list(itertools.product(*(search_space[name] for name in names)))
+    if len(grid) > n_configs:
+        grid = [grid[k] for k in sorted(np.random.default_rng(random_state).choice(len(grid), n_configs,
+                                                                                   replace=False))]
+    return [dict(zip(names, values)) for values in grid]
+
+
+def get_config_key(config: dict) -> str:
+    return json.dumps(config, sort_keys=True)
+
+
+def get_search_budgets(min_epochs: int, max_epochs: int, eta: int) -> [int]:
+    """
+    Gets the numbers of EPDE epochs of the rungs of the successive halving: every rung has eta times as many
+    epochs as the previous one, and the last rung has max_epochs.
+
+    Args:
+        min_epochs: The smallest number of epochs.
+        max_epochs: The number of epochs of the last rung.
+        eta: The ratio of the budgets of the neighbouring rungs.
+
+    Returns:
+        list: The numbers of epochs of the rungs.
+    """
+
+    n_rungs = max(1, int(math.floor(math.log(max_epochs / min_epochs, eta) + 1e-9)) + 1)
+    return [max(min_epochs, round(max_epochs / eta ** (n_rungs - 1 - k))) for k in range(n_rungs)]
+
+
+def score_config(config: dict, epochs: int, split_data: dict, derivs: dict, max_deriv_order: (int,),
+                 use_smoothing: bool, factors_max_number: int, data_fun_pow: int) -> float:
+    """
+    Runs the EPDE search with the configuration for every radius value and scores the discovered population
+    by the residuals of its equations on the test data, which costs no solving.
+
+    Args:
+        config: The keyword arguments of epde_discovery to evaluate.
+        epochs: The number of EPDE epochs.
+        split_data: The normalized training and test grids and Poynting vector data keyed by the radius value.
+        derivs: The derivatives of the training data keyed by the radius value.
+        max_deriv_order: Maximum derivative order in a differential equation.
+        use_smoothing: The flag whether to use Gaussian smoothing.
+        factors_max_number: Maximum number of factors in a term.
+        data_fun_pow: The highest power of derivative-like token in the equation.
+
+    Returns:
+        float: The mean over the radius values of the score of the best equation, lower is better.
+    """
+
+    scores = []
+    for r0, (grid_training, grid_test, poynting_vec_training, poynting_vec_test) in split_data.items():
+        epde_search_obj = epde_discovery(grid_training, poynting_vec_training, training_epochs=epochs,
+                                         max_deriv_order=max_deriv_order, use_smoothing=use_smoothing,
+                                         factors_max_number=factors_max_number, data_fun_pow=data_fun_pow,
+                                         derivs=derivs[r0], **config)
+        eqs_text_form = epde_search_obj.equations(only_print=False, only_str=True, num=1)[0]
+        test_derivs = get_training_derivatives(grid_test, poynting_vec_test, max_deriv_order, use_smoothing)[0]
+        scores.append(np.min(get_residual_scores(eqs_text_form, grid_test, poynting_vec_test, test_derivs)))
+    return float(np.mean(scores))
+
+
+def read_search_records(results_dir: Path) -> [dict]:
+    search_file_path = results_dir / search_file_name
+    if not search_file_path.exists():
+        return []
+    with search_file_path.open() as search_file:
+        return [json.loads(line) for line in search_file if line.endswith('\n')]
+
+
+def write_search_record(results_dir: Path, record: dict) -> None:
+    with (results_dir / search_file_name).open(mode='a') as search_file:
+        search_file.write(json.dumps(record) + '\n')
+
+
+def save_search_ranking(results_dir: Path, ranking: [dict]) -> None:
+    """
+    Saves the ranking of the configurations as the '_search_ranking.txt' table, which is printed as well.
+
+    Args:
+        results_dir: The results directory of the search.
+        ranking: The records of the configurations from the best to the worst.
+
+    Returns:
+        None
+    """
+
+    lines = [f'{"rank":<6}{"epochs":>8}{"score":>12}  config']
+    for rank, record in enumerate(ranking, 1):
+        lines.append(f'{rank:<6}{record["epochs"]:>8}{record["score"]:>12.4e}  {get_config_key(record["config"])}')
+    table = '\n'.join(lines)
+    print(table)
+    (results_dir / '_search_ranking.txt').write_text(table + '\n')
+
+
+def start_search(r0_list: [int | float], wave_length: int | float, exp_name: str = 'search',
+                 search_space: dict = None, n_configs: int = 27, min_epochs: int = 5, max_epochs: int = 100,
+                 eta: int = 3, max_deriv_order: (int,) = (2,), use_smoothing: bool = True,
+                 factors_max_number: int = 1, data_fun_pow: int = 1, max_workers: int = 1,
+                 threads_per_worker: int = 1, random_state: int = 0) -> [dict]:
+    """
+    Searches the settings of the EPDE search by successive halving: all configurations are evaluated with
+    the smallest number of epochs, and only the best 1/eta of them are promoted to the next rung with eta times
+    as many epochs, up to max_epochs. The configurations are scored by score_config without solving the
+    equations. Every evaluation is appended to '_search.jsonl', so an interrupted search is resumed without
+    repeating the evaluated configurations.
+
+    Args:
+        r0_list: The radius values to evaluate the configurations on, e.g. a few values of the sweep.
+        wave_length: The wavelength of the incident wave.
+        exp_name: The name of the experiment to save the data split and the search results to (default is
+        'search').
+        search_space: The values of the parameters of epde_discovery to try, e.g. pop_size, poly_order,
+        equation_terms_max_number and eq_sparsity_interval (default is None, i.e. default_search_space).
+        n_configs: The number of configurations of the first rung (default is 27).
+        min_epochs: The number of EPDE epochs of the first rung (default is 5).
+        max_epochs: The number of EPDE epochs of the last rung (default is 100).
+        eta: The ratio of the numbers of configurations and of the budgets of the neighbouring rungs
+        (default is 3).
+        max_deriv_order: Maximum derivative order (default is (2,)).
+        use_smoothing: The flag whether to use Gaussian smoothing (default is True).
+        factors_max_number: Maximum number of factors in a term (default is 1).
+        data_fun_pow: The highest power of derivative-like token in the equation (default is 1).
+        max_workers: The number of worker processes evaluating the configurations (default is 1).
+        threads_per_worker: The number of torch intra-op threads in every worker (default is 1).
+        random_state: The seed of the sample of the configurations (default is 0).
+
+    Returns:
+        list: The records with the configuration, the number of epochs of the highest rung reached and the
+        score there, from the best to the worst; the first one is the recommended configuration with
+        training_epde_epochs equal to its number of epochs.
+    """
+
+    results_dir = get_results_dir(exp_name)
+    set_trace_dir(results_dir)
+    split_data, derivs = {}, {}
+    for r0 in r0_list:
+        grid_training, grid_test, poynting_vec_training, poynting_vec_test = get_exp_split_data(r0, results_dir)
+        grid_training, grid_test = grid_training / wave_length, grid_test / wave_length
+        grid_max = np.max(np.concatenate((grid_training, grid_test)))
+        split_data[r0] = (grid_training / grid_max, grid_test / grid_max, poynting_vec_training, poynting_vec_test)
+        derivs[r0] = get_training_derivatives(grid_training / grid_max, poynting_vec_training, max_deriv_order,
+                                              use_smoothing)
+
+    scores = {(get_config_key(record['config']), record['epochs']): record['score']
+              for record in read_search_records(results_dir)}
+    configs = get_search_configs(search_space or default_search_space, n_configs, random_state)
+    ranking = []
+    executor = None
+    if max_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=init_worker, initargs=(threads_per_worker,))
+    try:
+        for rung, epochs in enumerate(get_search_budgets(min_epochs, max_epochs, eta)):
+            with stage('search_rung', rung=rung, epochs=epochs, configs=len(configs)):
+                todo = [config for config in configs if (get_config_key(config), epochs) not in scores]
+                args = (split_data, derivs, max_deriv_order, use_smoothing, factors_max_number, data_fun_pow)
+                if executor is None:
+                    results = (score_config(config, epochs, *args) for config in todo)
+                else:
+                    results = executor.map(score_config, todo, itertools.repeat(epochs), *map(itertools.repeat, args))
+                for config, score in zip(todo, results):
+                    scores[(get_config_key(config), epochs)] = score
+                    write_search_record(results_dir, {'config': config, 'epochs': epochs, 'score': score})
+            rung_ranking = sorted(({'config': config, 'epochs': epochs,
+                                    'score': scores[(get_config_key(config), epochs)]} for config in configs),
+                                  key=lambda record: record['score'])
+            n_promoted = max(1, len(configs) // eta)
+            ranking = rung_ranking[n_promoted:] + ranking
+            configs = [record['config'] for record in rung_ranking[:n_promoted]]
+            print(f'Rung {rung}: {len(rung_ranking)} configurations with {epochs} epochs, '
+                  f'the best score is {rung_ranking[0]["score"]:.4e}')
+        ranking = rung_ranking[:n_promoted] + ranking
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    save_search_ranking(results_dir, ranking)
+    return ranking
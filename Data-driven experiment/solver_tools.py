@@ -1,27 +1,38 @@
+import math
+import time
+from contextlib import contextmanager
 import numpy as np
 import torch
 import tedeous
+from scipy.integrate import solve_ivp
 from tedeous.callbacks import early_stopping, plot
+from tedeous.callbacks.callback import Callback
 from tedeous.data import Domain, Conditions, Equation
 from tedeous.device import check_device
 from tedeous.model import Model
 from tedeous.models import mat_model
 from tedeous.optimizers.optimizer import Optimizer
 
+from profile_tools import add_stage_info
+from data_tools import get_derivatives
+from equation_tools import (get_residual_coefs, get_max_deriv_order, get_deriv_name, get_term_factors, eval_term,
+                            eval_residual, compile_residual)
 
-def get_grid_for_solver(arg0) -> torch.Tensor:
+
+def get_grid_for_solver(arg0, dtype: torch.dtype = torch.float32) -> torch.Tensor:
     """
-    Prepares the input data for the solver by converting a list of coordinates into a torch tensor.
+    Prepares the input data for the solver by converting a coordinate array into a torch tensor. The tensor
+    shares the memory with a contiguous NumPy array of the same precision, so a float64 grid is not copied
+    in the float64 mode.
 
     Args:
-        arg0: The input coordinate list.
+        arg0: The input coordinate array.
+        dtype: The precision of the solver (default is torch.float32).
 
     Returns:
         torch.Tensor: A torch tensor reshaped for the solver input.
     """
-    coord_list_train = [arg0]
-    coord_list_train = torch.tensor(coord_list_train)
-    return coord_list_train.reshape(-1, 1).float()
+    return torch.as_tensor(np.ascontiguousarray(arg0)).reshape(-1, 1).to(dtype)
 
 
 def set_boundary(arg_values: list, func_values: list, variable_names: [str] = 'y') -> tedeous.data.Conditions:
@@ -42,58 +53,174 @@ def set_boundary(arg_values: list, func_values: list, variable_names: [str] = 'y
     return boundaries
 
 
-def get_nn() -> torch.nn.Sequential:
+class Sine(torch.nn.Module):
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.sin(x)
+
+
+activations = {'tanh': torch.nn.Tanh, 'sin': Sine, 'gelu': torch.nn.GELU, 'silu': torch.nn.SiLU}
+default_nn_params = {'width': 100, 'depth': 3, 'activation': 'tanh', 'dtype': 'float32', 'compile': None,
+                     'collocation': None}
+default_collocation = {'initial_points': 64, 'rounds': 8, 'add_points': 32, 'drop_fraction': 1e-3}
+
+
+def get_nn_params(nn_params: dict = None) -> dict:
+    """
+    Completes the parameters of the solver networks with the defaults.
+
+    Args:
+        nn_params: The parameters to override: 'width' and 'depth' of the hidden layers, 'activation' from
+        activations, 'dtype', 'float32' or 'float64', 'compile', None, 'script' or 'compile', and
+        'collocation', None to train on the whole training grid or the parameters of the adaptive collocation
+        of get_solution overriding default_collocation, e.g. {} (default is None, i.e. the defaults).
+
+    Returns:
+        dict: The parameters of the networks.
+
+    Raises:
+        ValueError: If the activation, the precision or the compilation mode is unknown.
+    """
+
+    nn_params = {**default_nn_params, **(nn_params or {})}
+    if nn_params['activation'] not in activations:
+        raise ValueError(f'Unknown activation: {nn_params["activation"]}')
+    if nn_params['dtype'] not in {'float32', 'float64'}:
+        raise ValueError(f'Unknown precision: {nn_params["dtype"]}')
+    if nn_params['compile'] not in {None, 'script', 'compile'}:
+        raise ValueError(f'Unknown compilation mode: {nn_params["compile"]}')
+    if nn_params['collocation'] is not None:
+        nn_params['collocation'] = {**default_collocation, **nn_params['collocation']}
+    return nn_params
+
+
+def get_nn(width: int = 100, depth: int = 3, activation: str = 'tanh',
+           dtype: torch.dtype = torch.float32, n_inputs: int = 1) -> torch.nn.Sequential:
     """
-    Creates and returns a neural network model with a specific architecture.
+    Creates and returns a fully connected neural network model.
+
+    Args:
+        width: The number of neurons in a hidden layer (default is 100).
+        depth: The number of hidden layers (default is 3).
+        activation: The activation function from activations (default is 'tanh').
+        dtype: The precision of the weights (default is torch.float32).
+        n_inputs: The number of inputs (default is 1, i.e. H).
 
     Returns:
         torch.nn.Sequential: A neural network model with the defined architecture.
     """
 
-    return torch.nn.Sequential(
-        torch.nn.Linear(1, 100),
-        torch.nn.Tanh(),
-        torch.nn.Linear(100, 100),
-        torch.nn.Tanh(),
-        torch.nn.Linear(100, 100),
-        torch.nn.Tanh(),
-        torch.nn.Linear(100, 1),
-    )
+    layers = []
+    for n_in, n_out in zip([n_inputs] + [width] * depth, [width] * depth):
+        layers += [torch.nn.Linear(n_in, n_out), activations[activation]()]
+    return torch.nn.Sequential(*layers, torch.nn.Linear(width, 1)).to(dtype)
 
 
-def get_solution(eq, poynting_vec: np.ndarray, grid_training: np.ndarray,
-                 grid_test: np.ndarray, img_dir: str, training_epochs: int = 10000,
-                 mode: str = 'autograd') -> (torch.Tensor, torch.Tensor):
+def compile_nn(net: torch.nn.Module, mode: str = None, input_shape: (int,) = (3, 1)) -> torch.nn.Module:
     """
-    Solve the given equation using the specified solver mode and return the predicted solutions for training and
-    testing grids.
+    Compiles the network by TorchScript or torch.compile. The compiled network shares the parameters with
+    the original one. The solver differentiates the network output twice, which some versions of torch can
+    not compile, so the compiled network is checked on a small input and the original network is returned
+    if the check fails.
+
+    Args:
+        net: The network.
+        mode: None, 'script' or 'compile' (default is None, i.e. no compilation).
+        input_shape: The shape of the input to check the compiled network on (default is (3, 1)).
+
+    Returns:
+        torch.nn.Module: The compiled network or the original network.
+    """
+
+    if mode is None or (mode == 'compile' and not hasattr(torch, 'compile')):
+        return net
+    try:
+        compiled_net = torch.jit.script(net) if mode == 'script' else torch.compile(net)
+        x = torch.zeros(*input_shape, dtype=next(net.parameters()).dtype, requires_grad=True)
+        dx = torch.autograd.grad(compiled_net(x).sum(), x, create_graph=True)[0]
+        torch.autograd.grad(dx.sum(), x)
+    except Exception as e:  # the compilers raise errors of various types
+        print(f'The network is not compiled by {mode}: {type(e).__name__}: {e}')
+        return net
+    return compiled_net
+
+
+def fits_nn(state_dict: dict, nn_params: dict) -> bool:
+    """
+    Checks whether the state dict of a get_nn network fits the architecture of the parameters, e.g. before
+    a network is warm-started from the weights saved by a run with another architecture.
+
+    Args:
+        state_dict: The state dict of the network of the get_nn architecture.
+        nn_params: The parameters of the networks from get_nn_params.
+
+    Returns:
+        bool: True if the shapes of all weights match.
+    """
+
+    layer_sizes = [1] + [nn_params['width']] * nn_params['depth'] + [1]
+    shapes = {}
+    for j, (n_in, n_out) in enumerate(zip(layer_sizes[:-1], layer_sizes[1:])):
+        shapes.update({f'{2 * j}.weight': (n_out, n_in), f'{2 * j}.bias': (n_out,)})
+    return state_dict.keys() == shapes.keys() and all(tuple(state_dict[key].shape) == shape
+                                                      for key, shape in shapes.items())
+
+
+@contextmanager
+def default_dtype(dtype: torch.dtype):
+    """
+    Sets the default torch precision while the solver runs, so that the tensors created by TEDEouS match
+    the precision of the network.
+
+    Args:
+        dtype: The precision.
+    """
+
+    previous_dtype = torch.get_default_dtype()
+    torch.set_default_dtype(dtype)
+    try:
+        yield
+    finally:
+        torch.set_default_dtype(previous_dtype)
+
+
+class EpochCounter(Callback):
+    """
+    Counts the training epochs of the TEDEouS model, so that the cost of an epoch can be traced.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.epochs = 0
+
+    def on_epoch_end(self, logs=None):
+        self.epochs += 1
+
+
+def train_model(net: torch.nn.Module, eq, grid: torch.Tensor, training_epochs: int, img_dir: str,
+                mode: str = 'autograd') -> int:
+    """
+    Trains the network on the equation with the condition I(0) = -1 at the given collocation points by TEDEouS.
 
     Args:
+        net: The network to train.
         eq: The equation to solve.
-        poynting_vec: The Poynting vector data.
-        grid_training: The training grid data.
-        grid_test: The testing grid data.
+        grid: The collocation points.
+        training_epochs: Maximum number of epochs for training.
         img_dir: The directory to save solution images.
-        training_epochs: Number of epochs for training (default is 10000).
         mode: The solver mode to use (default is 'autograd').
 
     Returns:
-        tuple: Predicted solutions for the training and testing grids.
+        int: The number of the epochs run before the early stopping.
     """
 
-    grid_training = get_grid_for_solver(grid_training)
-    grid_test = get_grid_for_solver(grid_test)
-
     domain = Domain()  # Domain class for domain initialization
-    domain.variable('y', grid_training, None)
+    domain.variable('y', grid, None)
 
     boundaries = set_boundary([0.0], [-1])
 
     equation = Equation()
     equation.add(eq)
 
-    net = get_nn() if mode in {'NN', 'autograd'} else mat_model(domain, equation)
-
     model = Model(net, domain, equation, boundaries)
     model.compile(mode, lambda_operator=1, lambda_bound=40)
     cb_es = early_stopping.EarlyStopping(eps=1e-6,
@@ -103,8 +230,488 @@ def get_solution(eq, poynting_vec: np.ndarray, grid_training: np.ndarray,
                                          randomize_parameter=1e-5,
                                          info_string_every=1000)
     cb_plots = plot.Plots(save_every=1000, print_every=None, img_dir=img_dir)
+    cb_epochs = EpochCounter()
     optimizer = Optimizer('Adam', {'lr': 1e-3})
-    model.train(optimizer, training_epochs, save_model=False, callbacks=[cb_es, cb_plots])
-    predicted_solution_training = check_device(net(grid_training)).reshape(-1)
-    predicted_solution_test = check_device(net(grid_test)).reshape(-1)
-    return predicted_solution_training, predicted_solution_test
+    model.train(optimizer, training_epochs, save_model=False, callbacks=[cb_es, cb_plots, cb_epochs])
+    return cb_epochs.epochs
+
+
+def get_residual_values(net: torch.nn.Module, residual, grid: torch.Tensor, max_deriv_order: int) -> torch.Tensor:
+    grid = grid.detach().clone().requires_grad_(True)
+    return torch.abs(residual(get_population_fields(net, grid, max_deriv_order))).detach().reshape(-1)
+
+
+def update_collocation_points(residual_values: torch.Tensor, active: torch.Tensor, required: torch.Tensor,
+                              collocation: dict, min_points: int) -> torch.Tensor:
+    """
+    Adds the add_points points of the grid with the largest residual to the collocation points and removes
+    the points where the residual is below drop_fraction of its maximum. The required points are always kept,
+    and at least min_points points remain.
+
+    Args:
+        residual_values: The absolute residual on the whole grid.
+        active: The indices of the current collocation points.
+        required: The indices of the points that are never removed.
+        collocation: The parameters 'add_points' and 'drop_fraction'.
+        min_points: The smallest number of the collocation points.
+
+    Returns:
+        torch.Tensor: The sorted indices of the new collocation points.
+    """
+
+    inactive_values = residual_values.clone()
+    inactive_values[active] = -1
+    n_added = min(collocation['add_points'], len(residual_values) - len(active))
+    added = torch.topk(inactive_values, n_added).indices if n_added > 0 else active[:0]
+    kept = active[(residual_values[active] >= collocation['drop_fraction'] * residual_values.max())
+                  | torch.isin(active, required)]
+    if len(kept) + n_added < min_points:  # the points with the largest residual are kept instead
+        order = torch.argsort(residual_values[active], descending=True)
+        kept = torch.unique(torch.cat([kept, active[order[:min_points - n_added]]]))
+    return torch.unique(torch.cat([kept, added]))
+
+
+def train_adaptive_model(net: torch.nn.Module, text_eq: str, grid: torch.Tensor, training_epochs: int,
+                         collocation: dict, lambda_bound: int | float = 40, lr: float = 1e-3, eps: float = 1e-6,
+                         loss_window: int = 100, no_improvement_patience: int = 1000,
+                         patience: int = 3) -> (int, [int]):
+    """
+    Trains the network on an adaptive subset of the training grid instead of the whole grid: the training
+    starts from initial_points evenly spaced points, and after every training_epochs / rounds epochs the
+    collocation points are updated by the residual on the whole grid, see update_collocation_points. The points
+    at H = 0 are always kept. It is one run with a single Adam optimizer and the stopping criteria of the
+    TEDEouS early stopping used in get_solution; since the losses on different point sets are not comparable,
+    the best loss and the loss window start anew after every update.
+
+    Args:
+        net: The network to train.
+        text_eq: The equation in EPDE text form.
+        grid: The training grid.
+        training_epochs: Maximum number of epochs for training.
+        collocation: The parameters 'initial_points', 'rounds', 'add_points' and 'drop_fraction'.
+        lambda_bound: The weight of the boundary condition in the loss (default is 40).
+        lr: The learning rate of Adam (default is 1e-3).
+        eps: The relative loss change regarded as a stagnation (default is 1e-6).
+        loss_window: The number of epochs between the checks of the loss change (default is 100).
+        no_improvement_patience: The number of epochs without a new minimum of the loss before the stop
+        (default is 1000).
+        patience: The number of stagnation checks in a row before the stop (default is 3).
+
+    Returns:
+        tuple: The number of the epochs run and the number of the collocation points after every update.
+    """
+
+    residual = compile_residual(text_eq)
+    max_deriv_order = get_max_deriv_order(get_residual_coefs(text_eq))
+    n_points = len(grid)
+    min_points = min(collocation['initial_points'], n_points)
+    required = torch.nonzero(grid.reshape(-1) == 0).reshape(-1)
+    active = torch.unique(torch.cat([torch.linspace(0, n_points - 1, min_points).round().long(), required]))
+    round_epochs = max(training_epochs // collocation['rounds'], 1)
+    bound_grid = torch.zeros(1, 1, dtype=grid.dtype)
+    optimizer = torch.optim.Adam(net.parameters(), lr=lr)
+    best_loss, best_epoch, stagnation = float('inf'), 0, 0
+    window_loss, prev_window_loss = 0.0, float('nan')
+    points = [len(active)]
+    epoch = -1
+    for epoch in range(training_epochs):
+        if epoch > 0 and epoch % round_epochs == 0 and len(points) < collocation['rounds']:
+            active = update_collocation_points(get_residual_values(net, residual, grid, max_deriv_order), active,
+                                               required, collocation, min_points)
+            points.append(len(active))
+            best_loss, best_epoch = float('inf'), epoch
+            window_loss, prev_window_loss = 0.0, float('nan')
+
+        collocation_grid = grid[active].detach().clone().requires_grad_(True)
+        fields = get_population_fields(net, collocation_grid, max_deriv_order)
+        loss = (residual(fields) ** 2).mean() + lambda_bound * ((net(bound_grid) + 1) ** 2).sum()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+        loss = loss.item()
+        if loss < best_loss:
+            best_loss, best_epoch = loss, epoch
+        window_loss += loss / loss_window
+        if (epoch + 1) % loss_window == 0:
+            stagnation = stagnation + 1 if abs(prev_window_loss - window_loss) / prev_window_loss < eps else 0
+            prev_window_loss, window_loss = window_loss, 0.0
+        if epoch - best_epoch >= no_improvement_patience or stagnation >= patience:
+            break
+    return epoch + 1, points
+
+
+def get_solution(eq, poynting_vec: np.ndarray, grid_training: np.ndarray,
+                 grid_test: np.ndarray, img_dir: str, training_epochs: int = 10000,
+                 mode: str = 'autograd', net: torch.nn.Module = None,
+                 nn_params: dict = None, text_eq: str = None) -> (torch.Tensor, torch.Tensor):
+    """
+    Solve the given equation using the specified solver mode and return the predicted solutions for training and
+    testing grids.
+
+    Args:
+        eq: The equation to solve.
+        poynting_vec: The Poynting vector data.
+        grid_training: The training grid data.
+        grid_test: The testing grid data.
+        img_dir: The directory to save solution images, which the adaptive collocation does not plot.
+        training_epochs: Number of epochs for training (default is 10000).
+        mode: The solver mode to use (default is 'autograd').
+        net: The network to train, e.g. initialized with the weights of a solved similar equation
+        (default is None, i.e. a new network of the get_nn architecture).
+        nn_params: The architecture, the precision, the compilation mode and the adaptive collocation of the
+        network, see get_nn_params (default is None, i.e. the defaults).
+        text_eq: The same equation in EPDE text form, required by the adaptive collocation (default is None).
+
+    Returns:
+        tuple: Predicted solutions for the training and testing grids.
+
+    Raises:
+        ValueError: If the adaptive collocation is set for the mat mode or without text_eq.
+    """
+
+    nn_params = get_nn_params(nn_params)
+    collocation = nn_params['collocation']
+    if collocation is not None and (mode not in {'NN', 'autograd'} or text_eq is None):
+        raise ValueError('The adaptive collocation needs the NN or autograd mode and the equation in text form')
+    dtype = getattr(torch, nn_params['dtype'])
+    with default_dtype(dtype):
+        grid_training = get_grid_for_solver(grid_training, dtype)
+        grid_test = get_grid_for_solver(grid_test, dtype)
+
+        if net is None:
+            if mode in {'NN', 'autograd'}:
+                net = get_nn(nn_params['width'], nn_params['depth'], nn_params['activation'], dtype)
+            else:
+                domain = Domain()
+                domain.variable('y', grid_training, None)
+                equation = Equation()
+                equation.add(eq)
+                net = mat_model(domain, equation)
+        if mode in {'NN', 'autograd'}:
+            net = compile_nn(net.to(dtype), nn_params['compile'])
+
+        training_time = time.perf_counter()
+        if collocation is None:
+            epochs = train_model(net, eq, grid_training, training_epochs, img_dir, mode)
+        else:
+            epochs, points = train_adaptive_model(net, text_eq, grid_training, training_epochs, collocation)
+            add_stage_info(collocation_points=points)
+        training_time = time.perf_counter() - training_time
+        add_stage_info(epochs=epochs, epoch_time=training_time / max(epochs, 1))
+        predicted_solution_training = check_device(net(grid_training)).reshape(-1)
+        predicted_solution_test = check_device(net(grid_test)).reshape(-1)
+        return predicted_solution_training, predicted_solution_test
+
+
+class StackedNN(torch.nn.Module):
+    """
+    A population of fully connected networks with the architecture of get_nn, evaluated together by batched
+    matrix products. The input has the shape (number of networks, number of points, 1).
+    """
+
+    def __init__(self, n_nets: int, layer_sizes: (int,) = (1, 100, 100, 100, 1), activation: str = 'tanh'):
+        super().__init__()
+        self.activation_name = activation
+        self.activation = activations[activation]()
+        self.weights = torch.nn.ParameterList()
+        self.biases = torch.nn.ParameterList()
+        for n_in, n_out in zip(layer_sizes[:-1], layer_sizes[1:]):
+            bound = 1 / math.sqrt(n_in)  # the same initialization as in torch.nn.Linear
+            self.weights.append(torch.nn.Parameter(torch.empty(n_nets, n_in, n_out).uniform_(-bound, bound)))
+            self.biases.append(torch.nn.Parameter(torch.empty(n_nets, 1, n_out).uniform_(-bound, bound)))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        for k, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            x = torch.baddbmm(bias, x, weight)
+            if k < len(self.weights) - 1:
+                x = self.activation(x)
+        return x
+
+    def load_member_state(self, k: int, state_dict: dict) -> None:
+        """
+        Sets the weights of the network with the given index from the state dict of a get_nn network.
+
+        Args:
+            k: The index of the network in the population.
+            state_dict: The state dict of the network of the get_nn architecture.
+        """
+
+        with torch.no_grad():
+            for j, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+                weight[k] = state_dict[f'{2 * j}.weight'].T
+                bias[k, 0] = state_dict[f'{2 * j}.bias']
+
+    def get_member_state(self, k: int) -> dict:
+        """
+        Gets the weights of the network with the given index as the state dict of a get_nn network.
+
+        Args:
+            k: The index of the network in the population.
+
+        Returns:
+            dict: The state dict of the network of the get_nn architecture.
+        """
+
+        state_dict = {}
+        for j, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            state_dict[f'{2 * j}.weight'] = weight[k].detach().T.clone()
+            state_dict[f'{2 * j}.bias'] = bias[k, 0].detach().clone()
+        return state_dict
+
+    def select(self, indices: torch.Tensor) -> 'StackedNN':
+        """
+        Creates a new population from the networks with the given indices.
+
+        Args:
+            indices: The indices of the networks to keep.
+
+        Returns:
+            StackedNN: The population of the selected networks.
+        """
+
+        layer_sizes = [self.weights[0].shape[1]] + [weight.shape[2] for weight in self.weights]
+        net = StackedNN(len(indices), layer_sizes, self.activation_name).to(self.weights[0].dtype)
+        with torch.no_grad():
+            for param, old_param in zip(net.parameters(), self.parameters()):
+                param.copy_(old_param[indices])
+        return net
+
+
+def prune_population(net: StackedNN, optimizer: torch.optim.Adam,
+                     keep: torch.Tensor) -> (StackedNN, torch.optim.Adam):
+    """
+    Removes the stopped networks from the population together with their Adam moments.
+
+    Args:
+        net: The population of networks.
+        optimizer: The Adam optimizer of the population.
+        keep: The indices of the networks to keep.
+
+    Returns:
+        tuple: The pruned population and its optimizer.
+    """
+
+    new_net = net.select(keep)
+    new_optimizer = torch.optim.Adam(new_net.parameters(), **optimizer.defaults)
+    for param, old_param in zip(new_net.parameters(), net.parameters()):
+        state = optimizer.state.get(old_param)
+        if state:
+            new_optimizer.state[param] = {'step': state['step'], 'exp_avg': state['exp_avg'][keep].clone(),
+                                          'exp_avg_sq': state['exp_avg_sq'][keep].clone()}
+    return new_net, new_optimizer
+
+
+def get_population_fields(net: StackedNN, grid: torch.Tensor, max_deriv_order: int) -> dict:
+    """
+    Evaluates the population of networks and its derivatives with respect to the grid.
+
+    Args:
+        net: The population of networks.
+        grid: The grid of the shape (number of networks, number of points, 1) with requires_grad set.
+        max_deriv_order: The highest derivative order required by the equations.
+
+    Returns:
+        Dictionary containing 'H', 'I' and the derivatives of I named as in get_deriv_name.
+    """
+
+    fields = {'H': grid, 'I': net(grid)}
+    for order in range(1, max_deriv_order + 1):
+        fields[get_deriv_name(order)] = torch.autograd.grad(fields[get_deriv_name(order - 1)].sum(), grid,
+                                                            create_graph=True)[0]
+    return fields
+
+
+def get_batched_solution(text_eqs: [str], grid_training: np.ndarray, grid_test: np.ndarray,
+                         training_epochs: int = 10000, lambda_bound: int | float = 40, lr: float = 1e-3,
+                         eps: float = 1e-6, loss_window: int = 100, no_improvement_patience: int = 1000,
+                         patience: int = 3, init_states: [dict] = None, return_states: bool = False,
+                         nn_params: dict = None) -> [(torch.Tensor, torch.Tensor)]:
+    """
+    Solves all equations of a population at once: one network per equation is trained, but all networks are
+    evaluated and optimized together as a single stacked model. Every network is stopped independently by the
+    same criteria as the TEDEouS early stopping used in get_solution and returns its weights of the epoch with
+    its lowest loss.
+
+    Args:
+        text_eqs: The equations in EPDE text form.
+        grid_training: The training grid data.
+        grid_test: The testing grid data.
+        training_epochs: Maximum number of epochs for training (default is 10000).
+        lambda_bound: The weight of the boundary condition in the loss (default is 40).
+        lr: The learning rate of Adam (default is 1e-3).
+        eps: The relative loss change regarded as a stagnation (default is 1e-6).
+        loss_window: The number of epochs between the checks of the loss change (default is 100).
+        no_improvement_patience: The number of epochs without a new minimum of the loss before the stop
+        (default is 1000).
+        patience: The number of stagnation checks in a row before the stop (default is 3).
+        init_states: The state dicts of get_nn networks to initialize the networks of the equations with,
+        None for a random initialization (default is None).
+        return_states: The flag whether to return the trained networks as get_nn state dicts as well
+        (default is False).
+        nn_params: The architecture, the precision and the compilation mode of the networks, see get_nn_params
+        (default is None, i.e. the defaults).
+
+    Returns:
+        list: Pairs of predicted solutions for the training and testing grids, one pair per equation, and,
+        if return_states is set, the list of the state dicts of the trained networks.
+
+    Raises:
+        ValueError: If the adaptive collocation is requested; the stacked networks are trained on the whole
+        training grid, see get_solution for the adaptive collocation.
+    """
+
+    nn_params = get_nn_params(nn_params)
+    if nn_params['collocation'] is not None:
+        raise ValueError('The adaptive collocation is not supported by the batched solver')
+    dtype = getattr(torch, nn_params['dtype'])
+    with default_dtype(dtype):
+        coefs_list = [get_residual_coefs(text_eq) for text_eq in text_eqs]
+        terms = sorted({term for coefs in coefs_list for term in coefs})
+        max_deriv_order = max(get_max_deriv_order(coefs) for coefs in coefs_list)
+        coefs_matrix = torch.tensor([[coefs.get(term, 0.0) for term in terms] for coefs in coefs_list],
+                                    dtype=dtype).reshape(len(coefs_list), len(terms), 1, 1)
+
+        grid_training = get_grid_for_solver(grid_training, dtype)
+        grid_test = get_grid_for_solver(grid_test, dtype)
+
+        n_eqs = len(text_eqs)
+        net = StackedNN(n_eqs, (1,) + (nn_params['width'],) * nn_params['depth'] + (1,), nn_params['activation'])
+        for k, init_state in enumerate(init_states or []):
+            if init_state is not None:
+                net.load_member_state(k, init_state)
+        forward_net = compile_nn(net, nn_params['compile'], (n_eqs, 3, 1))
+        optimizer = torch.optim.Adam(net.parameters(), lr=lr)
+        active = torch.arange(n_eqs)
+        best_loss = torch.full((n_eqs,), float('inf'))
+        best_epoch = torch.zeros(n_eqs, dtype=torch.long)
+        stagnation = torch.zeros(n_eqs, dtype=torch.long)
+        window_loss = torch.zeros(n_eqs)
+        prev_window_loss = torch.full((n_eqs,), float('nan'))
+        best_params = [param.detach().clone() for param in net.parameters()]  # the weights at the best epochs
+        solutions = [None] * n_eqs
+        states = [None] * n_eqs
+        training_time = time.perf_counter()
+
+        epoch = -1
+        for epoch in range(training_epochs):
+            n_active = len(active)
+            grid = grid_training.expand(n_active, -1, -1).clone().requires_grad_(True)
+            fields = get_population_fields(forward_net, grid, max_deriv_order)
+            term_values = torch.stack([eval_term(term, fields) * torch.ones_like(fields['I']) for term in terms], dim=1)
+            residual = (coefs_matrix[active] * term_values).sum(dim=1)
+            bound_values = forward_net(torch.zeros(n_active, 1, 1))
+            loss = (residual ** 2).mean(dim=(1, 2)) + lambda_bound * ((bound_values + 1) ** 2).reshape(-1)
+
+            improved = loss.detach() < best_loss[active]
+            best_loss[active] = torch.where(improved, loss.detach(), best_loss[active])
+            best_epoch[active] = torch.where(improved, epoch, best_epoch[active])
+            with torch.no_grad():  # the loss is of the weights before the step
+                for best_param, param in zip(best_params, net.parameters()):
+                    best_param[improved] = param[improved]
+
+            optimizer.zero_grad()
+            loss.sum().backward()
+            optimizer.step()
+
+            loss = loss.detach()
+            window_loss[active] += loss / loss_window
+            stopped = epoch - best_epoch[active] >= no_improvement_patience
+            if (epoch + 1) % loss_window == 0:
+                change = torch.abs(prev_window_loss[active] - window_loss[active]) / prev_window_loss[active]
+                stagnation[active] = torch.where(change < eps, stagnation[active] + 1, 0)
+                prev_window_loss[active] = window_loss[active]
+                window_loss[active] = 0
+                stopped |= stagnation[active] >= patience
+            if epoch == training_epochs - 1:
+                stopped[:] = True
+
+            if stopped.any():
+                with torch.no_grad():
+                    for best_param, param in zip(best_params, net.parameters()):
+                        param[stopped] = best_param[stopped]
+                    pred_training = forward_net(grid_training.expand(n_active, -1, -1))
+                    pred_test = forward_net(grid_test.expand(n_active, -1, -1))
+                for k in torch.nonzero(stopped).reshape(-1).tolist():
+                    solutions[int(active[k])] = (pred_training[k].reshape(-1), pred_test[k].reshape(-1))
+                    states[int(active[k])] = net.get_member_state(k)
+                keep = torch.nonzero(~stopped).reshape(-1)
+                if len(keep) == 0:
+                    break
+                net, optimizer = prune_population(net, optimizer, keep)
+                best_params = [best_param[keep] for best_param in best_params]
+                forward_net = compile_nn(net, nn_params['compile'], (len(keep), 3, 1))
+                active = active[keep]
+
+        if epoch < 0:  # no training epochs, the initial networks are returned
+            with torch.no_grad():
+                pred_training = forward_net(grid_training.expand(n_eqs, -1, -1))
+                pred_test = forward_net(grid_test.expand(n_eqs, -1, -1))
+            solutions = [(pred_training[k].reshape(-1), pred_test[k].reshape(-1)) for k in range(n_eqs)]
+            states = [net.get_member_state(k) for k in range(n_eqs)]
+        training_time = time.perf_counter() - training_time
+        add_stage_info(epochs=epoch + 1, epoch_time=training_time / max(epoch + 1, 1))
+        return (solutions, states) if return_states else solutions
+
+
+def get_ode_solution(text_eq: str, grid_training: np.ndarray, grid_test: np.ndarray,
+                     poynting_vec_training: np.ndarray, method: str = 'LSODA', rtol: float = 1e-6,
+                     atol: float = 1e-9, max_abs_value: float = 1e3, derivs: np.ndarray = None,
+                     use_smoothing: bool = True, dtype: torch.dtype = torch.float32) -> tuple | None:
+    """
+    Solves the equation as an initial value problem with the condition I(0) = -1 by a classical integrator.
+    The equation is resolved with respect to its highest derivative, which must enter it linearly as a
+    separate term. The lower derivatives at H = 0 that the condition does not fix are taken from the smoothed
+    derivatives of the training data at its first point and expanded to H = 0 by the Taylor series.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+        grid_training: The sorted training grid data.
+        grid_test: The sorted testing grid data.
+        poynting_vec_training: The training Poynting vector data.
+        method: The solve_ivp method; LSODA switches to the stiff solver automatically (default is 'LSODA').
+        rtol: The relative tolerance of the integrator (default is 1e-6).
+        atol: The absolute tolerance of the integrator (default is 1e-9).
+        max_abs_value: The absolute value of the solution regarded as a blow-up (default is 1e3).
+        derivs: The derivatives of the training data as the columns, e.g. from get_training_derivatives
+        (default is None, i.e. they are computed by get_derivatives).
+        use_smoothing: The flag whether to smooth the data before computing the derivatives (default is True).
+        dtype: The precision of the returned solutions (default is torch.float32).
+
+    Returns:
+        tuple | None: Predicted solutions for the training and testing grids or None if the equation can not
+        be resolved with respect to its highest derivative or the integration fails or blows up.
+    """
+
+    coefs = get_residual_coefs(text_eq)
+    order = get_max_deriv_order(coefs)
+    highest_deriv = get_deriv_name(order)
+    highest_coef = coefs.pop(highest_deriv, 0.0)
+    if order == 0 or highest_coef == 0 or any(name == highest_deriv for term in coefs
+                                              for name, _ in get_term_factors(term)):
+        return None
+
+    def rhs(h, y):
+        fields = {'H': h, **{get_deriv_name(k): y[k] for k in range(order)}}
+        return np.vstack([y[1:order], -eval_residual(coefs, fields) / highest_coef])
+
+    def blow_up(h, y):
+        return max_abs_value - np.max(np.abs(y[0]))
+
+    blow_up.terminal = True
+    if derivs is None or derivs.shape[1] < order - 1:
+        derivs = get_derivatives(grid_training, poynting_vec_training, order, use_smoothing)
+    shift, first_derivs = -grid_training[0], derivs[0]
+    init_values = [-1.0] + [sum(first_derivs[k + j - 1] * shift ** j / math.factorial(j)
+                                for j in range(len(first_derivs) - k + 1)) for k in range(1, order)]
+    grid = np.union1d(grid_training, grid_test)
+    try:
+        solution = solve_ivp(rhs, (0.0, grid[-1]), init_values, method=method, t_eval=grid, vectorized=True,
+                             rtol=rtol, atol=atol, events=blow_up)
+    except (ValueError, ArithmeticError):
+        return None
+    if solution.status != 0 or not np.all(np.isfinite(solution.y[0])):
+        return None
+    values = solution.y[0]
+    return (torch.from_numpy(values[np.searchsorted(grid, grid_training)]).to(dtype),
+            torch.from_numpy(values[np.searchsorted(grid, grid_test)]).to(dtype))
@@ -0,0 +1,408 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+
+store_dir_name = 'results store'  # the directory of the binary store inside the results directory
+store_cache = {}  # memory maps and indices of the opened stores, keyed by the file path
+store_compaction_threshold = 0.5  # the fraction of the data file taken by the replaced arrays to reclaim it at
+
+
+def get_store_dir(results_dir: Path) -> Path:
+    """
+    Gets the directory of the binary results store of the experiment. The store consists of the data file,
+    to which all arrays are appended, and the index file with one JSON entry per appended array or text.
+    The space of the arrays replaced by saving them again is reclaimed by compact_store.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        Path: The path of the store directory.
+    """
+
+    store_dir = results_dir / store_dir_name
+    store_dir.mkdir(exist_ok=True)
+    return store_dir
+
+
+@contextmanager
+def store_lock(store_dir: Path):
+    """
+    Locks the store for writing, so that concurrent processes append their entries one after another.
+
+    Args:
+        store_dir: The store directory.
+    """
+
+    with (store_dir / '.lock').open(mode='a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_entry(results_dir: Path, entry: dict, data: bytes = b'') -> None:
+    """
+    Appends the data to the data file of the store and the entry describing it to the index. A partial line
+    left at the end of the index by a writer that died while appending is terminated first, so the entry starts
+    on its own line.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        entry: The index entry.
+        data: The raw bytes of the array (default is empty).
+
+    Returns:
+        None
+    """
+
+    store_dir = get_store_dir(results_dir)
+    with store_lock(store_dir):
+        with (store_dir / 'data.bin').open(mode='ab') as data_file:
+            entry['offset'] = data_file.tell()
+            data_file.write(data)
+        with (store_dir / 'index.jsonl').open(mode='a+b') as index_file:
+            index_file.seek(0, os.SEEK_END)
+            if index_file.tell() > 0:
+                index_file.seek(-1, os.SEEK_END)
+                if index_file.read(1) != b'\n':
+                    index_file.write(b'\n')
+            entry['index_offset'] = index_file.tell()
+            index_file.write((json.dumps(entry) + '\n').encode())
+
+
+def save_array(results_dir: Path, name: str, array: np.ndarray) -> None:
+    """
+    Saves the array to the store. A later array with the same name replaces the earlier one.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the array, e.g. 'solutions data/sln_data_test_0.1_0_0'.
+        array: The array to save.
+
+    Returns:
+        None
+    """
+
+    array = np.ascontiguousarray(array)
+    append_entry(results_dir, {'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape)},
+                 array.tobytes())
+
+
+def save_text(results_dir: Path, name: str, text: str) -> None:
+    """
+    Saves the text to the store. A later text with the same name replaces the earlier one.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the text, e.g. 'text equations/eqn_0.1_0_0'.
+        text: The text to save.
+
+    Returns:
+        None
+    """
+
+    append_entry(results_dir, {'name': name, 'text': text})
+
+
+def read_store_index(results_dir: Path) -> dict:
+    """
+    Reads the index of the store. The index is cached until the index file changes. A line which cannot be
+    parsed, e.g. the partial line of a writer that died while appending, is skipped.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        dict: The latest index entry for every name.
+    """
+
+    index_file_path = results_dir / store_dir_name / 'index.jsonl'
+    if not index_file_path.exists():
+        return {}
+    stat = index_file_path.stat()
+    cached = store_cache.get(index_file_path)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+    index = {}
+    with index_file_path.open() as index_file:
+        for line in index_file:
+            if not line.endswith('\n'):  # an unfinished line is being written by another process
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print(f'{index_file_path}: the partial index line {line.strip()!r} is skipped')
+                continue
+            index[entry['name']] = entry
+    store_cache[index_file_path] = ((stat.st_mtime_ns, stat.st_size), index)
+    return index
+
+
+def get_data_map(results_dir: Path) -> np.memmap:
+    """
+    Gets the memory map of the data file of the store. The map is reopened when the data file grows or is
+    replaced by compact_store.
+
+    Args:
+        results_dir: The results directory of the experiment.
+
+    Returns:
+        np.memmap: The read-only bytes of the data file.
+    """
+
+    data_file_path = results_dir / store_dir_name / 'data.bin'
+    stat = data_file_path.stat()
+    cached = store_cache.get(data_file_path)
+    if cached is None or cached[0] != (stat.st_ino, stat.st_size):
+        cached = ((stat.st_ino, stat.st_size),
+                  np.memmap(data_file_path, dtype=np.uint8, mode='r') if stat.st_size else np.empty(0, np.uint8))
+        store_cache[data_file_path] = cached
+    return cached[1]
+
+
+def load_array(results_dir: Path, name: str) -> np.ndarray | None:
+    """
+    Loads the array from the store without copying: the result is a read-only view of the memory map.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the array.
+
+    Returns:
+        np.ndarray | None: The array or None if there is no such array in the store.
+    """
+
+    entry = read_store_index(results_dir).get(name)
+    if entry is None or 'text' in entry:
+        return None
+    dtype = np.dtype(entry['dtype'])
+    count = int(np.prod(entry['shape']))
+    return np.frombuffer(get_data_map(results_dir), dtype=dtype, count=count,
+                         offset=entry['offset']).reshape(entry['shape'])
+
+
+def load_text(results_dir: Path, name: str) -> str | None:
+    """
+    Loads the text from the store.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the text.
+
+    Returns:
+        str | None: The text or None if there is no such text in the store.
+    """
+
+    entry = read_store_index(results_dir).get(name)
+    return None if entry is None else entry.get('text')
+
+
+def load_result_array(results_dir: Path, name: str) -> np.ndarray | None:
+    """
+    Loads the array from the store or, for the results saved before the store was introduced, from the
+    text file with the same name.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the array.
+
+    Returns:
+        np.ndarray | None: The array or None if it was not saved.
+    """
+
+    array = load_array(results_dir, name)
+    if array is None and (results_dir / f'{name}.txt').exists():
+        array = np.genfromtxt(results_dir / f'{name}.txt', delimiter=',')
+    return array
+
+
+def load_result_text(results_dir: Path, name: str) -> str | None:
+    """
+    Loads the text from the store or, for the results saved before the store was introduced, from the
+    text file with the same name.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the text.
+
+    Returns:
+        str | None: The text or None if it was not saved.
+    """
+
+    text = load_text(results_dir, name)
+    if text is None and (results_dir / f'{name}.txt').exists():
+        text = (results_dir / f'{name}.txt').read_text()
+    return text
+
+
+def list_result_names(results_dir: Path, prefix: str) -> [str]:
+    """
+    Lists the names of the saved arrays and texts starting with the prefix, both from the store and, for the
+    results saved before the store was introduced, from the text files.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        prefix: The prefix of the names, e.g. 'text equations/eqn_0.1_'.
+
+    Returns:
+        list: The sorted names without duplicates.
+    """
+
+    names = {name for name in read_store_index(results_dir) if name.startswith(prefix)}
+    directory, _, file_prefix = prefix.rpartition('/')
+    for file_path in (results_dir / directory).glob(f'{file_prefix}*.txt'):
+        names.add(f'{directory}/{file_path.stem}' if directory else file_path.stem)
+    return sorted(names)
+
+
+def get_result_version(results_dir: Path, name: str) -> list | None:
+    """
+    Gets the version of the saved array or text, which changes every time it is saved again.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        name: The name of the array or text.
+
+    Returns:
+        list | None: The position of the entry in the store index, which changes when the store is compacted
+        as well, or, for the results saved as text files, the modification time and the size of the file; None
+        if the result was not saved.
+    """
+
+    entry = read_store_index(results_dir).get(name)
+    if entry is not None:
+        return ['store', entry['index_offset']]
+    file_path = results_dir / f'{name}.txt'
+    if file_path.exists():
+        stat = file_path.stat()
+        return ['file', stat.st_mtime_ns, stat.st_size]
+    return None
+
+
+def write_atomically(file_path: Path, write) -> None:
+    """
+    Writes the file through a temporary file in the same directory, which replaces the target only when it
+    is completely written, so a reader never sees a partially written file.
+
+    Args:
+        file_path: The path of the file.
+        write: The function writing the content to the given path.
+
+    Returns:
+        None
+    """
+
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file_path = file_path.with_name(f'.{file_path.name}.{os.getpid()}.tmp')
+    try:
+        write(tmp_file_path)
+        os.replace(tmp_file_path, file_path)
+    finally:
+        tmp_file_path.unlink(missing_ok=True)
+
+
+def get_entry_nbytes(entry: dict) -> int:
+    """
+    Gets the size of the data of the store entry.
+
+    Args:
+        entry: The index entry.
+
+    Returns:
+        int: The number of bytes of the array in the data file, 0 for a text.
+    """
+
+    if 'text' in entry:
+        return 0
+    return int(np.prod(entry['shape'])) * np.dtype(entry['dtype']).itemsize
+
+
+def compact_store(results_dir: Path, min_dead_fraction: float = store_compaction_threshold) -> bool:
+    """
+    Compacts the store: the data file is rewritten with the latest version of every array only, reclaiming the
+    space of the arrays replaced by saving them again, and the index is rewritten with one entry per name.
+    Both files are replaced atomically under the store lock, so no entry is appended meanwhile, but a reader
+    in another process may pair the old index with the new data file, so the store is compacted only when
+    the experiment is finished and on request: by export_legacy_results with compact=True, or explicitly.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        min_dead_fraction: The fraction of the data file taken by the replaced arrays from which the store is
+        compacted (default is store_compaction_threshold, 0 compacts any store with the replaced arrays).
+
+    Returns:
+        bool: True if the store was compacted, False if there is no store or too little space to reclaim.
+    """
+
+    store_dir = results_dir / store_dir_name
+    data_file_path, index_file_path = store_dir / 'data.bin', store_dir / 'index.jsonl'
+    if not data_file_path.exists() or not index_file_path.exists():
+        return False
+    with store_lock(store_dir):
+        index = read_store_index(results_dir)
+        data_size = data_file_path.stat().st_size
+        dead_size = data_size - sum(get_entry_nbytes(entry) for entry in index.values())
+        if dead_size <= 0 or dead_size < min_dead_fraction * data_size:
+            return False
+        entries = []
+
+        def write_data(tmp_file_path: Path) -> None:
+            with data_file_path.open(mode='rb') as data_file, tmp_file_path.open(mode='wb') as tmp_file:
+                for entry in index.values():
+                    entries.append({**entry, 'offset': tmp_file.tell()})
+                    data_file.seek(entry['offset'])
+                    tmp_file.write(data_file.read(get_entry_nbytes(entry)))
+
+        def write_index(tmp_file_path: Path) -> None:
+            with tmp_file_path.open(mode='w') as tmp_file:
+                for entry in entries:
+                    entry['index_offset'] = tmp_file.tell()
+                    tmp_file.write(json.dumps(entry) + '\n')
+
+        store_cache.pop(data_file_path, None)  # the memory map of the replaced file is not reused
+        write_atomically(data_file_path, write_data)
+        write_atomically(index_file_path, write_index)
+    return True
+
+
+def export_legacy_results(results_dir: Path, compact: bool = False) -> None:
+    """
+    Exports the content of the store to the text layout used before the store was introduced: one text
+    file per array or equation in the 'split exp data', 'solutions data' and 'text equations' directories.
+    Every file is replaced atomically, so a partially exported result is never read. If requested, the store
+    is compacted first if the replaced arrays take more than store_compaction_threshold of it; this is safe
+    only when no other process works with the experiment, see compact_store.
+
+    Args:
+        results_dir: The results directory of the experiment.
+        compact: Whether to compact the store before the export (default is False).
+
+    Returns:
+        None
+    """
+
+    if compact:
+        compact_store(results_dir)
+    for name, entry in read_store_index(results_dir).items():
+        if name.startswith('manifest/'):
+            continue
+        file_path = results_dir / f'{name}.txt'
+        if 'text' in entry:
+            write_atomically(file_path, lambda tmp_file_path: tmp_file_path.write_text(entry['text']))
+        else:
+            array = load_array(results_dir, name)
+            write_atomically(file_path, lambda tmp_file_path: np.savetxt(tmp_file_path, array))
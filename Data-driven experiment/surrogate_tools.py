@@ -0,0 +1,171 @@
+import json
+import numpy as np
+import pandas as pd
+from scipy.interpolate import CubicSpline, PchipInterpolator
+
+from data_tools import get_data, get_datasets
+from equation_tools import get_equation_text_form
+from results_analysis_tools import get_results_dir, get_eqn_params
+from report_tools import get_results_df
+from store_tools import write_atomically
+
+surrogate_file_name = '_coef_surrogate.json'
+interpolation_methods = {'linear': None, 'pchip': PchipInterpolator, 'cubic': CubicSpline}
+
+
+def get_best_equations(r0_list: [int | float], exp_name: str, pop_size: int, nruns: int,
+                       rhs_term: str = 'dI/dH') -> pd.DataFrame:
+    """
+    Selects the equation with the lowest RMSE of the solution for every radius value among the solved
+    equations with the right part rhs_term.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+        rhs_term: The term of the right part of the equations (default is 'dI/dH').
+
+    Returns:
+        Pandas DataFrame with the coefficients and the RMSE of the best equations indexed by the equation IDs, sorted by
+        the radius value.
+    """
+
+    results_df = get_results_df(r0_list, exp_name, pop_size, nruns)
+    if results_df.empty or rhs_term not in results_df:
+        return results_df
+    results_df = results_df[(results_df[rhs_term] == 1.0) & results_df['rmse'].notna()]
+    r0_values = [get_eqn_params(eqn_id)[0] for eqn_id in results_df.index]
+    best_ids = results_df['rmse'].astype(float).groupby(r0_values).idxmin()
+    return results_df.loc[best_ids.sort_index().values]
+
+
+def fit_coef_surrogate(r0_list: [int | float], exp_name: str, pop_size: int, nruns: int,
+                       method: str = 'pchip', rhs_term: str = 'dI/dH') -> dict:
+    """
+    Fits the surrogate of the discovered equations over the radius values: the coefficient of every term of
+    the best equations is interpolated over r0 independently, a term missing from the best equation of a radius
+    value has the zero coefficient there. The surrogate is saved as '_coef_surrogate.json' to the results
+    directory, so that the equations are predicted by load_coef_surrogate without reading the results again.
+
+    Args:
+        r0_list: List containing radius values.
+        exp_name: Name of the experiment.
+        pop_size: The population size.
+        nruns: The number of runs.
+        method: The interpolation method: 'linear', 'pchip', which is monotone between the nodes and does not
+        overshoot, or 'cubic' (default is 'pchip').
+        rhs_term: The term of the right part of the equations (default is 'dI/dH').
+
+    Returns:
+        dict: The surrogate, i.e. the radius values, the terms and the coefficients of the best equations, the
+        interpolation method and the right part.
+
+    Raises:
+        ValueError: If the method is unknown or there are less than two radius values with solved equations.
+    """
+
+    if method not in interpolation_methods:
+        raise ValueError(f'Unknown interpolation method: {method}')
+    best_df = get_best_equations(r0_list, exp_name, pop_size, nruns, rhs_term)
+    if len(best_df) < 2:
+        raise ValueError(f'The surrogate needs the solved equations for at least two radius values, '
+                         f'{len(best_df)} found')
+    coefs_df = best_df.drop(columns=['rmse', rhs_term])
+    coefs_df = coefs_df.loc[:, (coefs_df != 0).any()]
+    surrogate = {'r0': [get_eqn_params(eqn_id)[0] for eqn_id in best_df.index], 'eqn_ids': list(best_df.index),
+                 'terms': list(coefs_df.columns), 'coefs': coefs_df.to_numpy(dtype=float).tolist(),
+                 'rmse': best_df['rmse'].astype(float).tolist(), 'method': method, 'rhs_term': rhs_term}
+    write_atomically(get_results_dir(exp_name) / surrogate_file_name,
+                     lambda file_path: file_path.write_text(json.dumps(surrogate, indent=1)))
+    return surrogate
+
+
+def load_coef_surrogate(exp_name: str) -> dict | None:
+    surrogate_file_path = get_results_dir(exp_name) / surrogate_file_name
+    return json.loads(surrogate_file_path.read_text()) if surrogate_file_path.exists() else None
+
+
+def predict_coefs(surrogate: dict, r0: int | float, extrapolate: bool = False) -> dict:
+    """
+    Predicts the coefficients of the equation for the radius value by the surrogate.
+
+    Args:
+        surrogate: The surrogate from fit_coef_surrogate or load_coef_surrogate.
+        r0: The radius value.
+        extrapolate: The flag whether to predict outside the range of the fitted radius values (default is False).
+
+    Returns:
+        dict: The nonzero coefficients keyed by the terms of the left part.
+
+    Raises:
+        ValueError: If r0 is outside the fitted range and extrapolate is False.
+    """
+
+    r0_values, coefs = np.array(surrogate['r0'], dtype=float), np.array(surrogate['coefs'])
+    if not extrapolate and not r0_values[0] <= r0 <= r0_values[-1]:
+        raise ValueError(f'r0 = {r0} is outside the fitted range [{r0_values[0]}, {r0_values[-1]}]')
+    interpolator = interpolation_methods[surrogate['method']]
+    if interpolator is None:
+        slopes = np.diff(coefs, axis=0) / np.diff(r0_values)[:, None]
+        k = int(np.clip(np.searchsorted(r0_values, r0) - 1, 0, len(r0_values) - 2))
+        values = coefs[k] + slopes[k] * (r0 - r0_values[k])
+    else:
+        values = interpolator(r0_values, coefs, axis=0, extrapolate=True)(r0)
+    return {term: float(value) for term, value in zip(surrogate['terms'], values) if value != 0}
+
+
+def validate_equation(text_eq: str, r0: int | float) -> float | None:
+    """
+    Validates the equation against the data of the radius value by the classical integrator of get_ode_solution
+    on the whole normalized grid, which takes milliseconds instead of training a network.
+
+    Args:
+        text_eq: The equation in EPDE text form.
+        r0: The radius value.
+
+    Returns:
+        float | None: The RMSE of the solution or None if there is no data for r0 or the integration fails.
+    """
+
+    from solver_tools import get_ode_solution  # imports torch, which predict_equation does not need otherwise
+
+    if r0 not in get_datasets():
+        return None
+    grid, poynting_vec = get_data(r0)
+    grid = np.asarray(grid) / np.max(grid)
+    solution = get_ode_solution(text_eq, grid, grid, np.asarray(poynting_vec))
+    if solution is None:
+        return None
+    return float(np.sqrt(np.mean((solution[0].numpy() - poynting_vec) ** 2)))
+
+
+def predict_equation(r0: int | float, exp_name: str = 'optics', surrogate: dict = None, validate: bool = False,
+                     extrapolate: bool = False) -> dict:
+    """
+    Predicts the equation for the radius value without running the EPDE search by the coefficient surrogate
+    of the experiment, see fit_coef_surrogate.
+
+    Args:
+        r0: The radius value.
+        exp_name: Name of the experiment with the fitted surrogate (default is 'optics').
+        surrogate: The surrogate (default is None, i.e. the one saved by fit_coef_surrogate).
+        validate: The flag whether to solve the predicted equation and compare the solution with the data of r0,
+        if there is the data (default is False).
+        extrapolate: The flag whether to predict outside the range of the fitted radius values (default is False).
+
+    Returns:
+        dict: The coefficients, the equation in EPDE text form and, if validated, the RMSE of its solution.
+
+    Raises:
+        ValueError: If the surrogate has not been fitted.
+    """
+
+    surrogate = surrogate or load_coef_surrogate(exp_name)
+    if surrogate is None:
+        raise ValueError(f'The surrogate of the experiment {exp_name} has not been fitted')
+    coefs = predict_coefs(surrogate, r0, extrapolate)
+    prediction = {'r0': r0, 'coefs': coefs, 'text_eq': get_equation_text_form(coefs, surrogate['rhs_term'])}
+    if validate:
+        prediction['rmse'] = validate_equation(prediction['text_eq'], r0)
+    return prediction
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules of the experiment are imported by their names, as when the scripts run from its directory.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
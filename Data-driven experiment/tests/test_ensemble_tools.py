@@ -0,0 +1,53 @@
+import numpy as np
+
+from ensemble_tools import (load_ensemble_state, save_ensemble_state, update_ensemble_state, get_mean_change,
+                            ingest_realizations, get_ensemble_size, ensemble_dir_name)
+
+
+def test_running_statistics_match_batch_statistics(tmp_path):
+    rng = np.random.default_rng(0)
+    realizations = 1e3 + rng.normal(size=(50, 20))
+    state = load_ensemble_state(tmp_path, 20)
+    for values in realizations:
+        update_ensemble_state(state, values)
+    assert state['count'] == 50
+    assert np.allclose(state['mean'], realizations.mean(axis=0))
+    assert np.allclose(state['m2'] / (state['count'] - 1), realizations.var(axis=0, ddof=1))
+
+
+def test_state_is_resumed_after_save(tmp_path):
+    rng = np.random.default_rng(1)
+    realizations = rng.normal(size=(10, 8))
+    (tmp_path / ensemble_dir_name).mkdir()
+    state = load_ensemble_state(tmp_path, 8)
+    for values in realizations[:6]:
+        update_ensemble_state(state, values)
+    save_ensemble_state(tmp_path, state)
+    state = load_ensemble_state(tmp_path, 8)
+    for values in realizations[6:]:
+        update_ensemble_state(state, values)
+    assert np.allclose(state['mean'], realizations.mean(axis=0))
+    assert np.allclose(state['m2'], realizations.var(axis=0) * len(realizations))
+
+
+def test_mean_change_is_measured_in_standard_errors():
+    state = {'count': 4, 'mean': np.array([1.0, 2.0]), 'm2': np.array([12.0, 12.0]),
+             'published_mean': None, 'realizations': {}}
+    assert get_mean_change(state) == np.inf
+    state['published_mean'] = np.array([1.0, 3.0])
+    assert np.isclose(get_mean_change(state), 1.0)
+
+
+def test_realizations_are_ingested_once(tmp_path):
+    data_dir = tmp_path / 'T(H) r0=0.1'
+    data_dir.mkdir()
+    np.savetxt(data_dir / 'grid_0.1.txt', np.linspace(0, 1, 5), delimiter=',')
+    realizations = np.arange(15, dtype=float).reshape(3, 5)
+    for k, values in enumerate(realizations):
+        np.savetxt(data_dir / f'T_{k}.txt', values, delimiter=',')
+    info = ingest_realizations(0.1, data_root=tmp_path)
+    assert info['ensemble_size'] == 3 and info['ingested'] == 3 and info['published']
+    assert np.allclose(np.loadtxt(data_dir / 'T_av_0.1.txt'), realizations.mean(axis=0))
+    assert get_ensemble_size(0.1, tmp_path) == 3
+    info = ingest_realizations(0.1, data_root=tmp_path)
+    assert info['ingested'] == 0 and not info['published']
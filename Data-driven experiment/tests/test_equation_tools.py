@@ -0,0 +1,42 @@
+import numpy as np
+
+from equation_tools import (get_canonical_equation, get_canonical_equations, get_equation_structure,
+                            canonical_tolerance, canonical_bucket_width)
+
+equation = ('-8.8e-05 * d^2I/dx0^2{power: 1.0} + -549.38 * I^4{power: 1.0} + -104.59 * I{power: 1.0} + '
+            '-0.166 = dI/dx0{power: 1.0}')
+
+
+def test_canonical_equation_ignores_term_order():
+    reordered = ('-0.166 + -104.59 * I{power: 1.0} + -549.38 * I^4{power: 1.0} + '
+                 '-8.8e-05 * d^2I/dx0^2{power: 1.0} = dI/dx0{power: 1.0}')
+    assert get_canonical_equation(reordered) == get_canonical_equation(equation)
+
+
+def test_canonical_equation_ignores_factor_order():
+    first = '-2.0 * I{power: 1.0} * d^2I/dx0^2{power: 1.0} + -1.0 = dI/dx0{power: 1.0}'
+    second = '-2.0 * d^2I/dx0^2{power: 1.0} * I{power: 1.0} + -1.0 = dI/dx0{power: 1.0}'
+    assert get_canonical_equation(first) == get_canonical_equation(second)
+
+
+def test_canonical_equation_is_scaled_and_quantized():
+    assert get_canonical_equation(equation.replace('-104.59', '-104.6')) != get_canonical_equation(equation)
+    canonical = get_canonical_equation(equation, keep_scale=True)
+    assert canonical[0][0] == 'scale' and canonical[1:] == get_canonical_equation(equation)
+    assert get_canonical_equation(equation.replace('-549.38', '-549.39'), keep_scale=True)[0] != canonical[0]
+
+def test_equal_coefficients_share_key_across_bucket_edge():
+    edge = -549.38 * np.exp(-canonical_bucket_width * canonical_tolerance * np.floor(
+        np.log(549.38 / 104.59) / (canonical_bucket_width * canonical_tolerance)))
+    below, above = (f'{edge * (1 + shift):.17g}' for shift in (-canonical_tolerance / 10, canonical_tolerance / 10))
+    first, second = equation.replace('-104.59', below), equation.replace('-104.59', above)
+    assert get_canonical_equation(first) != get_canonical_equation(second)
+    assert set(get_canonical_equations(first)) & set(get_canonical_equations(second))
+    assert get_canonical_equations(first)[0] == get_canonical_equation(first)
+    far = equation.replace('-104.59', f'{edge * (1 + 10 * canonical_tolerance):.17g}')
+    assert not set(get_canonical_equations(first)) & set(get_canonical_equations(far))
+
+
+def test_structure_drops_coefficients():
+    assert get_equation_structure(equation) == ('C', 'I', 'I^4', 'dI/dH', 'd^2I/dH^2')
+    assert get_equation_structure(equation.replace('-549.38', '-1.5')) == get_equation_structure(equation)
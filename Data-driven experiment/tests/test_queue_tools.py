@@ -0,0 +1,55 @@
+import os
+import time
+
+from queue_tools import (get_queue_dir, put_unit, claim_unit, heartbeat_unit, finish_unit, requeue_expired_units,
+                         requeue_failed_units, get_failed_units, get_queue_status)
+
+
+def test_unit_is_claimed_once(tmp_path):
+    queue_dir = get_queue_dir(tmp_path)
+    assert put_unit(queue_dir, 'discovery_0.1_0', {'r0': 0.1, 'run': 0})
+    assert not put_unit(queue_dir, 'discovery_0.1_0', {'r0': 0.1, 'run': 0})
+    assert claim_unit(queue_dir, 'worker-1') == ('discovery_0.1_0', {'r0': 0.1, 'run': 0})
+    assert claim_unit(queue_dir, 'worker-2') is None
+    assert not put_unit(queue_dir, 'discovery_0.1_0', {'r0': 0.1, 'run': 0})
+    assert get_queue_status(queue_dir) == {'pending': 0, 'leased': 1, 'done': 0, 'failed': 0}
+
+
+def test_only_owner_finishes_unit(tmp_path):
+    queue_dir = get_queue_dir(tmp_path)
+    put_unit(queue_dir, 'u', {})
+    claim_unit(queue_dir, 'worker-1')
+    assert not heartbeat_unit(queue_dir, 'u', 'worker-2')
+    assert not finish_unit(queue_dir, 'u', 'worker-2')
+    assert heartbeat_unit(queue_dir, 'u', 'worker-1')
+    assert finish_unit(queue_dir, 'u', 'worker-1')
+    assert get_queue_status(queue_dir)['done'] == 1
+    assert not finish_unit(queue_dir, 'u', 'worker-1')
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue_dir = get_queue_dir(tmp_path)
+    put_unit(queue_dir, 'u', {})
+    claim_unit(queue_dir, 'worker-1')
+    assert requeue_expired_units(queue_dir, lease_timeout=60) == 0
+    past = time.time() - 120
+    os.utime(queue_dir / 'leased' / 'u.json', (past, past))
+    assert requeue_expired_units(queue_dir, lease_timeout=60) == 1
+    assert claim_unit(queue_dir, 'worker-2') == ('u', {})
+    assert not heartbeat_unit(queue_dir, 'u', 'worker-1')
+    assert not finish_unit(queue_dir, 'u', 'worker-1')
+    assert finish_unit(queue_dir, 'u', 'worker-2')
+    assert get_queue_status(queue_dir)['done'] == 1
+
+
+def test_failed_unit_is_retried_then_failed(tmp_path):
+    queue_dir = get_queue_dir(tmp_path)
+    put_unit(queue_dir, 'u', {})
+    for attempt in range(2):
+        claim_unit(queue_dir, 'worker-1')
+        assert finish_unit(queue_dir, 'u', 'worker-1', error=f'Traceback\nValueError: {attempt}', max_attempts=2)
+    assert get_queue_status(queue_dir) == {'pending': 0, 'leased': 0, 'done': 0, 'failed': 1}
+    assert get_failed_units(queue_dir) == {'u': 'ValueError: 1'}
+    assert requeue_failed_units(queue_dir) == 1
+    assert get_failed_units(queue_dir) == {}
+    assert claim_unit(queue_dir, 'worker-1') == ('u', {})
@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip('epde')  # search_tools imports the EPDE search and the solver on import
+pytest.importorskip('torch')
+
+from search_tools import get_search_budgets  # noqa: E402
+
+
+def test_budgets_grow_by_eta_up_to_max():
+    assert get_search_budgets(10, 90, 3) == [10, 30, 90]
+    assert get_search_budgets(10, 100, 3) == [11, 33, 100]
+
+
+def test_single_rung_if_range_is_narrow():
+    assert get_search_budgets(50, 100, 3) == [100]
+    assert get_search_budgets(100, 100, 2) == [100]
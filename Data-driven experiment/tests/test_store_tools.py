@@ -0,0 +1,83 @@
+import numpy as np
+
+from store_tools import (save_array, save_text, load_array, load_text, list_result_names, get_result_version,
+                         compact_store, export_legacy_results, store_dir_name)
+
+
+def test_array_is_read_after_write(tmp_path):
+    array = np.arange(12, dtype=np.float64).reshape(3, 4)
+    save_array(tmp_path, 'solutions data/sln_data_test_0.1_0_0', array)
+    loaded = load_array(tmp_path, 'solutions data/sln_data_test_0.1_0_0')
+    assert loaded.dtype == array.dtype and loaded.shape == array.shape
+    assert np.array_equal(loaded, array)
+    assert not loaded.flags.writeable
+
+
+def test_text_is_read_after_write(tmp_path):
+    save_text(tmp_path, 'text equations/eqn_0.1_0_0', 'I = dI/dx0')
+    assert load_text(tmp_path, 'text equations/eqn_0.1_0_0') == 'I = dI/dx0'
+    assert load_array(tmp_path, 'text equations/eqn_0.1_0_0') is None
+    assert load_text(tmp_path, 'text equations/eqn_0.2_0_0') is None
+
+
+def test_later_save_replaces_earlier(tmp_path):
+    save_array(tmp_path, 'a', np.zeros(3))
+    version = get_result_version(tmp_path, 'a')
+    save_array(tmp_path, 'a', np.ones(5, dtype=np.float32))
+    assert np.array_equal(load_array(tmp_path, 'a'), np.ones(5, dtype=np.float32))
+    assert get_result_version(tmp_path, 'a') != version
+
+
+def test_names_are_listed_by_prefix(tmp_path):
+    save_text(tmp_path, 'text equations/eqn_0.1_0_0', 'x')
+    save_text(tmp_path, 'text equations/eqn_0.1_1_0', 'y')
+    save_text(tmp_path, 'text equations/eqn_0.2_0_0', 'z')
+    (tmp_path / 'text equations').mkdir()
+    (tmp_path / 'text equations' / 'eqn_0.1_2_0.txt').write_text('legacy')
+    assert list_result_names(tmp_path, 'text equations/eqn_0.1_') == [
+        'text equations/eqn_0.1_0_0', 'text equations/eqn_0.1_1_0', 'text equations/eqn_0.1_2_0']
+
+
+def test_compaction_keeps_latest_versions(tmp_path):
+    for k in range(4):
+        save_array(tmp_path, 'a', np.full(100, k, dtype=np.float64))
+    save_array(tmp_path, 'b', np.arange(7))
+    save_text(tmp_path, 't', 'text')
+    data_file_path = tmp_path / store_dir_name / 'data.bin'
+    size = data_file_path.stat().st_size
+    assert compact_store(tmp_path)
+    assert data_file_path.stat().st_size < size
+    assert np.array_equal(load_array(tmp_path, 'a'), np.full(100, 3, dtype=np.float64))
+    assert np.array_equal(load_array(tmp_path, 'b'), np.arange(7))
+    assert load_text(tmp_path, 't') == 'text'
+    assert not compact_store(tmp_path, min_dead_fraction=0.0)
+    save_array(tmp_path, 'c', np.ones(2))
+    assert np.array_equal(load_array(tmp_path, 'c'), np.ones(2))
+
+
+def test_legacy_export_writes_text_files(tmp_path):
+    save_array(tmp_path, 'split exp data/grid_training_0.1', np.linspace(0, 1, 5))
+    save_text(tmp_path, 'text equations/eqn_0.1_0_0', 'I = dI/dx0')
+    export_legacy_results(tmp_path)
+    assert np.allclose(np.loadtxt(tmp_path / 'split exp data' / 'grid_training_0.1.txt'), np.linspace(0, 1, 5))
+    assert (tmp_path / 'text equations' / 'eqn_0.1_0_0.txt').read_text() == 'I = dI/dx0'
+
+
+def test_partial_index_line_is_skipped_and_terminated(tmp_path):
+    save_text(tmp_path, 'a', 'x')
+    with (tmp_path / store_dir_name / 'index.jsonl').open(mode='a') as index_file:
+        index_file.write('{"name": "b", "te')
+    save_text(tmp_path, 'c', 'z')
+    assert load_text(tmp_path, 'a') == 'x' and load_text(tmp_path, 'c') == 'z'
+    assert list_result_names(tmp_path, '') == ['a', 'c']
+
+
+def test_legacy_export_compacts_on_request(tmp_path):
+    for k in range(4):
+        save_array(tmp_path, 'a', np.full(10, k, dtype=np.float64))
+    data_file_path = tmp_path / store_dir_name / 'data.bin'
+    size = data_file_path.stat().st_size
+    export_legacy_results(tmp_path)
+    assert data_file_path.stat().st_size == size
+    export_legacy_results(tmp_path, compact=True)
+    assert data_file_path.stat().st_size < size
@@ -0,0 +1,24 @@
+import pytest
+
+from surrogate_tools import predict_coefs
+
+surrogate = {'r0': [0.1, 0.2, 0.4], 'terms': ['I', 'C'], 'coefs': [[1.0, 0.0], [2.0, 0.0], [4.0, 1.0]],
+             'method': 'linear', 'rhs_term': 'dI/dH'}
+
+
+def test_coefficients_are_interpolated_linearly():
+    assert predict_coefs(surrogate, 0.15) == pytest.approx({'I': 1.5})
+    assert predict_coefs(surrogate, 0.3) == pytest.approx({'I': 3.0, 'C': 0.5})
+    assert predict_coefs(surrogate, 0.1) == pytest.approx({'I': 1.0})
+
+
+@pytest.mark.parametrize('method', ['pchip', 'cubic'])
+def test_splines_pass_through_nodes(method):
+    coefs = predict_coefs({**surrogate, 'method': method}, 0.2)
+    assert coefs == pytest.approx({'I': 2.0})
+
+
+def test_extrapolation_is_explicit():
+    with pytest.raises(ValueError):
+        predict_coefs(surrogate, 0.5)
+    assert predict_coefs(surrogate, 0.5, extrapolate=True) == pytest.approx({'I': 5.0, 'C': 1.5})